@@ -11,6 +11,8 @@ from ai_core.tools.canvas_ops import (
     list_canvas_frames,
     add_element_to_frame,
     remove_element_from_frame,
+    add_elements_to_frame,
+    remove_elements_from_frame,
     set_element_name,
     create_element,
     set_canvas_name,
@@ -35,6 +37,8 @@ def create_agent():
     - set_frame_name: Set the name of a frame
     - add_element_to_frame: Add an element to a frame
     - remove_element_from_frame: Remove an element from a frame
+    - add_elements_to_frame: Add many elements to a frame in one call (use it when regrouping)
+    - remove_elements_from_frame: Remove many elements from a frame in one call
     - set_element_name: Set the name of an element
     - create_element: Create a new element
     - edit_element: Edit an existing element (content, type, attributes)
@@ -48,17 +52,20 @@ def create_agent():
     - Element: message, note, sticker
 """,
         tools=[
-            fetch_elements,
-            create_canvas_frame,
-            set_frame_name,
-            list_canvas_frames,
-            add_element_to_frame,
-            remove_element_from_frame,
-            set_element_name,
-            create_element,
-            edit_element,
-            get_current_canvas_info,
-            set_canvas_name,
+            # Async versions (.aio): awaited on the runner's loop, parallel calls run concurrently
+            fetch_elements.aio,
+            create_canvas_frame.aio,
+            set_frame_name.aio,
+            list_canvas_frames.aio,
+            add_element_to_frame.aio,
+            remove_element_from_frame.aio,
+            add_elements_to_frame.aio,
+            remove_elements_from_frame.aio,
+            set_element_name.aio,
+            create_element.aio,
+            edit_element.aio,
+            get_current_canvas_info.aio,
+            set_canvas_name.aio,
         ],
     )
 
@@ -16,11 +16,12 @@ HOW TO WORK:
 1.  **Fetch Elements**: Use the `fetch_elements` tool to retrieve chat history (messages, notes) from the database.
     *   You can specify `limit`, `since` time, or other criteria.
     *   If the user didn't specify a range, default to the last 50 elements or use your judgment.
+    *   The result contains `next_cursor` when older elements exist; pass it as `cursor` to fetch the next (older) page.
 2.  **Summarize**: Once you have the elements generate a summary in the same language as the user's request.
     
 Do not try to summarize the text yourself as the tool is available.
 """,
     tools=[
-        fetch_elements, 
+        fetch_elements.aio,
     ]
 )
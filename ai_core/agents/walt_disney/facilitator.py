@@ -78,7 +78,7 @@ You orchestrate the sub-agents. For each stage:
 """,
     tools=[
         AgentTool(agent=create_canvas_manager()), # Agent as a Tool
-        fetch_elements,
+        fetch_elements.aio,
     ],
     sub_agents=[
         dreamer_agent,
@@ -4,19 +4,26 @@ Common utilities for Google ADK agents.
 
 import asyncio
 import os
+import time
 import uuid
-from typing import Optional, Generator, Any
+from collections import OrderedDict
+from typing import Optional, Generator, Any, Dict, Tuple
 from concurrent.futures import ThreadPoolExecutor
 
 from google.adk.agents import LlmAgent
+from google.adk.agents.run_config import RunConfig, ToolThreadPoolConfig
+from google.adk.errors.already_exists_error import AlreadyExistsError
 from google.adk.runners import Runner
 from google.adk.sessions import DatabaseSessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
 from google.genai import types
 from google.genai.errors import ClientError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from google.api_core.exceptions import ResourceExhausted, InternalServerError, ServiceUnavailable
 
 from ai_core.common.config import settings
+from ai_core.common.session_compaction import SessionCompactor
+from ai_core.storage.db import create_sqlite_engine
 from ai_core.common.logging import logger
 
 # Ensure API key is set
@@ -24,8 +31,11 @@ if not os.environ.get("GOOGLE_API_KEY"):
     os.environ["GOOGLE_API_KEY"] = settings.GOOGLE_API_KEY
 
 # Global session service
+# Same SQLite profile as the main DB. ADK enables foreign keys itself only
+# for engines it creates, so the pragma is passed here.
 db_url = f"sqlite+aiosqlite:///{settings.SESSION_DB_PATH}"
-_session_service = DatabaseSessionService(db_url=db_url)
+_session_engine = create_sqlite_engine(db_url, extra_pragmas={"foreign_keys": "ON"})
+_session_service = DatabaseSessionService(db_engine=_session_engine)
 
 def get_session_service() -> DatabaseSessionService:
     """Returns the shared session service instance."""
@@ -44,22 +54,204 @@ standard_retry = retry(
     reraise=True
 )
 
-def run_agent_sync(
+def _quota_error(e: BaseException) -> Optional[str]:
+    """Returns a user-facing message if the error chain contains a 429 ClientError."""
+    # Проверяем цепочку исключений на наличие ClientError (429)
+    # ADK может оборачивать ошибки в свои типы (например _ResourceExhaustedError)
+    cause = e
+    client_error = None
+    
+    # Ищем ClientError в цепочке причин
+    while cause:
+        if isinstance(cause, ClientError):
+            client_error = cause
+            break
+        cause = getattr(cause, '__cause__', None) or getattr(cause, '__context__', None)
+        
+    if not client_error or client_error.code != 429:
+        return None
+
+    error_details = (client_error.details or {}).get('error', {})
+    message = error_details.get('message', 'Unknown quota error')
+    details = error_details.get('details', [])
+    
+    # Извлекаем полезную информацию
+    quota_info = []
+    for detail in details:
+        if detail.get('@type') == 'type.googleapis.com/google.rpc.QuotaFailure':
+            for violation in detail.get('violations', []):
+                quota_info.append(
+                    f"- Модель: {violation.get('quotaDimensions', {}).get('model', 'unknown')}\n"
+                    f"- Квота: {violation.get('quotaMetric', 'unknown')}\n"
+                    f"- Лимит: {violation.get('quotaValue', 'unknown')}"
+                )
+        elif detail.get('@type') == 'type.googleapis.com/google.rpc.RetryInfo':
+            retry_delay = detail.get('retryDelay', '')
+            quota_info.append(f"- Retry after: {retry_delay}")
+    
+    quota_details = "\n".join(quota_info) if quota_info else "Нет дополнительных деталей"
+    
+    return (
+        f"❌ Ошибка: квота API исчерпана, попробуйте позже\n\n"
+        f"Сообщение API: {message}\n\n"
+        f"Технические детали:\n{quota_details}"
+    )
+
+
+class AgentRunnerRegistry:
+    """
+    Reuses Runners and remembers recently used sessions across agent turns.
+    
+    One Runner is kept per (agent, app_name). Sessions seen (found or created)
+    within the last session_ttl seconds are not looked up again, so repeat
+    messages in an active chat go straight to the runner. The session cache is
+    an LRU bounded by session_cache_size.
+    """
+
+    def __init__(
+        self,
+        session_service: DatabaseSessionService,
+        session_ttl: float = settings.AGENT_SESSION_CACHE_TTL_S,
+        session_cache_size: int = settings.AGENT_SESSION_CACHE_SIZE,
+    ):
+        self._session_service = session_service
+        self._runners: Dict[Tuple[int, str], Runner] = {}
+        self._sessions: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._session_ttl = session_ttl
+        self._session_cache_size = session_cache_size
+        self._runner_hits = 0
+        self._runner_misses = 0
+        self._session_hits = 0
+        self._session_misses = 0
+
+    def get_runner(self, agent: LlmAgent, app_name: str) -> Runner:
+        """Returns the Runner for agent and app_name, building it on first use."""
+        # The Runner holds the agent, so its id() stays unique while cached
+        key = (id(agent), app_name)
+        runner = self._runners.get(key)
+        if runner is not None:
+            self._runner_hits += 1
+            return runner
+        self._runner_misses += 1
+        runner = Runner(
+            agent=agent,
+            app_name=app_name,
+            session_service=self._session_service,
+        )
+        self._runners[key] = runner
+        return runner
+
+    async def ensure_session(self, app_name: str, user_id: str, session_id: str, chat_id: str) -> None:
+        """Creates the ADK session unless it exists or was seen within the TTL."""
+        key = (app_name, user_id, session_id)
+        expires_at = self._sessions.get(key)
+        if expires_at is not None and expires_at > time.monotonic():
+            self._sessions.move_to_end(key)
+            self._session_hits += 1
+            return
+        self._session_misses += 1
+
+        # Проверяем, существует ли сессия - если да, переиспользуем её
+        # (num_recent_events=0: only the session row, not its history)
+        try:
+            session = await self._session_service.get_session(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                config=GetSessionConfig(num_recent_events=0)
+            )
+        except Exception:
+            # Сессия не существует, создаём новую
+            session = None
+
+        if session:
+            logger.debug(f"Reusing existing session_id={session_id}, state={session.state}")
+        else:
+            try:
+                session = await self._session_service.create_session(
+                    app_name=app_name,
+                    user_id=user_id,
+                    session_id=session_id,
+                    state={
+                        "chat_id": chat_id
+                    }
+                )
+                logger.debug(f"Created new session_id={session_id}, state={session.state}")
+            except AlreadyExistsError:
+                # A concurrent turn of the same chat created it first
+                logger.debug(f"Session {session_id} was created concurrently")
+
+        self._sessions[key] = time.monotonic() + self._session_ttl
+        self._sessions.move_to_end(key)
+        if len(self._sessions) > self._session_cache_size:
+            self._sessions.popitem(last=False)
+
+    def forget_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        """Drops a session from the cache, e.g. after it was deleted or a turn failed."""
+        self._sessions.pop((app_name, user_id, session_id), None)
+
+    def clear(self) -> None:
+        """Drops all cached Runners and sessions."""
+        self._runners.clear()
+        self._sessions.clear()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Returns Runner and session cache counters."""
+        return {
+            "runners": len(self._runners),
+            "runner_hits": self._runner_hits,
+            "runner_misses": self._runner_misses,
+            "sessions": len(self._sessions),
+            "max_sessions": self._session_cache_size,
+            "session_ttl": self._session_ttl,
+            "session_hits": self._session_hits,
+            "session_misses": self._session_misses,
+        }
+
+
+_runner_registry = AgentRunnerRegistry(_session_service)
+
+# Sync FunctionTools (e.g. the maintenance agent's git/subprocess tools) run
+# in a worker pool; ADK would otherwise call them inline on the event loop.
+_run_config = RunConfig(
+    tool_thread_pool_config=ToolThreadPoolConfig(max_workers=settings.AGENT_TOOL_THREADS)
+)
+
+def get_runner_registry() -> AgentRunnerRegistry:
+    """Returns the shared Runner and session registry."""
+    return _runner_registry
+
+_session_compactor = SessionCompactor(_session_service, _session_engine)
+
+def get_session_compactor() -> SessionCompactor:
+    """Returns the shared session history compactor."""
+    return _session_compactor
+
+
+async def run_agent_async(
     agent: LlmAgent,
     user_message: str,
     chat_id: str,
     user_id: str = "default_user",
-    app_name: str = "agents"
+    app_name: str = "agents",
+    session_id: Optional[str] = None
 ) -> str:
     """
-    Executes an ADK agent synchronously, handling asyncio loop complexity.
+    Executes an ADK agent on the caller's event loop.
+    
+    Session lookup and the agent turn both run on the async session service
+    and Runner.run_async, so a turn does not hold a thread while it waits
+    for the model or tools. Runners and known sessions come from the shared
+    AgentRunnerRegistry; sessions over their history budget are compacted by
+    SessionCompactor before the turn.
     
     Args:
         agent: The LlmAgent instance to run.
         user_message: The text message to send to the agent.
+        chat_id: Chat ID, stored in the session state for the tools.
         user_id: User identifier for the session.
-        chat_id: Optional chat ID
         app_name: App name for the session.
+        session_id: Session ID, defaults to chat_id (one session per chat).
         
     Returns:
         The text response from the agent.
@@ -67,63 +259,20 @@ def run_agent_sync(
     Raises:
         Exception: If the agent fails to return a response or other errors occur.
     """
-    logger.debug(f"Running agent {agent.name} for user {user_id} (session {chat_id})")
+    session_id = session_id or chat_id
+    logger.debug(f"Running agent {agent.name} for user {user_id} (session {session_id})")
 
-    # Create runner
-    runner = Runner(
-        agent=agent,
-        app_name=app_name,
-        session_service=_session_service,
-    )
-
-    # 1. Create Session (Async handling)
-    # Проверяем, существует ли сессия - если да, переиспользуем её
-    def create_session_task():
-        # Проверяем существование сессии
-        try:
-            session = asyncio.run(_session_service.get_session(
-                app_name=app_name,
-                user_id=user_id,
-                session_id=chat_id
-            ))
-            if session:
-                logger.debug(f"Reusing existing session_id={chat_id}, state={session.state}")
-                return
-        except Exception:
-            # Сессия не существует, создаём новую
-            pass
-            
-        session = asyncio.run(_session_service.create_session(
-            app_name=app_name,
-            user_id=user_id,
-            session_id=chat_id,
-            state={
-                "chat_id": chat_id
-            }
-        ))
-        logger.debug(f"Created new session_id={chat_id}, state={session.state}")
-        
+    runner = _runner_registry.get_runner(agent, app_name)
 
     try:
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            loop = None
-            
-        if loop and loop.is_running():
-            logger.debug("Event loop running, using ThreadPoolExecutor for session creation")
-            with ThreadPoolExecutor() as executor:
-                session = executor.submit(create_session_task).result()
-        else:
-            logger.debug("No event loop, running session creation directly")
-            session = create_session_task()            
+        await _runner_registry.ensure_session(app_name, user_id, session_id, chat_id)
     except Exception as e:
         logger.error(f"Failed to handle session: {e}")
         raise
 
-    # 2. Run Agent (Sync Runner.run handles its own loop if needed, but returns generator)
-    # Note: Runner.run is synchronous but blocks.
-    
+    # Summarize older history first if the session is over its budget
+    await _session_compactor.maybe_compact(agent, app_name, user_id, session_id)
+
     user_content = types.Content(
         role='user',
         parts=[types.Part(text=user_message)]
@@ -132,64 +281,57 @@ def run_agent_sync(
     response_text = None
     
     try:
-        for event in runner.run(
+        # Drained to the end so the runner finishes persisting the turn
+        async for event in runner.run_async(
             user_id=user_id,
-            session_id=chat_id,
-            new_message=user_content
+            session_id=session_id,
+            new_message=user_content,
+            run_config=_run_config
         ):
-            if event.is_final_response() and event.content and event.content.parts:
+            _session_compactor.observe(app_name, user_id, session_id, event)
+            if response_text is None and event.is_final_response() and event.content and event.content.parts:
                 response_text = event.content.parts[0].text
-                break
                 
         return response_text
         
     except Exception as e:
-        # Проверяем цепочку исключений на наличие ClientError (429)
-        # ADK может оборачивать ошибки в свои типы (например _ResourceExhaustedError)
-        cause = e
-        client_error = None
-        
-        # Ищем ClientError в цепочке причин
-        while cause:
-            if isinstance(cause, ClientError):
-                client_error = cause
-                break
-            cause = getattr(cause, '__cause__', None) or getattr(cause, '__context__', None)
-            
-        if client_error and client_error.status_code == 429:
-            error_details = client_error.response_json.get('error', {})
-            message = error_details.get('message', 'Unknown quota error')
-            details = error_details.get('details', [])
-            
-            # Извлекаем полезную информацию
-            quota_info = []
-            for detail in details:
-                if detail.get('@type') == 'type.googleapis.com/google.rpc.QuotaFailure':
-                    for violation in detail.get('violations', []):
-                        quota_info.append(
-                            f"- Модель: {violation.get('quotaDimensions', {}).get('model', 'unknown')}\n"
-                            f"- Квота: {violation.get('quotaMetric', 'unknown')}\n"
-                            f"- Лимит: {violation.get('quotaValue', 'unknown')}"
-                        )
-                elif detail.get('@type') == 'type.googleapis.com/google.rpc.RetryInfo':
-                    retry_delay = detail.get('retryDelay', '')
-                    quota_info.append(f"- Retry after: {retry_delay}")
-            
-            quota_details = "\n".join(quota_info) if quota_info else "Нет дополнительных деталей"
-            
-            error_message = (
-                f"❌ Ошибка: квота API исчерпана, попробуйте позже\n\n"
-                f"Сообщение API: {message}\n\n"
-                f"Технические детали:\n{quota_details}"
-            )
-            
+        # The session may have been deleted behind the cache; look it up next time
+        _runner_registry.forget_session(app_name, user_id, session_id)
+        _session_compactor.forget(app_name, user_id, session_id)
+        error_message = _quota_error(e)
+        if error_message:
             logger.warning(f"ResourceExhausted for agent {agent.name}: {error_message}")
-            raise Exception(error_message) from client_error
-            
-        # Игнорируем ошибку закрытого event loop при завершении
-        if isinstance(e, RuntimeError) and "Event loop is closed" in str(e):
-            logger.debug("Ignored 'Event loop is closed' error during cleanup")
-            return response_text if response_text else "Agent finished but loop closed early."
+            raise Exception(error_message) from e
 
         logger.error(f"Error during agent execution: {e}")
         raise
+
+
+def run_agent_sync(
+    agent: LlmAgent,
+    user_message: str,
+    chat_id: str,
+    user_id: str = "default_user",
+    app_name: str = "agents",
+    session_id: Optional[str] = None
+) -> str:
+    """
+    Blocking wrapper around run_agent_async for callers without an event loop
+    (scripts, REPL). Async code should await run_agent_async instead.
+    """
+    coro = run_agent_async(
+        agent=agent,
+        user_message=user_message,
+        chat_id=chat_id,
+        user_id=user_id,
+        app_name=app_name,
+        session_id=session_id,
+    )
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    logger.debug("Event loop running, running the agent in a worker thread")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
@@ -36,6 +36,30 @@ class Settings(BaseSettings):
     GEMINI_MODEL_SMART: str = GEMINI_MODEL_FAST
 
     
+    # Agents
+    AGENT_TOOL_THREADS: int = 4  # worker threads for sync agent tools, which would otherwise block the event loop
+    AGENT_SESSION_CACHE_TTL_S: float = 300.0  # known ADK sessions skip the existence check for this long
+    AGENT_SESSION_CACHE_SIZE: int = 1024  # known ADK sessions kept by the runner registry
+    AGENT_SESSION_MAX_EVENTS: int = 200  # older events of a session with more are summarized; 0 disables
+    AGENT_SESSION_MAX_PROMPT_TOKENS: int = 50000  # older events of a session with a larger prompt are summarized; 0 disables
+    AGENT_SESSION_RETAIN_EVENTS: int = 30  # newest events kept verbatim when a session is summarized
+    AGENT_COMPACTION_TOOL_CHARS: int = 500  # tool call args/results are cut to this length in the summarizer input
+
+    # Storage
+    CANVAS_CACHE_SIZE: int = 1024  # chat_id -> canvas entries kept in CanvasService
+    ELEMENT_WRITE_MAX_DELAY_MS: float = 5.0  # group commit: how long the writer waits for more elements
+    ELEMENT_WRITE_MAX_BATCH: int = 500  # group commit: max elements per transaction
+    ELEMENT_COMPRESS_MIN_BYTES: int = 2048  # element content at least this large is stored zlib-compressed; 0 disables
+    ELEMENT_DEDUP_MIN_BYTES: int = 512  # element content at least this large is stored once per distinct body; 0 disables
+
+    # SQLite profile, applied on connect to the main DB and the ADK session DB
+    SQLITE_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"  # NORMAL is durable enough under WAL
+    SQLITE_BUSY_TIMEOUT_MS: int = 10000  # how long a writer waits for the write lock
+    SQLITE_CACHE_SIZE_KIB: int = 65536  # page cache per connection
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 0 disables memory-mapped reads
+    SQLITE_READ_POOL_SIZE: int = 8  # connections of the read-only engine
+
     # Company
     COMPANY_DOMAINS: List[str] = []
     
@@ -1,13 +1,124 @@
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Computed, Index, String, event, func, insert, inspect, select, text
+from sqlalchemy.types import TypeDecorator
+import hashlib
 import uuid
+import zlib
+
+from ai_core.common.config import settings
+
+# ============================================================================
+# Content storage
+# ============================================================================
+
+def is_compressible(value: Optional[str]) -> bool:
+    """Whether compress_content may store the value compressed: at least ELEMENT_COMPRESS_MIN_BYTES of UTF-8."""
+    if value is None or settings.ELEMENT_COMPRESS_MIN_BYTES <= 0:
+        return False
+    return len(value.encode("utf-8")) >= settings.ELEMENT_COMPRESS_MIN_BYTES
+
+
+def compress_content(value: Optional[str]) -> Union[str, bytes, None]:
+    """
+    Storage form of element content: zlib-compressed bytes when the UTF-8 text
+    is at least ELEMENT_COMPRESS_MIN_BYTES long and compression pays off,
+    otherwise the text itself.
+    """
+    if not is_compressible(value):
+        return value
+    raw = value.encode("utf-8")
+    compressed = zlib.compress(raw)
+    return compressed if len(compressed) < len(raw) else value
+
+
+def decompress_content(value: Union[str, bytes, None]) -> Optional[str]:
+    """Inverse of compress_content; plain text is returned as is."""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column whose large values are stored compressed (compress_content).
+    
+    The SQLite storage class is the flag: compressed values are BLOBs
+    (typeof(content) = 'blob'), everything else stays TEXT, so old rows and
+    short messages are read as before. Queries that need the text use the
+    element_text() function registered on the app's connections; trigger
+    SQL cannot (see storage.db.FTS_DDL).
+    """
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_content(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_content(value)
+
+
+def content_digest(value: Optional[str]) -> Optional[str]:
+    """
+    Key of a shared content body (sha256 hex of the UTF-8 text), or None for
+    contents below ELEMENT_DEDUP_MIN_BYTES, which are stored inline.
+    """
+    if value is None or settings.ELEMENT_DEDUP_MIN_BYTES <= 0:
+        return None
+    raw = value.encode("utf-8")
+    if len(raw) < settings.ELEMENT_DEDUP_MIN_BYTES:
+        return None
+    return hashlib.sha256(raw).hexdigest()
+
+
+class ElementContent(CompressedText):
+    """
+    canvas_elements.content: small contents are stored inline, large ones
+    once in canvas_contents under their content_digest, with an empty inline
+    value. Selecting the column reads the body back, so the split is
+    invisible to ORM objects and projections. SQL elsewhere (filters,
+    triggers) uses element_content_sql() / storage.db's equivalent.
+    
+    The body and content_hash are written by the CanvasElement flush hooks
+    below and by CanvasService.add_elements_bulk.
+    """
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if content_digest(value) is not None:
+            return ""
+        return super().process_bind_param(value, dialect)
+
+    def column_expression(self, column):
+        return element_content_sql(column.table)
+
 
 # ============================================================================
 # Canvas Models
 # ============================================================================
 
+class CanvasContent(SQLModel, table=True):
+    """
+    Content-addressed element bodies, shared by elements with the same large
+    content. ref_count is kept by triggers (storage.db.CONTENT_REFS_DDL);
+    unreferenced bodies are removed by CanvasService.purge_unused_contents.
+    """
+    __tablename__ = "canvas_contents"
+
+    hash: str = Field(primary_key=True)  # content_digest()
+    content: str = Field(sa_column=Column(CompressedText, nullable=False))
+    ref_count: int = 0
+
+
+def element_content_sql(elements_table):
+    """Content of canvas_elements rows as SQL, shared bodies resolved (still in storage form)."""
+    contents = CanvasContent.__table__
+    body = select(contents.c.content).where(contents.c.hash == elements_table.c.content_hash).scalar_subquery()
+    return func.coalesce(body, elements_table.c.content, type_=CompressedText())
+
+
 class Canvas(SQLModel, table=True):
     """
     Root entity representing a space (e.g., a chat context).
@@ -27,8 +138,33 @@ class Canvas(SQLModel, table=True):
     elements: List["CanvasElement"] = Relationship(back_populates="canvas")
 
 
+class CanvasAccess(SQLModel, table=True):
+    """
+    Normalized copy of Canvas.access_rules: one row per (principal, canvas).
+    Kept in sync by CanvasService; used for indexed principal -> canvas lookups.
+    """
+    __tablename__ = "canvas_access"
+    __table_args__ = (
+        # A chat owns exactly one canvas. Guards against two concurrent first
+        # messages creating duplicate canvases for the same chat.
+        Index(
+            "ux_canvas_access_chat_principal",
+            "principal",
+            unique=True,
+            sqlite_where=text("principal LIKE 'telegram:chat:%'"),
+        ),
+    )
+
+    principal: str = Field(primary_key=True)  # e.g. "telegram:chat:-100123"
+    canvas_id: uuid.UUID = Field(foreign_key="canvases.id", primary_key=True, index=True)
+
+
 class CanvasElementFrameLink(SQLModel, table=True):
     __tablename__ = "canvas_element_frame_links"
+    __table_args__ = (
+        # PK covers frame -> elements; this covers element -> frames (selectinload of frames)
+        Index("ix_canvas_element_frame_links_element_frame", "element_id", "frame_id"),
+    )
     frame_id: uuid.UUID = Field(foreign_key="canvas_frames.id", primary_key=True)
     element_id: uuid.UUID = Field(foreign_key="canvas_elements.id", primary_key=True)
 
@@ -40,7 +176,8 @@ class CanvasFrame(SQLModel, table=True):
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     canvas_id: uuid.UUID = Field(foreign_key="canvases.id", index=True)
-    parent_id: Optional[uuid.UUID] = Field(default=None, foreign_key="canvas_frames.id")
+    # Indexed for the child lookups of CanvasService.get_frame_tree
+    parent_id: Optional[uuid.UUID] = Field(default=None, foreign_key="canvas_frames.id", index=True)
     
     name: str
     meta: Dict[str, Any] = Field(default={}, sa_column=Column(JSON)) # UI coords, color, etc.
@@ -48,6 +185,32 @@ class CanvasFrame(SQLModel, table=True):
     # Relationships
     canvas: Canvas = Relationship(back_populates="frames")
     elements: List["CanvasElement"] = Relationship(back_populates="frames", link_model=CanvasElementFrameLink)
+
+
+class CanvasFrameStats(SQLModel, table=True):
+    """
+    Materialized frame contents summary, one row per frame. Kept up to date by
+    triggers on frames, frame links and element types in the writing
+    transaction (storage.db.FRAME_STATS_DDL).
+    """
+    __tablename__ = "canvas_frame_stats"
+
+    frame_id: uuid.UUID = Field(foreign_key="canvas_frames.id", primary_key=True)
+    element_count: int = 0
+    last_added_at: Optional[datetime] = None  # when an element was last linked to the frame
+    type_counts: Dict[str, int] = Field(default={}, sa_column=Column(JSON))  # element type -> count
+
+
+class FrameTreeNode(SQLModel):
+    """A frame in CanvasService.get_frame_tree (not a table)."""
+    id: uuid.UUID
+    name: str
+    parent_id: Optional[uuid.UUID] = None
+    depth: int = 0
+    element_count: int = 0
+    last_added_at: Optional[datetime] = None
+    type_counts: Dict[str, int] = {}
+    children: List["FrameTreeNode"] = []
     
 
 class CanvasElement(SQLModel, table=True):
@@ -55,13 +218,21 @@ class CanvasElement(SQLModel, table=True):
     Unified content entity: Message, Note, File, etc.
     """
     __tablename__ = "canvas_elements"
+    __table_args__ = (
+        # get_elements access paths: canvas [+ type], newest first, id as tie-breaker
+        Index("ix_canvas_elements_canvas_created", "canvas_id", "created_at", "id"),
+        Index("ix_canvas_elements_canvas_type_created", "canvas_id", "type", "created_at", "id"),
+        # "What changed since seq N" range scans and the high-water mark (MAX)
+        Index("ux_canvas_elements_canvas_seq", "canvas_id", "seq", unique=True),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    canvas_id: uuid.UUID = Field(foreign_key="canvases.id", index=True)
+    canvas_id: uuid.UUID = Field(foreign_key="canvases.id")  # indexed via ix_canvas_elements_canvas_created
     
     type: str = Field(index=True) # message, note, file, voice
     name: Optional[str] = None # Short human-readable name
-    content: str
+    content: str = Field(sa_column=Column(ElementContent, nullable=False))  # large bodies compressed / shared
+    content_hash: Optional[str] = None  # canvas_contents.hash when the body is shared
     
     created_by: str = Field(index=True) # e.g. telegram:user:123
     
@@ -69,7 +240,80 @@ class CanvasElement(SQLModel, table=True):
     attributes: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
     
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+    
+    # Per-canvas insert order: increasing, may have gaps. Assigned by CanvasService on insert
+    # (by a trigger for rows inserted elsewhere); see storage.db.ELEMENT_SEQ_DDL.
+    seq: Optional[int] = None
 
     # Relationships
     canvas: Canvas = Relationship(back_populates="elements")
     frames: List[CanvasFrame] = Relationship(back_populates="elements", link_model=CanvasElementFrameLink)
+
+
+class CanvasChange(SQLModel, table=True):
+    """
+    Append-only change feed: one row per insert, update or delete of a canvas,
+    its elements, frames and frame links. Written by triggers in the writing
+    transaction (storage.db.CHANGE_FEED_DDL); read with CanvasService.get_changes.
+    """
+    __tablename__ = "canvas_changes"
+    __table_args__ = (
+        Index("ix_canvas_changes_canvas_seq", "canvas_id", "seq"),
+        # Latest change of one kind, e.g. frames for the frame tree cache
+        Index("ix_canvas_changes_canvas_entity_seq", "canvas_id", "entity", "seq"),
+        # Never reuse a seq, even after old changes are deleted
+        {"sqlite_autoincrement": True},
+    )
+
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    canvas_id: uuid.UUID
+    entity: str  # canvas, element, frame, frame_link
+    entity_id: str  # hex id; "<frame_id>:<element_id>" for frame_link
+    op: str  # insert, update, delete
+    changed_at: datetime
+
+
+def _store_shared_content(mapper, connection, element: CanvasElement) -> None:
+    # Runs in the flush, before the row is written: ElementContent stores an
+    # empty inline value for large contents, so the body has to be there.
+    if inspect(element).attrs.content.history.has_changes():
+        element.content_hash = content_digest(element.content)
+        if element.content_hash:
+            connection.execute(
+                insert(CanvasContent.__table__).prefix_with("OR IGNORE"),
+                {"hash": element.content_hash, "content": element.content},
+            )
+
+
+event.listen(CanvasElement, "before_insert", _store_shared_content)
+event.listen(CanvasElement, "before_update", _store_shared_content)
+
+
+# ============================================================================
+# Indexed attributes
+# ============================================================================
+
+# CanvasElement.attributes keys mirrored into indexed generated columns
+# (attr_<key> = json_extract(attributes, '$.<key>')). Filters on them are index
+# seeks instead of JSON parsing; see CanvasService.get_elements(attributes=...).
+# Adding a key here is enough: init_db adds the column and index to existing DBs.
+INDEXED_ATTRIBUTE_KEYS = ("author_nick", "author_name", "source_msg_id", "source")
+
+
+def attribute_column(key: str) -> Column:
+    """Returns the generated column for an indexed attribute key."""
+    if key not in INDEXED_ATTRIBUTE_KEYS:
+        raise ValueError(f"Attribute '{key}' is not indexed. Indexed attributes: {', '.join(INDEXED_ATTRIBUTE_KEYS)}")
+    return CanvasElement.__table__.c[f"attr_{key}"]
+
+
+# Not mapped on the ORM class: they are read-only and only used in WHERE clauses.
+# TEXT affinity, so numeric JSON values compare equal to their string form.
+for _key in INDEXED_ATTRIBUTE_KEYS:
+    _column = Column(f"attr_{_key}", String, Computed(f"json_extract(attributes, '$.{_key}')"))
+    CanvasElement.__table__.append_column(_column)
+    Index(
+        f"ix_canvas_elements_canvas_attr_{_key}",
+        CanvasElement.__table__.c.canvas_id, _column,
+        CanvasElement.__table__.c.created_at, CanvasElement.__table__.c.id,
+    )
@@ -0,0 +1,297 @@
+"""
+Bounded history for long-lived ADK sessions.
+
+Chat sessions use chat_id as a permanent session id, so without compaction
+every turn (tool payloads included) stays in the session DB and is replayed
+into the prompt. Before a turn, SessionCompactor checks the session against
+an event and a prompt-token budget. Past either budget it summarizes the
+older invocations into one ADK compaction event, seeded with the previous
+summary so it rolls forward, and deletes the summarized events from the
+session DB. ADK puts the summary in the prompt in place of the deleted events.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents import LlmAgent
+from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
+from google.adk.events import Event
+from google.adk.sessions import DatabaseSessionService
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ai_core.common.config import settings
+from ai_core.common.logging import logger
+
+
+# ADK internals this module relies on (google-adk is pinned in requirements.txt);
+# SessionCompactor.check_compatibility verifies them at startup.
+# - LlmEventSummarizer._MAX_TOOL_CONTENT_CHARS caps tool payloads in the summarizer input
+# - DatabaseSessionService stores events in this table, deleted by id after a compaction
+_SUMMARIZER_TOOL_CAP_ATTR = "_MAX_TOOL_CONTENT_CHARS"
+_EVENTS_TABLE = "events"
+_EVENTS_KEY_COLUMNS = {"id", "app_name", "user_id", "session_id"}
+
+
+class PayloadTrimmingSummarizer(LlmEventSummarizer):
+    """LlmEventSummarizer with a tighter cap on tool call args and results (e.g. fetch_elements JSON)."""
+
+    _MAX_TOOL_CONTENT_CHARS = settings.AGENT_COMPACTION_TOOL_CHARS
+
+
+@dataclass
+class _SessionUsage:
+    """Raw events and the last prompt size seen for a session since its last compaction."""
+    events: int = 0
+    prompt_tokens: int = 0
+
+
+def _is_compaction(event: Event) -> bool:
+    return bool(event.actions and event.actions.compaction)
+
+
+def _estimate_tokens(events: List[Event]) -> int:
+    # Rough estimate for sessions without usage metadata: 4 characters per token
+    chars = 0
+    for event in events:
+        content = event.actions.compaction.compacted_content if _is_compaction(event) else event.content
+        for part in (content.parts or []) if content else []:
+            if part.text:
+                chars += len(part.text)
+            if part.function_call:
+                chars += len(str(part.function_call.args))
+            if part.function_response:
+                chars += len(str(part.function_response.response))
+    return chars // 4
+
+
+class SessionCompactor:
+    """
+    Keeps ADK sessions within an event and prompt-token budget.
+
+    Usage of each session is tracked from the events of its turns (observe),
+    so the session is only loaded when a budget may have been exceeded, or
+    the first time a session is seen. A budget of 0 disables that trigger.
+    """
+
+    def __init__(
+        self,
+        session_service: DatabaseSessionService,
+        engine: AsyncEngine,
+        max_events: int = settings.AGENT_SESSION_MAX_EVENTS,
+        max_prompt_tokens: int = settings.AGENT_SESSION_MAX_PROMPT_TOKENS,
+        retain_events: int = settings.AGENT_SESSION_RETAIN_EVENTS,
+        cache_size: int = settings.AGENT_SESSION_CACHE_SIZE,
+    ):
+        self._session_service = session_service
+        self._engine = engine
+        self._max_events = max_events
+        self._max_prompt_tokens = max_prompt_tokens
+        self._retain_events = retain_events
+        self._usage: "OrderedDict[Tuple[str, str, str], _SessionUsage]" = OrderedDict()
+        self._cache_size = cache_size
+        self._checks = 0
+        self._compactions = 0
+        self._events_pruned = 0
+        self._failures = 0
+        self._compatible: Optional[bool] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._max_events or self._max_prompt_tokens) and self._compatible is not False
+
+    async def check_compatibility(self) -> bool:
+        """
+        Verifies the ADK internals compaction relies on; run once at startup.
+
+        A missing summarizer cap only disables payload trimming. If the
+        events table does not match, compaction is disabled: summaries could
+        not be pruned and every turn would summarize the history again.
+        """
+        if self._compatible is not None:
+            return self._compatible
+
+        if _SUMMARIZER_TOOL_CAP_ATTR not in vars(LlmEventSummarizer):
+            logger.error(
+                f"ADK compatibility: LlmEventSummarizer.{_SUMMARIZER_TOOL_CAP_ATTR} no longer exists; "
+                f"tool payloads are NOT trimmed in session summaries. Check the google-adk version."
+            )
+
+        await self._session_service.prepare_tables()
+        async with self._engine.connect() as conn:
+            rows = (await conn.exec_driver_sql(f"PRAGMA table_info({_EVENTS_TABLE})")).fetchall()
+        missing = _EVENTS_KEY_COLUMNS - {row[1] for row in rows}
+        self._compatible = not missing
+        if missing:
+            logger.error(
+                f"ADK compatibility: session table '{_EVENTS_TABLE}' is missing columns "
+                f"{sorted(missing)}; session compaction is DISABLED. Check the google-adk version."
+            )
+        return self._compatible
+
+    def _over_budget(self, usage: _SessionUsage) -> bool:
+        return bool(
+            (self._max_events and usage.events > self._max_events)
+            or (self._max_prompt_tokens and usage.prompt_tokens > self._max_prompt_tokens)
+        )
+
+    def _set_usage(self, key: Tuple[str, str, str], usage: _SessionUsage) -> None:
+        self._usage[key] = usage
+        self._usage.move_to_end(key)
+        if len(self._usage) > self._cache_size:
+            self._usage.popitem(last=False)
+
+    def observe(self, app_name: str, user_id: str, session_id: str, event: Event) -> None:
+        """Accounts for an event a turn added to the session."""
+        usage = self._usage.get((app_name, user_id, session_id))
+        if usage is None or event.partial:
+            return
+        usage.events += 1
+        if event.usage_metadata and event.usage_metadata.prompt_token_count:
+            usage.prompt_tokens = event.usage_metadata.prompt_token_count
+
+    async def maybe_compact(self, agent: LlmAgent, app_name: str, user_id: str, session_id: str) -> bool:
+        """
+        Compacts the session if it is over budget. Returns True if it was compacted.
+
+        Failures are logged and never fail the turn; the session is checked
+        again on its next turn.
+        """
+        if not self.enabled or not await self.check_compatibility():
+            return False
+        key = (app_name, user_id, session_id)
+        usage = self._usage.get(key)
+        if usage is not None and not self._over_budget(usage):
+            return False
+        # Concurrent turns of the same session see it as checked and go ahead
+        self._set_usage(key, _SessionUsage())
+
+        self._checks += 1
+        try:
+            return await self._compact(agent, key)
+        except Exception as e:
+            self._failures += 1
+            self._usage.pop(key, None)
+            logger.warning(f"Failed to compact session {session_id}: {e}")
+            return False
+
+    async def _compact(self, agent: LlmAgent, key: Tuple[str, str, str]) -> bool:
+        app_name, user_id, session_id = key
+        session = await self._session_service.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+        if not session:
+            self._usage.pop(key, None)
+            return False
+
+        compactions = [e for e in session.events if _is_compaction(e)]
+        summary = max(compactions, key=lambda e: e.actions.compaction.end_timestamp, default=None)
+        summarized_until = summary.actions.compaction.end_timestamp if summary else 0.0
+        raw = [e for e in session.events if not _is_compaction(e) and e.timestamp > summarized_until]
+
+        prompt_tokens = next(
+            (e.usage_metadata.prompt_token_count for e in reversed(raw)
+             if e.usage_metadata and e.usage_metadata.prompt_token_count),
+            None,
+        )
+        if prompt_tokens is None:
+            prompt_tokens = _estimate_tokens(([summary] if summary else []) + raw)
+        usage = _SessionUsage(events=len(raw), prompt_tokens=prompt_tokens)
+        if not self._over_budget(usage):
+            self._set_usage(key, usage)
+            return False
+
+        events_over = bool(self._max_events and usage.events > self._max_events)
+        to_summarize = self._split(raw, token_triggered=not events_over)
+        if not to_summarize:
+            self._set_usage(key, usage)
+            return False
+
+        seed = []
+        if summary:
+            # Rolling summary: the new one covers the previous summaries' range too
+            seed = [Event(
+                timestamp=min(e.actions.compaction.start_timestamp for e in compactions),
+                author="model",
+                content=summary.actions.compaction.compacted_content,
+                invocation_id=Event.new_id(),
+            )]
+        summarizer = PayloadTrimmingSummarizer(llm=agent.canonical_model)
+        compaction_event = await summarizer.maybe_summarize_events(events=seed + to_summarize)
+        if compaction_event is None:
+            self._set_usage(key, usage)
+            return False
+        await self._session_service.append_event(session=session, event=compaction_event)
+
+        summarized_until = compaction_event.actions.compaction.end_timestamp
+        stale_ids = [e.id for e in compactions] + [
+            e.id for e in session.events
+            if not _is_compaction(e) and e.timestamp <= summarized_until
+        ]
+        pruned = await self._delete_events(key, stale_ids)
+
+        self._compactions += 1
+        self._events_pruned += pruned
+        self._set_usage(key, _SessionUsage(events=len(raw) - len(to_summarize)))
+        logger.info(
+            f"Compacted session {session_id}: summarized {len(to_summarize)} events, "
+            f"pruned {pruned}, kept {len(raw) - len(to_summarize)}"
+        )
+        return True
+
+    def _split(self, raw: List[Event], token_triggered: bool) -> List[Event]:
+        """
+        Returns the leading events to summarize. Whole invocations are kept
+        verbatim from the newest back, up to retain_events, so a tool call is
+        never separated from its response. When only the prompt size is over
+        budget, at most the last invocation is kept.
+        """
+        invocations: List[List[Event]] = []
+        for event in raw:
+            if invocations and invocations[-1][0].invocation_id == event.invocation_id:
+                invocations[-1].append(event)
+            else:
+                invocations.append([event])
+
+        kept, kept_events = 0, 0
+        for invocation in reversed(invocations):
+            if kept_events + len(invocation) > self._retain_events:
+                break
+            kept += 1
+            kept_events += len(invocation)
+        if token_triggered:
+            kept = min(kept, 1)
+        return [event for invocation in invocations[:len(invocations) - kept] for event in invocation]
+
+    async def _delete_events(self, key: Tuple[str, str, str], event_ids: List[str]) -> int:
+        if not event_ids:
+            return 0
+        app_name, user_id, session_id = key
+        stmt = text(
+            f"DELETE FROM {_EVENTS_TABLE} WHERE app_name = :app_name AND user_id = :user_id "
+            "AND session_id = :session_id AND id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True))
+        async with self._engine.begin() as conn:
+            result = await conn.execute(stmt, {
+                "app_name": app_name, "user_id": user_id, "session_id": session_id, "ids": event_ids,
+            })
+        return result.rowcount
+
+    def forget(self, app_name: str, user_id: str, session_id: str) -> None:
+        """Drops tracked usage so the session is checked on its next turn."""
+        self._usage.pop((app_name, user_id, session_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns compaction counters."""
+        return {
+            "tracked_sessions": len(self._usage),
+            "max_events": self._max_events,
+            "max_prompt_tokens": self._max_prompt_tokens,
+            "retain_events": self._retain_events,
+            "checks": self._checks,
+            "compactions": self._compactions,
+            "events_pruned": self._events_pruned,
+            "failures": self._failures,
+            "compatible": self._compatible,
+        }
@@ -7,14 +7,14 @@ Encapsulates the logic for executing AI agents.
 import uuid
 from typing import List
 from ai_core.common.logging import logger
-from ai_core.common.adk import run_agent_sync, standard_retry
+from ai_core.common.adk import run_agent_async, standard_retry
 from ai_core.agents.chat_summarizer.agent import agent as summarizer_agent
 
 from ai_core.agents.orchestrator.agent import agent as orchestrator_agent
 from ai_core.common.models import CanvasElement
 
 @standard_retry
-def run_summarizer(chat_id: str, instruction: str = None, user_id: str = "system") -> str:
+async def run_summarizer(chat_id: str, instruction: str = None, user_id: str = "system") -> str:
     """
     Runs the Summarizer agent for a specific chat.
     
@@ -39,15 +39,16 @@ def run_summarizer(chat_id: str, instruction: str = None, user_id: str = "system
     else:
         user_message = base_instruction
     
-    return run_agent_sync(
+    return await run_agent_async(
         agent=summarizer_agent,
         user_message=user_message,
+        chat_id=chat_id,
         user_id=user_id,
         session_id=f"summarizer_{chat_id}_{uuid.uuid4()}"
     )
 
 @standard_retry
-def run_document_summarizer(chat_id: str, documents: List[CanvasElement], user_id: str = "system") -> str:
+async def run_document_summarizer(chat_id: str, documents: List[CanvasElement], user_id: str = "system") -> str:
     """
     Runs the Summarizer agent to summarize documents for a specific chat.
     
@@ -72,15 +73,16 @@ def run_document_summarizer(chat_id: str, documents: List[CanvasElement], user_i
     
     user_message = f"Please summarize the following documents for chat_id='{chat_id}':\n\n{docs_text}"
     
-    return run_agent_sync(
+    return await run_agent_async(
         agent=summarizer_agent,
         user_message=user_message,
+        chat_id=chat_id,
         user_id=user_id,
         session_id=f"doc_summarizer_{chat_id}_{uuid.uuid4()}"
     )
 
 @standard_retry
-def run_orchestrator(
+async def run_orchestrator(
     chat_id: str,
     user_id: str,
     user_message: str,
@@ -97,9 +99,10 @@ def run_orchestrator(
     reply_suffix = f" [reply_to:{reply_to}]" if reply_to else ""
     enriched_message = f"{context_prefix}{reply_suffix}\nUSER: {user_message}"
 
-    return run_agent_sync(
+    return await run_agent_async(
         agent=orchestrator_agent,
         user_message=enriched_message,
+        chat_id=chat_id,
         user_id=user_id,
         session_id=session_id
     )
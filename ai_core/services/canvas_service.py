@@ -1,52 +1,279 @@
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, List, Optional, Dict, Sequence, Set, Tuple, AsyncIterator
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import base64
+import json
+import re
+import threading
 import uuid
 from sqlmodel import select, col
+from sqlalchemy import delete, insert, func, or_, and_, text, table, column, literal_column
+from sqlalchemy import JSON, DateTime, Integer, String, Uuid
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 
-from ai_core.storage.db import async_session
-from ai_core.common.models import Canvas, CanvasElement, CanvasFrame
+from ai_core.common.config import settings
+from ai_core.storage.db import async_session, read_session, current_session, fts_content_rows, FTS_SET_CONTENT, FTS_TABLE
+from ai_core.common.models import (
+    Canvas, CanvasAccess, CanvasChange, CanvasContent, CanvasElement, CanvasElementFrameLink, CanvasFrame,
+    CanvasFrameStats, FrameTreeNode, attribute_column, content_digest, element_content_sql
+)
+
+class ElementWriteQueue:
+    """
+    Group commit for element inserts.
+    
+    A background task (started on first use, one per event loop) takes queued
+    elements, waits up to max_delay_ms for more and commits them in one
+    transaction: one fsync and one write-lock round trip per batch instead of
+    per message. Each submit() resolves when its element is committed. If a
+    batch fails, its elements are retried one by one so a bad element only
+    fails its own caller. If the task stops (cancelled), waiting callers get
+    a RuntimeError and the next submit() starts a new task.
+    """
+
+    def __init__(
+        self,
+        max_delay_ms: float = settings.ELEMENT_WRITE_MAX_DELAY_MS,
+        max_batch: int = settings.ELEMENT_WRITE_MAX_BATCH
+    ):
+        self._max_delay = max_delay_ms / 1000
+        self._max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batches = 0
+        self._elements = 0
+
+    async def submit(self, element: CanvasElement, frame_id: Optional[uuid.UUID] = None) -> CanvasElement:
+        """Queues the element (and its frame link) and waits for its commit."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # The writer of the previous loop keeps serving its own queue
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = None
+        if self._task is None or self._task.done():
+            # A stopped writer failed what it held; a new one takes over the same queue
+            self._task = loop.create_task(self._run(self._queue))
+        future = loop.create_future()
+        self._queue.put_nowait((element, frame_id, future))
+        return await future
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches": self._batches,
+            "elements": self._elements,
+            "pending": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = loop.time() + self._max_delay
+                while len(batch) < self._max_batch:
+                    if not queue.empty():
+                        batch.append(queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._write(batch)
+        finally:
+            # Cancelled (e.g. loop shutdown) or crashed: nothing else would resolve
+            # the batch in flight or the elements still queued
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Element writer stopped before the element was committed"))
+
+    async def _write(self, batch) -> None:
+        try:
+            async with async_session() as session:
+                seqs = await _reserve_seqs(session, [element.canvas_id for element, _, _ in batch])
+                for (element, frame_id, _), seq in zip(batch, seqs):
+                    element.seq = seq
+                    session.add(element)
+                    if frame_id:
+                        session.add(CanvasElementFrameLink(frame_id=frame_id, element_id=element.id))
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                future = batch[0][2]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            for item in batch:
+                await self._write([item])
+            return
+        self._batches += 1
+        self._elements += len(batch)
+        for element, _, future in batch:
+            if not future.done():
+                future.set_result(element)
+
 
 class CanvasService:
+
+    def __init__(self, cache_size: int = settings.CANVAS_CACHE_SIZE):
+        # LRU of chat_id -> Canvas. Tools resolve the canvas several times per
+        # agent turn; entries are dropped by update_canvas/update_canvas_access.
+        # Used from the bot's loop and the tool bridge loop's thread, hence the lock.
+        self._canvas_cache: "OrderedDict[str, Canvas]" = OrderedDict()
+        self._canvas_cache_lock = threading.Lock()
+        self._canvas_cache_size = cache_size
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._write_queue = ElementWriteQueue()
+        # LRU of canvas_id -> (frame change cursor, frame tree), see get_frame_tree
+        self._frame_tree_cache: "OrderedDict[uuid.UUID, Tuple[int, List[FrameTreeNode]]]" = OrderedDict()
+        self._frame_tree_cache_lock = threading.Lock()
     
     async def get_or_create_canvas_for_chat(self, chat_id: str, create_if_not_found: bool = True) -> Canvas:
         """
         Retrieves a canvas accessible by the given chat_id, or creates one if none exists.
         For MVP, we assume 1:1 mapping, but the schema supports N:N.
         """
+        cache_key = str(chat_id)
+        with self._canvas_cache_lock:
+            canvas = self._canvas_cache.get(cache_key)
+            if canvas is not None:
+                self._canvas_cache.move_to_end(cache_key)
+                self._cache_hits += 1
+                return canvas
+            self._cache_misses += 1
+
+        canvas = await self._resolve_canvas_for_chat(chat_id, create_if_not_found)
+        with self._canvas_cache_lock:
+            self._canvas_cache[cache_key] = canvas
+            if len(self._canvas_cache) > self._canvas_cache_size:
+                self._canvas_cache.popitem(last=False)
+        return canvas
+
+    def invalidate_canvas_cache(self, canvas_id: Optional[uuid.UUID] = None) -> None:
+        """Drops cached entries pointing to canvas_id (all entries if None)."""
+        with self._canvas_cache_lock:
+            if canvas_id is None:
+                self._canvas_cache.clear()
+                return
+            for key in [k for k, c in self._canvas_cache.items() if c.id == canvas_id]:
+                del self._canvas_cache[key]
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Returns canvas resolution cache counters."""
+        return {
+            "size": len(self._canvas_cache),
+            "max_size": self._canvas_cache_size,
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+        }
+
+    @asynccontextmanager
+    async def _session(self):
+        """Session of the enclosing unit_of_work() block, or a fresh one."""
+        session = current_session()
+        if session is not None:
+            yield session
+            return
+        async with async_session() as session:
+            yield session
+
+    @asynccontextmanager
+    async def _read_session(self):
+        """Like _session, but outside a unit of work reads go to the read-only engine."""
+        session = current_session()
+        if session is not None:
+            # Read-your-writes inside the block
+            yield session
+            return
+        async with read_session() as session:
+            yield session
+
+    async def _commit(self, session) -> None:
+        # Inside unit_of_work() the block commits once; just send the SQL now
+        if session is current_session():
+            await session.flush()
+        else:
+            await session.commit()
+
+    async def _resolve_canvas_for_chat(self, chat_id: str, create_if_not_found: bool) -> Canvas:
         auth_key = f"telegram:chat:{chat_id}"
         
-        async with async_session() as session:
-            # 1. Try to find a canvas where access_rules contains this chat_id
-            # Note: JSON containment query depends on DB. For SQLite, we might need a simpler approach or custom function.
-            # For MVP/SQLite, we'll fetch all and filter in python if needed, or use a simpler convention.
-            # Let's try a direct query assuming we can filter.
-            # Actually, for MVP, let's just query by a convention or name if we want to be safe with SQLite JSON.
-            # BUT, let's try to do it right.
-            
-            # Optimization: For MVP, let's just select all canvases and filter in python. 
-            # It's not efficient for production but safe for SQLite without extensions.
-            statement = select(Canvas)
-            result = await session.execute(statement)
-            canvases = result.scalars().all()
-            
-            for canvas in canvases:
-                if auth_key in canvas.access_rules:
-                    return canvas
-            
-            # 2. If not found, create new
-            if not create_if_not_found:
-                raise ValueError(f"Canvas not found for chat_id: {chat_id}")
+        # 1. Indexed point lookup through the normalized access table
+        async with read_session() as session:
+            canvas = await self._find_canvas_by_principal(session, auth_key)
+        if canvas:
+            return canvas
+        
+        # 2. If not found, create new
+        if not create_if_not_found:
+            raise ValueError(f"Canvas not found for chat_id: {chat_id}")
 
+        # Always a separate, short transaction: on a creation race the rollback
+        # must not discard the caller's unit of work. Resolve the canvas before
+        # writing anything else in a unit_of_work() block.
+        async with async_session() as session:
             new_canvas = Canvas(
                 name=f"Canvas for chat_id={chat_id}",
                 access_rules=[auth_key]
             )
             session.add(new_canvas)
-            await session.commit()
+            self._add_access_rows(session, new_canvas)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # A concurrent request created the canvas for this chat first
+                # (unique chat principal in canvas_access). Use theirs.
+                await session.rollback()
+                canvas = await self._find_canvas_by_principal(session, auth_key)
+                if canvas:
+                    return canvas
+                raise
             await session.refresh(new_canvas)
             return new_canvas
 
+    async def _find_canvas_by_principal(self, session, principal: str) -> Optional[Canvas]:
+        statement = (
+            select(Canvas)
+            .join(CanvasAccess, CanvasAccess.canvas_id == Canvas.id)
+            .where(CanvasAccess.principal == principal)
+            .limit(1)
+        )
+        result = await session.execute(statement)
+        return result.scalars().first()
+
+    def _add_access_rows(self, session, canvas: Canvas) -> None:
+        """Mirrors canvas.access_rules into canvas_access (rows are added to the session)."""
+        for principal in dict.fromkeys(canvas.access_rules or []):
+            session.add(CanvasAccess(principal=principal, canvas_id=canvas.id))
+
+    async def update_canvas_access(self, canvas_id: uuid.UUID, access_rules: List[str]) -> Optional[Canvas]:
+        """Replaces canvas access rules, keeping canvas_access in sync."""
+        async with self._session() as session:
+            canvas = await session.get(Canvas, canvas_id)
+            if not canvas:
+                return None
+            canvas.access_rules = list(access_rules)
+            session.add(canvas)
+            await session.execute(delete(CanvasAccess).where(CanvasAccess.canvas_id == canvas_id))
+            self._add_access_rows(session, canvas)
+            await self._commit(session)
+            await session.refresh(canvas)
+        # Chats may have gained or lost access, drop everything that could be stale
+        self.invalidate_canvas_cache()
+        return canvas
+
     async def add_element(
         self,
         canvas_id: uuid.UUID,
@@ -60,13 +287,60 @@ class CanvasService:
         """
         Adds a new element to the canvas.
         """
+        element = self._new_element(canvas_id, type, content, created_by, attributes, element_id)
+        
+        async with self._session() as session:
+            element.seq = (await _reserve_seqs(session, [canvas_id]))[0]
+            session.add(element)
+            # If frame_id provided, link it in the same transaction
+            if frame_id:
+                session.add(CanvasElementFrameLink(frame_id=frame_id, element_id=element.id))
+            await self._commit(session)
+            await session.refresh(element)
+            return element
+
+    async def add_element_batched(
+        self,
+        canvas_id: uuid.UUID,
+        type: str,
+        content: str,
+        created_by: str,
+        attributes: dict = None,
+        frame_id: Optional[uuid.UUID] = None,
+        element_id: Optional[uuid.UUID] = None
+    ) -> CanvasElement:
+        """
+        add_element through the group-commit writer, for high-rate ingestion.
+        
+        Concurrent calls are collected for up to ELEMENT_WRITE_MAX_DELAY_MS and
+        committed in one transaction. Returns after the commit, so reads that
+        follow see the element. Inside unit_of_work() this is add_element.
+        """
+        if current_session() is not None:
+            return await self.add_element(canvas_id, type, content, created_by, attributes, frame_id, element_id)
+        element = self._new_element(canvas_id, type, content, created_by, attributes, element_id)
+        return await self._write_queue.submit(element, frame_id)
+
+    def write_stats(self) -> Dict[str, int]:
+        """Returns group-commit writer counters."""
+        return self._write_queue.stats()
+
+    def _new_element(
+        self,
+        canvas_id: uuid.UUID,
+        type: str,
+        content: str,
+        created_by: str,
+        attributes: Optional[dict],
+        element_id: Optional[uuid.UUID]
+    ) -> CanvasElement:
         if attributes is None:
             attributes = {}
             
         # Store created_by in attributes
         attributes['created_by'] = created_by
             
-        element = CanvasElement(
+        return CanvasElement(
             id=element_id if element_id else uuid.uuid4(),
             canvas_id=canvas_id,
             # frame_id=frame_id, # REMOVED
@@ -75,22 +349,137 @@ class CanvasService:
             created_by=created_by,
             attributes=attributes
         )
+
+    async def add_elements_bulk(
+        self,
+        elements: List[Dict[str, Any]],
+        skip_existing: bool = False
+    ) -> List[uuid.UUID]:
+        """
+        Inserts many elements (and their frame links) in one transaction.
         
-        async with async_session() as session:
-            session.add(element)
-            await session.commit()
-            await session.refresh(element)
-            
-            # If frame_id provided, link it
-            if frame_id:
-                await self.add_element_to_frame(element.id, frame_id)
-                # Refresh to get updated state if needed, though link is separate
-                
-            return element
+        Each item takes add_element's arguments: canvas_id, type, content, created_by
+        and optionally attributes, frame_id, element_id, plus name and created_at.
+        Rows go straight to executemany: no ORM objects, no per-row refresh.
+        
+        skip_existing: ignore elements whose id already exists (idempotent re-imports).
+        
+        Returns the element ids in input order.
+        """
+        if not elements:
+            return []
+
+        rows = []
+        links = []
+        bodies = {}
+        for item in elements:
+            attributes = dict(item.get("attributes") or {})
+            attributes["created_by"] = item["created_by"]
+            element_id = item.get("element_id") or uuid.uuid4()
+            # Large contents are stored once in canvas_contents (see models.ElementContent)
+            content_hash = content_digest(item["content"])
+            if content_hash:
+                bodies[content_hash] = {"hash": content_hash, "content": item["content"]}
+            rows.append({
+                "id": element_id,
+                "canvas_id": item["canvas_id"],
+                "type": item["type"],
+                "name": item.get("name"),
+                "content": item["content"],
+                "content_hash": content_hash,
+                "created_by": item["created_by"],
+                "attributes": attributes,
+                "created_at": item.get("created_at") or datetime.now(timezone.utc),
+            })
+            if item.get("frame_id"):
+                links.append({"frame_id": item["frame_id"], "element_id": element_id})
+
+        insert_elements = sqlite_insert(CanvasElement.__table__)
+        if skip_existing:
+            # Only duplicate ids: OR IGNORE would also drop rows failing NOT NULL and other constraints
+            insert_elements = insert_elements.on_conflict_do_nothing(index_elements=["id"])
+
+        async with self._session() as session:
+            seqs = await _reserve_seqs(session, [row["canvas_id"] for row in rows])
+            for row, seq in zip(rows, seqs):
+                row["seq"] = seq
+            if bodies:
+                await session.execute(insert(CanvasContent.__table__).prefix_with("OR IGNORE"), list(bodies.values()))
+            await session.execute(insert_elements, rows)
+            fts_rows = fts_content_rows(
+                [{"id": row["id"], "content": row["content"], "seq": row["seq"]} for row in rows]
+            )
+            if fts_rows:
+                await session.execute(FTS_SET_CONTENT, fts_rows)
+            if links:
+                await session.execute(insert(CanvasElementFrameLink.__table__).prefix_with("OR IGNORE"), links)
+            await self._commit(session)
+        return [row["id"] for row in rows]
+
+    async def add_elements_to_frame_bulk(self, frame_id: uuid.UUID, element_ids: List[uuid.UUID]) -> int:
+        """
+        Links many elements to a frame in one statement. Existing links are kept.
+        Returns the number of new links.
+        """
+        if not element_ids:
+            return 0
+        rows = [{"frame_id": frame_id, "element_id": element_id} for element_id in dict.fromkeys(element_ids)]
+        async with self._session() as session:
+            result = await session.execute(insert(CanvasElementFrameLink.__table__).prefix_with("OR IGNORE"), rows)
+            await self._commit(session)
+            return result.rowcount
+
+    async def remove_elements_from_frame_bulk(self, frame_id: uuid.UUID, element_ids: List[uuid.UUID]) -> int:
+        """
+        Unlinks many elements from a frame in one statement.
+        Returns the number of links removed.
+        """
+        if not element_ids:
+            return 0
+        statement = delete(CanvasElementFrameLink).where(
+            CanvasElementFrameLink.frame_id == frame_id,
+            CanvasElementFrameLink.element_id.in_(set(element_ids)),
+        )
+        async with self._session() as session:
+            result = await session.execute(statement)
+            await self._commit(session)
+            return result.rowcount
+
+    async def get_canvas_element_ids(self, canvas_id: uuid.UUID, element_ids: List[uuid.UUID]) -> Set[uuid.UUID]:
+        """Which of element_ids exist on the canvas, in one query (ownership checks)."""
+        if not element_ids:
+            return set()
+        statement = select(CanvasElement.id).where(
+            CanvasElement.canvas_id == canvas_id, CanvasElement.id.in_(set(element_ids))
+        )
+        async with self._read_session() as session:
+            result = await session.execute(statement)
+            return set(result.scalars().all())
+
+    async def has_content(self, content: str) -> bool:
+        """
+        Whether an element with exactly this content exists: one primary key
+        lookup by hash. Only contents of at least ELEMENT_DEDUP_MIN_BYTES are
+        tracked; smaller ones always return False.
+        """
+        content_hash = content_digest(content)
+        if content_hash is None:
+            return False
+        statement = select(CanvasContent.ref_count).where(CanvasContent.hash == content_hash)
+        async with self._read_session() as session:
+            result = await session.execute(statement)
+            return (result.scalar() or 0) > 0
+
+    async def purge_unused_contents(self) -> int:
+        """Deletes shared bodies no element refers to anymore. Returns the number deleted."""
+        async with self._session() as session:
+            result = await session.execute(delete(CanvasContent).where(CanvasContent.ref_count <= 0))
+            await self._commit(session)
+            return result.rowcount
 
     async def get_element(self, element_id: uuid.UUID) -> Optional[CanvasElement]:
         """Retrieves a single element by ID."""
-        async with async_session() as session:
+        async with self._read_session() as session:
             # Eagerly load frames to avoid DetachedInstanceError
             statement = select(CanvasElement).where(CanvasElement.id == element_id).options(selectinload(CanvasElement.frames))
             result = await session.execute(statement)
@@ -103,33 +492,294 @@ class CanvasService:
         offset: int = 0,
         type: Optional[str] = None,
         since: Optional[datetime] = None,
-        frame_id: Optional[uuid.UUID] = None
-    ) -> List[CanvasElement]:
+        frame_id: Optional[uuid.UUID] = None,
+        until: Optional[datetime] = None,
+        created_by_contains: Optional[str] = None,
+        author_contains: Optional[str] = None,
+        content_contains: Optional[str] = None,
+        cursor: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
         """
-        Retrieves elements from a canvas with optional filtering.
+        Retrieves elements from a canvas with optional filtering, newest first.
+        
+        All filters are evaluated by the database, so `limit` is exact:
+        - since / until: created_at >= since, created_at < until.
+        - created_by_contains: case-insensitive substring of created_by.
+        - author_contains: case-insensitive substring of attributes.author_name or author_nick.
+        - content_contains: case-insensitive substring of content.
+        - attributes: exact match on indexed attribute keys (models.INDEXED_ATTRIBUTE_KEYS),
+          e.g. {"source_msg_id": "12345"} or {"author_nick": "irina"}. Values are compared as text.
+        - cursor: continue after the element the cursor was made from
+          (see element_cursor / get_elements_page). Prefer it over `offset`:
+          constant cost per page and stable while new elements arrive.
+        - columns: return read-only rows with just these CanvasElement columns
+          (e.g. ELEMENT_SUMMARY_COLUMNS) instead of entities: no identity map,
+          no frames query. Rows always carry id and created_at. Use
+          get_frame_ids() if frame ids are needed.
         """
-        async with async_session() as session:
-            statement = select(CanvasElement).where(CanvasElement.canvas_id == canvas_id)
-            
-            if type:
-                statement = statement.where(CanvasElement.type == type)
-            
-            if since:
-                statement = statement.where(CanvasElement.created_at >= since)
-                
-            if frame_id:
-                # Join with link table
-                from ai_core.common.models import CanvasElementFrameLink
-                statement = statement.join(CanvasElementFrameLink).where(CanvasElementFrameLink.frame_id == frame_id)
-            
-            statement = statement.order_by(CanvasElement.created_at.desc())
-            statement = statement.offset(offset).limit(limit)
-            
-            # Eagerly load frames to avoid DetachedInstanceError when accessing el.frames later
-            statement = statement.options(selectinload(CanvasElement.frames))
-            
+        statement = self._elements_statement(
+            canvas_id, type=type, since=since, until=until, frame_id=frame_id,
+            created_by_contains=created_by_contains, author_contains=author_contains,
+            content_contains=content_contains, attributes=attributes, columns=columns
+        )
+        if cursor:
+            cursor_at, cursor_id = decode_element_cursor(cursor)
+            # created_at <= X narrows the index range; the OR breaks ties by id
+            statement = statement.where(
+                CanvasElement.created_at <= cursor_at,
+                or_(
+                    CanvasElement.created_at < cursor_at,
+                    and_(CanvasElement.created_at == cursor_at, CanvasElement.id < cursor_id),
+                ),
+            )
+        statement = statement.order_by(CanvasElement.created_at.desc(), CanvasElement.id.desc())
+        statement = statement.offset(offset).limit(limit)
+        
+        async with self._read_session() as session:
             result = await session.execute(statement)
-            return result.scalars().all()
+            return result.all() if columns else result.scalars().all()
+
+    async def get_elements_page(
+        self,
+        canvas_id: uuid.UUID,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        **filters
+    ) -> Tuple[List[CanvasElement], Optional[str]]:
+        """
+        Keyset-paginated get_elements: returns (elements, next_cursor).
+        next_cursor is None on the last page. Accepts the get_elements filters.
+        """
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        elements = await self.get_elements(canvas_id, limit=limit + 1, cursor=cursor, **filters)
+        if len(elements) <= limit:
+            return elements, None
+        elements = elements[:limit]
+        return elements, element_cursor(elements[-1])
+
+    async def iter_elements(
+        self,
+        canvas_id: uuid.UUID,
+        batch_size: int = 500,
+        **filters
+    ) -> AsyncIterator[CanvasElement]:
+        """Walks the whole (filtered) canvas history, newest first, page by page."""
+        cursor = None
+        while True:
+            elements, cursor = await self.get_elements_page(canvas_id, limit=batch_size, cursor=cursor, **filters)
+            for element in elements:
+                yield element
+            if cursor is None:
+                return
+
+    async def get_high_water_mark(self, canvas_id: uuid.UUID) -> int:
+        """Seq of the newest element on the canvas, 0 if it has none."""
+        statement = select(func.coalesce(func.max(CanvasElement.seq), 0)).where(CanvasElement.canvas_id == canvas_id)
+        async with self._read_session() as session:
+            return (await session.execute(statement)).scalar()
+
+    async def get_elements_after_seq(
+        self,
+        canvas_id: uuid.UUID,
+        after_seq: int = 0,
+        limit: int = 500,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
+        """
+        Elements added after `after_seq`, oldest first: one index range scan.
+        
+        For incremental consumers: remember the seq of the last element seen
+        (or get_high_water_mark()) and ask again with it. `columns` works as
+        in get_elements.
+        """
+        if columns:
+            columns = list(columns)
+            if not any(c is CanvasElement.seq for c in columns):
+                columns.append(CanvasElement.seq)
+            statement = select(*columns)
+        else:
+            statement = select(CanvasElement).options(selectinload(CanvasElement.frames))
+        statement = (
+            statement
+            .where(CanvasElement.canvas_id == canvas_id, CanvasElement.seq > after_seq)
+            .order_by(CanvasElement.seq)
+            .limit(limit)
+        )
+        async with self._read_session() as session:
+            result = await session.execute(statement)
+            return result.all() if columns else result.scalars().all()
+
+    async def get_changes(
+        self,
+        canvas_id: uuid.UUID,
+        after_seq: int = 0,
+        limit: int = 500
+    ) -> Tuple[List[CanvasChange], int]:
+        """
+        Change feed of a canvas: changes after `after_seq`, oldest first, and
+        the cursor for the next call (seq of the last change returned, or
+        `after_seq` if there is nothing new).
+        
+        Start from 0 for the whole history or from get_change_cursor() for
+        new changes only.
+        """
+        statement = (
+            select(CanvasChange)
+            .where(CanvasChange.canvas_id == canvas_id, CanvasChange.seq > after_seq)
+            .order_by(CanvasChange.seq)
+            .limit(limit)
+        )
+        async with self._read_session() as session:
+            changes = (await session.execute(statement)).scalars().all()
+        return changes, (changes[-1].seq if changes else after_seq)
+
+    async def get_change_cursor(self, canvas_id: uuid.UUID) -> int:
+        """Cursor pointing after the latest change of the canvas."""
+        statement = select(func.coalesce(func.max(CanvasChange.seq), 0)).where(CanvasChange.canvas_id == canvas_id)
+        async with self._read_session() as session:
+            return (await session.execute(statement)).scalar()
+
+    async def watch_changes(
+        self,
+        canvas_id: uuid.UUID,
+        after_seq: int = 0,
+        poll_interval: float = 1.0,
+        batch_size: int = 500
+    ) -> AsyncIterator[CanvasChange]:
+        """Tails the change feed forever, polling every `poll_interval` seconds once caught up."""
+        cursor = after_seq
+        while True:
+            changes, cursor = await self.get_changes(canvas_id, after_seq=cursor, limit=batch_size)
+            for change in changes:
+                yield change
+            if len(changes) < batch_size:
+                await asyncio.sleep(poll_interval)
+
+    async def search_elements(
+        self,
+        canvas_id: uuid.UUID,
+        query: str,
+        limit: int = 20,
+        prefix: bool = True,
+        type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        frame_id: Optional[uuid.UUID] = None,
+        until: Optional[datetime] = None,
+        created_by_contains: Optional[str] = None,
+        author_contains: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Any]:
+        """
+        Full-text search over element name and content, best matches first (bm25).
+        
+        Query syntax:
+        - `budget plan`: elements containing all words; with `prefix` each word
+          also matches as a prefix ("проект" finds "проекта").
+        - `"budget plan"`: exact phrase.
+        
+        Falls back to a substring match (newest first) if the query has no words.
+        `columns` works as in get_elements.
+        """
+        match = _fts_match_query(query, prefix=prefix)
+        filters = dict(
+            type=type, since=since, until=until, frame_id=frame_id,
+            created_by_contains=created_by_contains, author_contains=author_contains,
+            attributes=attributes, columns=columns
+        )
+        if match is None:
+            return await self.get_elements(canvas_id, limit=limit, content_contains=query, **filters)
+
+        statement = self._elements_statement(canvas_id, **filters)
+        statement = (
+            statement
+            .join(_fts, _fts.c.rowid == _ELEMENT_ROWID)
+            .where(text(f"{FTS_TABLE} MATCH :fts_match").bindparams(fts_match=match))
+            .order_by(text(f"bm25({FTS_TABLE})"))
+            .limit(limit)
+        )
+        async with self._read_session() as session:
+            result = await session.execute(statement)
+            return result.all() if columns else result.scalars().all()
+
+    async def get_frame_ids(self, element_ids: Sequence[uuid.UUID]) -> Dict[uuid.UUID, List[uuid.UUID]]:
+        """Frame ids of many elements in one query: {element_id: [frame_id, ...]}."""
+        frame_ids: Dict[uuid.UUID, List[uuid.UUID]] = {element_id: [] for element_id in element_ids}
+        if not frame_ids:
+            return frame_ids
+        statement = select(CanvasElementFrameLink.element_id, CanvasElementFrameLink.frame_id).where(
+            CanvasElementFrameLink.element_id.in_(list(frame_ids))
+        )
+        async with self._read_session() as session:
+            result = await session.execute(statement)
+            for element_id, frame_id in result.all():
+                frame_ids[element_id].append(frame_id)
+        return frame_ids
+
+    def _elements_statement(
+        self,
+        canvas_id: uuid.UUID,
+        type: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        frame_id: Optional[uuid.UUID] = None,
+        created_by_contains: Optional[str] = None,
+        author_contains: Optional[str] = None,
+        content_contains: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        columns: Optional[Sequence[Any]] = None
+    ):
+        """Builds the filtered element SELECT shared by get_elements and search_elements."""
+        if columns:
+            # Ordering and cursors need id and created_at
+            columns = list(columns)
+            for required in (CanvasElement.id, CanvasElement.created_at):
+                if not any(c is required for c in columns):
+                    columns.append(required)
+            statement = select(*columns)
+        else:
+            statement = select(CanvasElement)
+        statement = statement.where(CanvasElement.canvas_id == canvas_id)
+        
+        if type:
+            statement = statement.where(CanvasElement.type == type)
+        
+        if since:
+            statement = statement.where(CanvasElement.created_at >= since)
+
+        if until:
+            statement = statement.where(CanvasElement.created_at < until)
+
+        if created_by_contains:
+            statement = statement.where(_icontains(CanvasElement.created_by, created_by_contains))
+
+        if author_contains:
+            statement = statement.where(or_(
+                _icontains(attribute_column("author_name"), author_contains),
+                _icontains(attribute_column("author_nick"), author_contains),
+            ))
+
+        for key, value in (attributes or {}).items():
+            statement = statement.where(attribute_column(key) == str(value))
+
+        if content_contains:
+            # Large contents are stored shared and compressed
+            content = func.element_text(element_content_sql(CanvasElement.__table__))
+            statement = statement.where(_icontains(content, content_contains))
+            
+        if frame_id:
+            # Join with link table
+            statement = statement.join(
+                CanvasElementFrameLink, CanvasElementFrameLink.element_id == CanvasElement.id
+            ).where(CanvasElementFrameLink.frame_id == frame_id)
+        
+        if columns:
+            return statement
+        # Eagerly load frames to avoid DetachedInstanceError when accessing el.frames later
+        return statement.options(selectinload(CanvasElement.frames))
 
     async def create_frame(
         self,
@@ -148,15 +798,15 @@ class CanvasService:
             parent_id=parent_id,
             meta=meta
         )
-        async with async_session() as session:
+        async with self._session() as session:
             session.add(frame)
-            await session.commit()
+            await self._commit(session)
             await session.refresh(frame)
             return frame
 
     async def delete_frame(self, frame_id: uuid.UUID) -> bool:
         """Deletes a frame. Links to elements are removed (cascade), elements stay."""
-        async with async_session() as session:
+        async with self._session() as session:
             frame = await session.get(CanvasFrame, frame_id)
             if not frame:
                 return False
@@ -167,44 +817,95 @@ class CanvasService:
             await session.execute(stmt)
             
             await session.delete(frame)
-            await session.commit()
+            await self._commit(session)
             return True
 
     async def update_canvas(self, canvas_id: uuid.UUID, name: str) -> Optional[Canvas]:
         """Updates canvas name."""
-        async with async_session() as session:
+        async with self._session() as session:
             canvas = await session.get(Canvas, canvas_id)
             if not canvas:
                 return None
             canvas.name = name
             session.add(canvas)
-            await session.commit()
+            await self._commit(session)
             await session.refresh(canvas)
-            return canvas
+        self.invalidate_canvas_cache(canvas_id)
+        return canvas
 
 
 
     async def get_frame(self, frame_id: uuid.UUID) -> Optional[CanvasFrame]:
         """Retrieves a single frame by ID."""
-        async with async_session() as session:
+        async with self._read_session() as session:
             return await session.get(CanvasFrame, frame_id)
 
     async def get_frames(self, canvas_id: uuid.UUID) -> List[CanvasFrame]:
         """Returns all frames for a canvas."""
-        async with async_session() as session:
+        async with self._read_session() as session:
             statement = select(CanvasFrame).where(CanvasFrame.canvas_id == canvas_id)
             result = await session.execute(statement)
             return result.scalars().all()
 
+    async def get_frame_stats(self, canvas_id: uuid.UUID) -> Dict[uuid.UUID, CanvasFrameStats]:
+        """Materialized stats of every frame of a canvas: {frame_id: stats}. O(frames)."""
+        statement = (
+            select(CanvasFrameStats)
+            .join(CanvasFrame, CanvasFrame.id == CanvasFrameStats.frame_id)
+            .where(CanvasFrame.canvas_id == canvas_id)
+        )
+        async with self._read_session() as session:
+            result = await session.execute(statement)
+            return {stats.frame_id: stats for stats in result.scalars().all()}
+
+    async def get_frame_tree(self, canvas_id: uuid.UUID) -> List[FrameTreeNode]:
+        """
+        Frame hierarchy of a canvas: root frames with nested `children`, by name,
+        each with its depth and stats (element count, last addition, types) from
+        canvas_frame_stats. One recursive query, O(frames).
+        
+        Cached per canvas. Each call checks the latest frame / frame link
+        change in the change feed (two index seeks), so creating, renaming or
+        deleting frames and linking elements refresh the tree, whichever
+        process made the change; changing an element's type does not.
+        Frames whose parent is gone become roots.
+        """
+        # Inside unit_of_work() the tree may include writes that get rolled back
+        cacheable = current_session() is None
+        async with self._read_session() as session:
+            cursor = (await session.execute(_FRAME_CHANGE_CURSOR, {"canvas_id": canvas_id.hex})).scalar()
+            if cacheable:
+                with self._frame_tree_cache_lock:
+                    cached = self._frame_tree_cache.get(canvas_id)
+                    if cached is not None and cached[0] == cursor:
+                        self._frame_tree_cache.move_to_end(canvas_id)
+                        return cached[1]
+            rows = (await session.execute(_FRAME_TREE, {"canvas_id": canvas_id.hex})).all()
+
+        nodes = {}
+        roots = []
+        for row in rows:
+            node = FrameTreeNode(**{**row._mapping, "type_counts": row.type_counts or {}})
+            nodes[node.id] = node
+            parent = nodes.get(node.parent_id) if node.depth else None
+            (parent.children if parent else roots).append(node)
+
+        if cacheable:
+            with self._frame_tree_cache_lock:
+                self._frame_tree_cache[canvas_id] = (cursor, roots)
+                if len(self._frame_tree_cache) > self._canvas_cache_size:
+                    self._frame_tree_cache.popitem(last=False)
+        return roots
+
     async def update_frame(self, frame_id: uuid.UUID, name: str) -> Optional[CanvasFrame]:
         """Updates frame name."""
-        async with async_session() as session:
+        async with self._session() as session:
             frame = await session.get(CanvasFrame, frame_id)
             if not frame:
                 return None
             frame.name = name
             session.add(frame)
-            await session.commit()
+            await self._commit(session)
             await session.refresh(frame)
             return frame
 
@@ -218,7 +919,7 @@ class CanvasService:
         attributes_to_remove: Optional[List[str]] = None
     ) -> Optional[CanvasElement]:
         """Updates element properties."""
-        async with async_session() as session:
+        async with self._session() as session:
             element = await session.get(CanvasElement, element_id)
             if not element:
                 return None
@@ -248,14 +949,14 @@ class CanvasService:
                 element.attributes = new_attrs
                 
             session.add(element)
-            await session.commit()
+            await self._commit(session)
             await session.refresh(element)
             return element
 
     async def add_element_to_frame(self, element_id: uuid.UUID, frame_id: uuid.UUID) -> bool:
         """Adds an element to a frame (creates link)."""
         from ai_core.common.models import CanvasElementFrameLink
-        async with async_session() as session:
+        async with self._session() as session:
             # Check if link exists
             link = await session.get(CanvasElementFrameLink, (frame_id, element_id))
             if link:
@@ -264,7 +965,7 @@ class CanvasService:
             link = CanvasElementFrameLink(frame_id=frame_id, element_id=element_id)
             session.add(link)
             try:
-                await session.commit()
+                await self._commit(session)
                 return True
             except Exception:
                 return False
@@ -272,13 +973,112 @@ class CanvasService:
     async def remove_element_from_frame(self, element_id: uuid.UUID, frame_id: uuid.UUID) -> bool:
         """Removes an element from a frame (deletes link)."""
         from ai_core.common.models import CanvasElementFrameLink
-        async with async_session() as session:
+        async with self._session() as session:
             link = await session.get(CanvasElementFrameLink, (frame_id, element_id))
             if link:
                 await session.delete(link)
-                await session.commit()
+                await self._commit(session)
                 return True
             return False
 
+# Projections for get_elements / search_elements(columns=...)
+ELEMENT_SUMMARY_COLUMNS = (
+    CanvasElement.id, CanvasElement.type, CanvasElement.created_at,
+    CanvasElement.created_by, CanvasElement.content,
+)
+ELEMENT_DETAIL_COLUMNS = ELEMENT_SUMMARY_COLUMNS + (CanvasElement.canvas_id, CanvasElement.attributes)
+
+
+async def _reserve_seqs(session, canvas_ids: Sequence[uuid.UUID]) -> List[int]:
+    """
+    Next element seqs for new rows on the given canvases, in input order.
+    
+    Call it in the transaction that inserts the rows, before adding them to
+    the session: write transactions hold the write lock (BEGIN IMMEDIATE),
+    so no other writer can hand out the same numbers.
+    """
+    statement = (
+        select(CanvasElement.canvas_id, func.max(CanvasElement.seq))
+        .where(CanvasElement.canvas_id.in_(set(canvas_ids)))
+        .group_by(CanvasElement.canvas_id)
+    )
+    last = {canvas_id: seq or 0 for canvas_id, seq in (await session.execute(statement)).all()}
+    seqs = []
+    for canvas_id in canvas_ids:
+        last[canvas_id] = last.get(canvas_id, 0) + 1
+        seqs.append(last[canvas_id])
+    return seqs
+
+
+def _icontains(column, needle: str):
+    """Case-insensitive (Unicode) substring match, see casefold() in storage.db."""
+    return func.instr(func.casefold(func.coalesce(column, "")), needle.casefold()) > 0
+
+def element_cursor(element: CanvasElement) -> str:
+    """Opaque pagination cursor pointing right after `element` (created_at, id)."""
+    raw = json.dumps([element.created_at.isoformat(), element.id.hex])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_element_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, element_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(element_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+# Rows in tree order (parents before children, siblings by name); roots are
+# frames without a parent on this canvas. The depth limit guards against cycles.
+_FRAME_TREE = text("""
+    WITH RECURSIVE tree(id, name, parent_id, depth, path) AS (
+        SELECT f.id, f.name, f.parent_id, 0, f.name || char(1) || f.id
+        FROM canvas_frames f
+        WHERE f.canvas_id = :canvas_id
+          AND (f.parent_id IS NULL OR NOT EXISTS (
+              SELECT 1 FROM canvas_frames p WHERE p.id = f.parent_id AND p.canvas_id = :canvas_id
+          ))
+        UNION ALL
+        SELECT f.id, f.name, f.parent_id, tree.depth + 1, tree.path || char(2) || f.name || char(1) || f.id
+        FROM canvas_frames f JOIN tree ON f.parent_id = tree.id
+        WHERE tree.depth < 64
+    )
+    SELECT tree.id, tree.name, tree.parent_id, tree.depth,
+           coalesce(s.element_count, 0) AS element_count, s.last_added_at, s.type_counts
+    FROM tree
+    LEFT JOIN canvas_frame_stats s ON s.frame_id = tree.id
+    ORDER BY tree.path
+""").columns(
+    column("id", Uuid), column("name", String), column("parent_id", Uuid), column("depth", Integer),
+    column("element_count", Integer), column("last_added_at", DateTime), column("type_counts", JSON),
+)
+
+_FRAME_CHANGE_CURSOR = text("""
+    SELECT max(
+        coalesce((SELECT max(seq) FROM canvas_changes WHERE canvas_id = :canvas_id AND entity = 'frame'), 0),
+        coalesce((SELECT max(seq) FROM canvas_changes WHERE canvas_id = :canvas_id AND entity = 'frame_link'), 0)
+    )
+""")
+
+_fts = table(FTS_TABLE, column("rowid"))
+_ELEMENT_ROWID = literal_column("canvas_elements.rowid")
+
+
+def _fts_match_query(query: str, prefix: bool = True) -> Optional[str]:
+    """
+    Turns user text into a safe FTS5 MATCH expression.
+    Words are quoted so FTS5 operators in user input are treated as text.
+    """
+    stripped = query.strip()
+    if len(stripped) > 1 and stripped.startswith('"') and stripped.endswith('"'):
+        words = re.findall(r"\w+", stripped[1:-1])
+        return '"' + " ".join(words) + '"' if words else None
+    words = re.findall(r"\w+", stripped)
+    if not words:
+        return None
+    suffix = "*" if prefix else ""
+    return " ".join(f'"{w}"{suffix}' for w in words)
+
 # Singleton instance
 canvas_service = CanvasService()
@@ -156,7 +156,8 @@ class ImageService:
                 "mime_type": "image/" + ext.replace(".", "") # Rough guess
             }
             
-            element = await canvas_service.add_element(
+            # Photos arrive with message bursts (albums): group-committed with them
+            element = await canvas_service.add_element_batched(
                 canvas_id=canvas_id,
                 type="image",
                 content=description,
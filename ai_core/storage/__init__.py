@@ -1,9 +1,11 @@
 from .db import (
-    init_db
+    init_db,
+    unit_of_work
 )
 from .fs import save_file
 
 __all__ = [
     "init_db",
+    "unit_of_work",
     "save_file"
 ]
@@ -1,12 +1,16 @@
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, AsyncIterator
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
 import uuid
 from sqlmodel import Field, SQLModel, select
-from sqlalchemy import Index
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import Index, bindparam, event, inspect, text
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from ai_core.common.config import settings
+from ai_core.common.models import CanvasElement, decompress_content, is_compressible
 
 # Database Connection
 # Ensure the directory exists is handled by fs or manual check, but here we just define the engine.
@@ -19,24 +23,402 @@ os.makedirs(os.path.dirname(settings.DB_PATH), exist_ok=True)
 
 DATABASE_URL = f"sqlite+aiosqlite:///{settings.DB_PATH}"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Connection pragmas of the storage profile (see SQLITE_* in Settings)."""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        # Negative cache_size is in KiB rather than pages
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KIB,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+    }
+
+
+def create_sqlite_engine(url: str, read_only: bool = False, extra_pragmas: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncEngine:
+    """
+    Creates an aiosqlite engine with the storage profile applied on connect.
+    
+    Write transactions start with BEGIN IMMEDIATE: writers take the write lock
+    up front and queue on busy_timeout one at a time, instead of failing with
+    "database is locked" when a read transaction tries to upgrade.
+    Read-only engines (PRAGMA query_only) and connections with
+    execution_options(read_only=True) use a plain BEGIN; under WAL they
+    read a snapshot and never wait for the writer.
+    """
+    pragmas = sqlite_pragmas()
+    if read_only:
+        # journal_mode is stored in the file and needs write access; the writer sets it
+        pragmas.pop("journal_mode")
+        pragmas["query_only"] = "ON"
+    pragmas.update(extra_pragmas or {})
+    new_engine = create_async_engine(url, **kwargs)
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        # Transactions are started by the "begin" listener below
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(new_engine.sync_engine, "begin")
+    def _begin(conn):
+        if read_only or conn.get_execution_options().get("read_only"):
+            conn.exec_driver_sql("BEGIN")
+        else:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return new_engine
+
+
+# One writer at a time (BEGIN IMMEDIATE), any number of concurrent readers
+engine = create_sqlite_engine(DATABASE_URL, echo=False)
+read_engine = create_sqlite_engine(
+    DATABASE_URL, read_only=True, echo=False,
+    pool_size=settings.SQLITE_READ_POOL_SIZE, max_overflow=0
+)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+# Sessions for pure reads: never hold or wait for the write lock
+read_session = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+# Session of the enclosing unit_of_work() block, if any
+_current_session: ContextVar[Optional[AsyncSession]] = ContextVar("current_session", default=None)
+
+
+def current_session() -> Optional[AsyncSession]:
+    """Returns the session of the active unit_of_work() block, or None."""
+    return _current_session.get()
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """
+    Runs several service calls on one connection with a single commit.
+    
+    Inside the block CanvasService methods share this session and flush
+    instead of committing; the block commits once on exit, or rolls back
+    everything if it raises. Nested blocks join the outer one.
+    Do not run service calls of one block concurrently (asyncio.gather):
+    they share a session.
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+    async with async_session() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+            await session.commit()
+        finally:
+            _current_session.reset(token)
+
+
+def _casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    # SQLite's lower()/LIKE only fold ASCII; chats are mostly Cyrillic.
+    # casefold() lets case-insensitive filters run inside the database.
+    dbapi_connection.create_function("casefold", 1, _casefold, deterministic=True)
+    # Text of canvas_elements.content, which may be stored compressed (models.CompressedText)
+    dbapi_connection.create_function("element_text", 1, decompress_content, deterministic=True)
+
+
+for _engine in (engine, read_engine):
+    event.listen(_engine.sync_engine, "connect", _register_sqlite_functions)
 
 # Models
 # from ai_core.common.models import Message # Removed
 
 
+# Full-text index over canvas_elements (name, content).
+# Trigger SQL is plain SQLite: the sqlite3 CLI, DB browsers and ops scripts
+# write to this file too, without the app's element_text(). The FTS table
+# keeps its own copy of the text, so rows are deleted by rowid alone
+# (canvas_elements.rowid). Triggers index the text SQL can read (_ELEMENT_TEXT);
+# compressed contents are indexed by the app in the same transaction
+# (FTS_SET_CONTENT), and rewrites to a compressed form keep the indexed text.
+# NOTE: canvas_elements has no INTEGER PRIMARY KEY, so VACUUM may renumber
+# rowids - run migration.rebuild_fts_index() after a VACUUM.
+FTS_TABLE = "canvas_elements_fts"
+
+# Content text of an element row in trigger SQL, NULL when stored compressed
+# (models.element_content_sql without decompression)
+_ELEMENT_TEXT = (
+    "(SELECT CASE WHEN typeof(body) = 'text' THEN body END FROM (SELECT "
+    "coalesce((SELECT content FROM canvas_contents WHERE hash = {row}.content_hash), {row}.content) AS body))"
+)
+
+FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, content,
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON canvas_elements BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, content) VALUES (new.rowid, new.name, {_ELEMENT_TEXT.format(row="new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON canvas_elements BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, content, content_hash ON canvas_elements BEGIN
+        UPDATE {FTS_TABLE} SET name = new.name, content = coalesce({_ELEMENT_TEXT.format(row="new")}, content)
+        WHERE rowid = new.rowid;
+    END
+    """,
+]
+
+# Sets the indexed text of compressed contents, in the transaction that wrote
+# them. With :seq, only a row inserted with that seq: an id skipped by
+# INSERT ... DO NOTHING keeps its own text.
+FTS_SET_CONTENT = text(f"""
+    UPDATE {FTS_TABLE} SET content = :content
+    WHERE rowid = (SELECT rowid FROM canvas_elements WHERE id = :id AND (:seq IS NULL OR seq = :seq))
+""").bindparams(bindparam("id", type_=CanvasElement.__table__.c.id.type))
+
+
+def fts_content_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """FTS_SET_CONTENT parameters for written elements (id, content, optional seq) the triggers cannot index."""
+    return [{"seq": None, **row} for row in rows if is_compressible(row["content"])]
+
+
+def _index_compressed_content(mapper, connection, element: CanvasElement) -> None:
+    if inspect(element).attrs.content.history.has_changes():
+        rows = fts_content_rows([{"id": element.id, "content": element.content}])
+        if rows:
+            connection.execute(FTS_SET_CONTENT, rows)
+
+
+event.listen(CanvasElement, "after_insert", _index_compressed_content)
+event.listen(CanvasElement, "after_update", _index_compressed_content)
+
+
+# Fallback numbering for rows inserted without a seq (CanvasService assigns
+# it itself so returned objects carry it). MAX() is a seek on ux_canvas_elements_canvas_seq.
+ELEMENT_SEQ_DDL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS canvas_elements_seq_ai AFTER INSERT ON canvas_elements
+    WHEN new.seq IS NULL BEGIN
+        UPDATE canvas_elements
+        SET seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM canvas_elements WHERE canvas_id = new.canvas_id)
+        WHERE rowid = new.rowid;
+    END
+    """,
+]
+
+
+# Change feed (models.CanvasChange). Only columns that matter to readers count
+# as an update: the seq trigger above does not produce an element change.
+CHANGES_TABLE = "canvas_changes"
+
+
+def _change_trigger(table: str, entity: str, op: str, canvas_id: str, entity_id: str, of: str = "", when: str = "") -> str:
+    row = "old" if op == "delete" else "new"
+    event_clause = f"{op.upper()}{f' OF {of}' if of else ''}"
+    when_clause = f" WHEN {when.format(row=row)}" if when else ""
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_changes_{op} AFTER {event_clause} ON {table}{when_clause} BEGIN
+        INSERT INTO {CHANGES_TABLE} (canvas_id, entity, entity_id, op, changed_at)
+        VALUES ({canvas_id.format(row=row)}, '{entity}', {entity_id.format(row=row)}, '{op}', strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """
+
+
+_LINK_CANVAS = "(SELECT canvas_id FROM canvas_frames WHERE id = {row}.frame_id)"
+_LINK_ID = "{row}.frame_id || ':' || {row}.element_id"
+# Compares contents in storage form: the backfills that only change the form
+# (compression, dedup) remove their entries, see migration._rewrite_content
+_ELEMENT_CHANGED = " OR ".join(
+    f"old.{c} IS NOT new.{c}"
+    for c in ("canvas_id", "type", "name", "content", "content_hash", "created_by", "attributes")
+)
+
+CHANGE_FEED_DDL = [
+    *[_change_trigger("canvases", "canvas", op, "{row}.id", "{row}.id", of)
+      for op, of in (("insert", ""), ("update", "name, access_rules"), ("delete", ""))],
+    *[_change_trigger("canvas_elements", "element", op, "{row}.canvas_id", "{row}.id", of, when)
+      for op, of, when in (
+          ("insert", "", ""),
+          ("update", "canvas_id, type, name, content, content_hash, created_by, attributes", _ELEMENT_CHANGED),
+          ("delete", "", ""),
+      )],
+    *[_change_trigger("canvas_frames", "frame", op, "{row}.canvas_id", "{row}.id", of)
+      for op, of in (("insert", ""), ("update", "name, parent_id, meta"), ("delete", ""))],
+    # Links to a missing frame belong to no canvas and are not recorded
+    *[_change_trigger("canvas_element_frame_links", "frame_link", op, _LINK_CANVAS, _LINK_ID,
+                      when=f"{_LINK_CANVAS} IS NOT NULL")
+      for op in ("insert", "delete")],
+]
+
+
+# Frame stats (models.CanvasFrameStats). Frames created before the table
+# existed get their row from migration.backfill_frame_stats; until then links
+# to them are not counted here (the backfill counts them).
+FRAME_STATS_TABLE = "canvas_frame_stats"
+_TYPE_PATH = "'$.' || json_quote({type})"
+_LINKED_TYPE = "coalesce((SELECT type FROM canvas_elements WHERE id = {row}.element_id), 'unknown')"
+
+
+def _type_count_add(type_sql: str) -> str:
+    path = _TYPE_PATH.format(type=type_sql)
+    return f"json_set(type_counts, {path}, coalesce(json_extract(type_counts, {path}), 0) + 1)"
+
+
+def _type_count_remove(type_sql: str) -> str:
+    path = _TYPE_PATH.format(type=type_sql)
+    return (
+        f"CASE WHEN coalesce(json_extract(type_counts, {path}), 0) <= 1 THEN json_remove(type_counts, {path}) "
+        f"ELSE json_set(type_counts, {path}, json_extract(type_counts, {path}) - 1) END"
+    )
+
+
+FRAME_STATS_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS canvas_frames_stats_ai AFTER INSERT ON canvas_frames BEGIN
+        INSERT OR IGNORE INTO {FRAME_STATS_TABLE} (frame_id, element_count, type_counts) VALUES (new.id, 0, '{{}}');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS canvas_frames_stats_ad AFTER DELETE ON canvas_frames BEGIN
+        DELETE FROM {FRAME_STATS_TABLE} WHERE frame_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS canvas_element_frame_links_stats_ai AFTER INSERT ON canvas_element_frame_links BEGIN
+        UPDATE {FRAME_STATS_TABLE} SET
+            element_count = element_count + 1,
+            last_added_at = strftime('%Y-%m-%d %H:%M:%f', 'now'),
+            type_counts = {_type_count_add(_LINKED_TYPE.format(row="new"))}
+        WHERE frame_id = new.frame_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS canvas_element_frame_links_stats_ad AFTER DELETE ON canvas_element_frame_links BEGIN
+        UPDATE {FRAME_STATS_TABLE} SET
+            element_count = element_count - 1,
+            type_counts = {_type_count_remove(_LINKED_TYPE.format(row="old"))}
+        WHERE frame_id = old.frame_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS canvas_elements_stats_au AFTER UPDATE OF type ON canvas_elements
+    WHEN old.type IS NOT new.type BEGIN
+        UPDATE {FRAME_STATS_TABLE} SET
+            type_counts = json_set(
+                {_type_count_remove("old.type")},
+                {_TYPE_PATH.format(type="new.type")},
+                coalesce(json_extract(type_counts, {_TYPE_PATH.format(type="new.type")}), 0) + 1
+            )
+        WHERE frame_id IN (SELECT frame_id FROM canvas_element_frame_links WHERE element_id = new.id);
+    END
+    """,
+]
+
+
+# Reference counts of shared element bodies (models.CanvasContent). Bodies
+# are inserted before the rows pointing to them and never deleted here: a
+# later insert may share the body again. See purge_unused_contents.
+CONTENT_REFS_DDL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS canvas_elements_content_refs_ai AFTER INSERT ON canvas_elements
+    WHEN new.content_hash IS NOT NULL BEGIN
+        UPDATE canvas_contents SET ref_count = ref_count + 1 WHERE hash = new.content_hash;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS canvas_elements_content_refs_ad AFTER DELETE ON canvas_elements
+    WHEN old.content_hash IS NOT NULL BEGIN
+        UPDATE canvas_contents SET ref_count = ref_count - 1 WHERE hash = old.content_hash;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS canvas_elements_content_refs_au AFTER UPDATE OF content_hash ON canvas_elements
+    WHEN old.content_hash IS NOT new.content_hash BEGIN
+        UPDATE canvas_contents SET ref_count = ref_count - 1 WHERE hash = old.content_hash;
+        UPDATE canvas_contents SET ref_count = ref_count + 1 WHERE hash = new.content_hash;
+    END
+    """,
+]
+
 
 # Functions
 
+# Indexes made redundant by a newer index on existing databases
+DROPPED_INDEXES = [
+    "ix_canvas_elements_canvas_id",  # prefix of ix_canvas_elements_canvas_created
+]
+
+
+def _add_missing_columns(sync_conn):
+    # create_all does not alter existing tables. Nullable / generated (VIRTUAL)
+    # columns can be added in place with ALTER TABLE.
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {row[1] for row in sync_conn.exec_driver_sql(f"PRAGMA table_xinfo({table.name})")}
+        if not existing:
+            continue
+        for column in table.columns:
+            if column.name not in existing:
+                column_ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+                sync_conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+
+
+def _drop_triggers(sync_conn):
+    # Triggers are recreated on every start (CREATE TRIGGER IF NOT EXISTS below),
+    # so changed definitions reach existing databases. Same transaction: no
+    # write can slip through without them.
+    names = sync_conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars().all()
+    for name in names:
+        sync_conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS "{name}"')
+
+
+def _drop_external_content_fts(sync_conn):
+    # The FTS table used to read canvas_elements (content='canvas_elements'), which
+    # made its triggers depend on element_text(). Dropped here, recreated by
+    # FTS_DDL and refilled by migration.rebuild_fts_index.
+    sql = sync_conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).scalar()
+    if sql and "content=" in sql:
+        sync_conn.exec_driver_sql(f"DROP TABLE {FTS_TABLE}")
+
+
+def _create_missing_indexes(sync_conn):
+    # create_all skips tables that already exist, including their new indexes
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+    for name in DROPPED_INDEXES:
+        sync_conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
 async def init_db():
-    """Creates tables if they don't exist."""
+    """Creates tables, and columns/indexes added to existing tables, if they don't exist."""
     async with engine.begin() as conn:
         # Для тестов/разработки: создаем таблицы если нет (MVP)
         # await conn.run_sync(SQLModel.metadata.drop_all) # REMOVED: Data safety
         await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(_drop_triggers)
+        await conn.run_sync(_drop_external_content_fts)
+        for ddl in FTS_DDL + ELEMENT_SEQ_DDL + CHANGE_FEED_DDL + FRAME_STATS_DDL + CONTENT_REFS_DDL:
+            await conn.execute(text(ddl))
 
 
 
@@ -1,12 +1,324 @@
 import logging
+import time
 import uuid
 from datetime import datetime
+from typing import Optional, Tuple
 from sqlalchemy import text
-from ai_core.storage.db import engine, init_db
+from ai_core.common.config import settings
+from ai_core.common.models import compress_content, content_digest, decompress_content
+from ai_core.storage.db import engine, init_db, CHANGES_TABLE, FTS_TABLE
 from ai_core.services.canvas_service import canvas_service
 
 logger = logging.getLogger(__name__)
 
+async def backfill_canvas_access():
+    """
+    Populates canvas_access from Canvas.access_rules for canvases created
+    before the access table existed. Idempotent.
+    
+    Oldest canvas wins if several canvases already claim the same chat.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(text("""
+            INSERT OR IGNORE INTO canvas_access (principal, canvas_id)
+            SELECT j.value, c.id
+            FROM canvases c, json_each(c.access_rules) j
+            WHERE j.type = 'text'
+            ORDER BY c.created_at
+        """))
+        if result.rowcount:
+            logger.info(f"Backfilled {result.rowcount} canvas access rows.")
+
+async def backfill_element_seq():
+    """
+    Numbers elements created before CanvasElement.seq existed, per canvas in
+    created_at order, after any seq the canvas already has. Idempotent.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(text("""
+            WITH numbered AS (
+                SELECT e.rowid AS rid,
+                       ROW_NUMBER() OVER (PARTITION BY e.canvas_id ORDER BY e.created_at, e.id)
+                       + COALESCE((SELECT MAX(m.seq) FROM canvas_elements m WHERE m.canvas_id = e.canvas_id), 0) AS seq
+                FROM canvas_elements e
+                WHERE e.seq IS NULL
+            )
+            UPDATE canvas_elements SET seq = numbered.seq
+            FROM numbered
+            WHERE canvas_elements.rowid = numbered.rid
+        """))
+        if result.rowcount:
+            logger.info(f"Backfilled seq for {result.rowcount} elements.")
+
+async def backfill_frame_stats():
+    """
+    Creates canvas_frame_stats rows for frames created before the table
+    existed, counted from their links. last_added_at falls back to the newest
+    linked element. Idempotent.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(text("""
+            INSERT INTO canvas_frame_stats (frame_id, element_count, last_added_at, type_counts)
+            SELECT f.id,
+                   (SELECT count(*) FROM canvas_element_frame_links l WHERE l.frame_id = f.id),
+                   (SELECT max(e.created_at) FROM canvas_element_frame_links l
+                    JOIN canvas_elements e ON e.id = l.element_id WHERE l.frame_id = f.id),
+                   (SELECT coalesce(json_group_object(t.type, t.n), '{}') FROM (
+                        SELECT coalesce(e.type, 'unknown') AS type, count(*) AS n
+                        FROM canvas_element_frame_links l
+                        LEFT JOIN canvas_elements e ON e.id = l.element_id
+                        WHERE l.frame_id = f.id
+                        GROUP BY 1
+                   ) t)
+            FROM canvas_frames f
+            WHERE NOT EXISTS (SELECT 1 FROM canvas_frame_stats s WHERE s.frame_id = f.id)
+        """))
+        if result.rowcount:
+            logger.info(f"Backfilled stats for {result.rowcount} frames.")
+
+async def rebuild_fts_index(force: bool = False):
+    """
+    Rebuilds the full-text index from canvas_elements.
+    
+    Without `force`, only runs when the index is empty but elements exist
+    (first start after the FTS table was introduced).
+    """
+    async with engine.begin() as conn:
+        if not force:
+            has_elements = (await conn.execute(text("SELECT 1 FROM canvas_elements LIMIT 1"))).scalar()
+            indexed = (await conn.execute(text(f"SELECT 1 FROM {FTS_TABLE}_docsize LIMIT 1"))).scalar()
+            if not has_elements or indexed:
+                return
+        logger.info("Rebuilding full-text index...")
+        # element_text(): contents may be stored compressed or shared
+        await conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        await conn.execute(text(f"""
+            INSERT INTO {FTS_TABLE} (rowid, name, content)
+            SELECT e.rowid, e.name, element_text(coalesce(c.content, e.content))
+            FROM canvas_elements e LEFT JOIN canvas_contents c ON c.hash = e.content_hash
+        """))
+
+# Deterministic element ids for legacy rows: re-running a batch after a crash
+# hits the same ids and is skipped instead of duplicating messages.
+LEGACY_ID_NAMESPACE = uuid.UUID("6f1c3e0a-6d0e-4a53-9f57-3c1f0b8d2a41")
+LEGACY_BATCH_SIZE = 1000
+
+async def _load_checkpoint(name: str) -> Tuple[Optional[int], int]:
+    """Returns (last migrated rowid or None, migrated count) for a migration step."""
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS migration_checkpoints (
+                name TEXT PRIMARY KEY,
+                last_rowid INTEGER NOT NULL,
+                migrated INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """))
+        row = (await conn.execute(
+            text("SELECT last_rowid, migrated FROM migration_checkpoints WHERE name = :name"),
+            {"name": name}
+        )).first()
+    return (row[0], row[1]) if row else (None, 0)
+
+async def _save_checkpoint(name: str, last_rowid: int, migrated: int):
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            INSERT INTO migration_checkpoints (name, last_rowid, migrated, updated_at)
+            VALUES (:name, :last_rowid, :migrated, :updated_at)
+            ON CONFLICT(name) DO UPDATE SET
+                last_rowid = excluded.last_rowid,
+                migrated = excluded.migrated,
+                updated_at = excluded.updated_at
+        """), {"name": name, "last_rowid": last_rowid, "migrated": migrated, "updated_at": datetime.utcnow().isoformat()})
+
+async def _clear_checkpoint(name: str):
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM migration_checkpoints WHERE name = :name"), {"name": name})
+
+async def migrate_legacy_messages(table: str = "messages", batch_size: int = LEGACY_BATCH_SIZE) -> int:
+    """
+    Copies a legacy messages table into canvas_elements.
+    
+    Streams rows in rowid order, `batch_size` at a time: each batch is one
+    bulk insert, followed by a checkpoint. A restart resumes after the last
+    checkpoint, and a batch replayed after a crash is skipped thanks to
+    deterministic element ids. Returns the total number of migrated messages.
+    """
+    checkpoint = f"legacy:{table}"
+    last_rowid, migrated = await _load_checkpoint(checkpoint)
+    
+    def after_checkpoint() -> str:
+        return "" if last_rowid is None else "WHERE rowid > :last_rowid"
+    
+    async with engine.connect() as conn:
+        remaining = (await conn.execute(
+            text(f"SELECT count(*) FROM {table} {after_checkpoint()}"), {"last_rowid": last_rowid}
+        )).scalar()
+    total = migrated + remaining
+    if last_rowid is not None:
+        logger.info(f"Resuming migration of '{table}' after rowid {last_rowid} ({migrated}/{total} done).")
+    
+    canvas_ids = {}  # chat_id -> canvas id, resolved once per chat
+    started = time.monotonic()
+    migrated_now = 0
+    
+    while True:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"SELECT rowid AS _rowid, * FROM {table} {after_checkpoint()} ORDER BY rowid LIMIT :limit"),
+                {"last_rowid": last_rowid, "limit": batch_size}
+            )
+            batch = result.mappings().all()
+        if not batch:
+            break
+        
+        items = []
+        for msg in batch:
+            chat_id = str(msg['chat_id'])
+            if chat_id not in canvas_ids:
+                canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
+                canvas_ids[chat_id] = canvas.id
+            
+            # Determine type
+            media_type = msg['media_type'] or 'text'
+            c_type = 'voice' if media_type == 'voice' else 'message'
+            
+            items.append({
+                "element_id": uuid.uuid5(LEGACY_ID_NAMESPACE, f"{table}:{msg['id']}"),
+                "canvas_id": canvas_ids[chat_id],
+                "type": c_type,
+                "content": msg['content'],
+                "created_by": msg['author_id'] or 'unknown',
+                "attributes": {
+                    "source": msg['source'],
+                    "source_msg_id": msg['id'], # Keep old ID reference
+                    "author_id": msg['author_id'],
+                    "author_nick": msg['author_nick'],
+                    "author_name": msg['author_name'],
+                    "media_path": msg['media_path'],
+                    "migrated": True
+                },
+            })
+        
+        await canvas_service.add_elements_bulk(items, skip_existing=True)
+        last_rowid = batch[-1]['_rowid']
+        migrated += len(batch)
+        migrated_now += len(batch)
+        await _save_checkpoint(checkpoint, last_rowid, migrated)
+        
+        elapsed = time.monotonic() - started
+        rate = migrated_now / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Migrated {migrated}/{total} messages from '{table}' ({rate:.0f} msg/s).")
+    
+    return migrated
+
+CONTENT_BATCH_SIZE = 500
+
+async def _rewrite_content(conn, statement: str, rows) -> None:
+    """
+    Rewrites element contents in another storage form. The change feed
+    triggers compare stored values and would record an update per row, so
+    the entries this statement added are removed (same write transaction:
+    no other writer can add any in between).
+    """
+    last_seq = (await conn.execute(text(f"SELECT coalesce(max(seq), 0) FROM {CHANGES_TABLE}"))).scalar()
+    await conn.execute(text(statement), rows)
+    await conn.execute(text(f"DELETE FROM {CHANGES_TABLE} WHERE seq > :last_seq"), {"last_seq": last_seq})
+
+async def dedupe_element_content(batch_size: int = CONTENT_BATCH_SIZE) -> int:
+    """
+    Moves large contents of elements stored before content deduplication
+    existed (or under a higher ELEMENT_DEDUP_MIN_BYTES) into canvas_contents,
+    `batch_size` rows per transaction. Resumes from a checkpoint per
+    threshold, so later runs only look at new rows. Returns the number of
+    elements moved.
+    """
+    min_bytes = settings.ELEMENT_DEDUP_MIN_BYTES
+    if min_bytes <= 0:
+        return 0
+    checkpoint = f"dedupe_content:{min_bytes}"
+    last_rowid, moved = await _load_checkpoint(checkpoint)
+    moved_now = 0
+    
+    while True:
+        async with engine.begin() as conn:
+            # Compressed contents are large by definition; text is measured in bytes
+            batch = (await conn.execute(text("""
+                SELECT rowid, content FROM canvas_elements
+                WHERE rowid > :last_rowid AND content_hash IS NULL
+                  AND (typeof(content) = 'blob' OR length(CAST(content AS BLOB)) >= :min_bytes)
+                ORDER BY rowid LIMIT :limit
+            """), {"last_rowid": last_rowid or 0, "min_bytes": min_bytes, "limit": batch_size})).all()
+            if not batch:
+                break
+            bodies, updates = {}, []
+            for rowid, stored in batch:
+                content = decompress_content(stored)
+                content_hash = content_digest(content)
+                if content_hash:
+                    bodies[content_hash] = {"hash": content_hash, "content": compress_content(content)}
+                    updates.append({"rowid": rowid, "content_hash": content_hash})
+            if updates:
+                # Bodies first: the triggers read them
+                await conn.execute(text(
+                    "INSERT OR IGNORE INTO canvas_contents (hash, content, ref_count) VALUES (:hash, :content, 0)"
+                ), list(bodies.values()))
+                await _rewrite_content(
+                    conn, "UPDATE canvas_elements SET content = '', content_hash = :content_hash WHERE rowid = :rowid", updates
+                )
+        last_rowid = batch[-1][0]
+        moved += len(updates)
+        moved_now += len(updates)
+        await _save_checkpoint(checkpoint, last_rowid, moved)
+    
+    if moved_now:
+        logger.info(f"Moved content of {moved_now} elements to canvas_contents.")
+    return moved_now
+
+async def compress_element_content(batch_size: int = CONTENT_BATCH_SIZE) -> int:
+    """
+    Compresses element contents (inline and shared bodies) stored before
+    compression existed (or under a higher ELEMENT_COMPRESS_MIN_BYTES),
+    `batch_size` rows per transaction. Resumes from a checkpoint per table
+    and threshold, so later runs only look at new rows. Returns the number
+    of compressed contents.
+    
+    Freed pages are reused by new rows; run VACUUM (then rebuild_fts_index)
+    to shrink the file itself.
+    """
+    min_bytes = settings.ELEMENT_COMPRESS_MIN_BYTES
+    if min_bytes <= 0:
+        return 0
+    compressed_now = 0
+    for table in ("canvas_elements", "canvas_contents"):
+        checkpoint = f"compress_content:{table}:{min_bytes}"
+        last_rowid, compressed = await _load_checkpoint(checkpoint)
+        while True:
+            async with engine.begin() as conn:
+                batch = (await conn.execute(text(f"""
+                    SELECT rowid, content FROM {table}
+                    WHERE rowid > :last_rowid AND typeof(content) = 'text' AND length(CAST(content AS BLOB)) >= :min_bytes
+                    ORDER BY rowid LIMIT :limit
+                """), {"last_rowid": last_rowid or 0, "min_bytes": min_bytes, "limit": batch_size})).all()
+                if not batch:
+                    break
+                updates = []
+                for rowid, content in batch:
+                    stored = compress_content(content)
+                    # Incompressible contents stay text
+                    if isinstance(stored, bytes):
+                        updates.append({"rowid": rowid, "content": stored})
+                if updates:
+                    await _rewrite_content(conn, f"UPDATE {table} SET content = :content WHERE rowid = :rowid", updates)
+            last_rowid = batch[-1][0]
+            compressed += len(updates)
+            compressed_now += len(updates)
+            await _save_checkpoint(checkpoint, last_rowid, compressed)
+    
+    if compressed_now:
+        logger.info(f"Compressed {compressed_now} element contents.")
+    return compressed_now
+
 async def run_migration():
     """
     Checks if the database needs migration from the old schema (messages table) 
@@ -14,6 +326,14 @@ async def run_migration():
     """
     logger.info("Checking for pending migrations...")
     
+    await backfill_canvas_access()
+    await backfill_element_seq()
+    await backfill_frame_stats()
+    await rebuild_fts_index()
+    await dedupe_element_content()
+    await compress_element_content()
+    await canvas_service.purge_unused_contents()
+    
     async with engine.begin() as conn:
         # Check if 'messages' table exists
         result = await conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='messages';"))
@@ -23,90 +343,22 @@ async def run_migration():
             logger.info("No 'messages' table found. Skipping migration.")
             return
 
-        # Check if 'canvas_elements' table exists (it should be created by init_db, but let's be sure)
-        # Actually, init_db is called before this usually.
-        
         logger.info("Found legacy 'messages' table. Starting migration...")
         
-        # 1. Fetch all messages
-        # We use raw SQL to avoid dependency on old models
-        msgs = await conn.execute(text("SELECT * FROM messages"))
-        messages_data = msgs.mappings().all()
-        
-        # 2. Fetch all documents
+        # Documents: only names are needed, see below
         docs_data = []
         result = await conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='document';"))
         if result.scalar():
-            docs = await conn.execute(text("SELECT * FROM document"))
+            docs = await conn.execute(text("SELECT id, filename FROM document"))
             docs_data = docs.mappings().all()
-            
-    # We need to process data. We can't do it inside the transaction if we use canvas_service 
-    # which uses its own session/transaction management usually.
-    # So we fetched data, now we process it.
     
-    count_msg = 0
-    count_doc = 0
-    
-    # Process Messages
-    for msg in messages_data:
-        chat_id = msg['chat_id']
-        
-        # Get/Create Canvas
-        canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
-        
-        # Map fields
-        content = msg['content']
-        media_type = msg['media_type'] or 'text'
-        
-        # Determine type
-        c_type = 'voice' if media_type == 'voice' else 'message'
-        
-        # Attributes
-        attrs = {
-            "source": msg['source'],
-            "source_msg_id": msg['id'], # Keep old ID reference
-            "author_id": msg['author_id'],
-            "author_nick": msg['author_nick'],
-            "author_name": msg['author_name'],
-            "media_path": msg['media_path'],
-            "migrated": True
-        }
-        
-        # Add Element
-        await canvas_service.add_element(
-            canvas_id=canvas.id,
-            type=c_type,
-            content=content,
-            created_by=msg['author_id'] or 'unknown',
-            attributes=attrs
-        )
-        count_msg += 1
+    count_msg = await migrate_legacy_messages("messages")
 
     # Process Documents
     for doc in docs_data:
-        # Document table didn't have chat_id in the schema I saw earlier?
-        # Wait, let me check the schema again.
-        # CREATE TABLE document (id, filename, content, doc_metadata JSON);
-        # It has NO chat_id! 
-        # This means documents were global or I missed something.
-        # If they are global, we can't assign them to a canvas easily.
-        # Let's check if doc_metadata has chat_id.
-        
-        # For now, let's skip documents if we can't link them, or put them in a "Global" canvas?
-        # Or maybe just log a warning.
-        # Let's assume metadata might have it.
-        import json
-        meta = doc['doc_metadata']
-        if isinstance(meta, str):
-            try:
-                meta = json.loads(meta)
-            except:
-                meta = {}
-        
-        # If no chat_id, we can't migrate safely to a specific chat canvas.
-        # Let's skip for MVP unless we find a key.
+        # Legacy schema: CREATE TABLE document (id, filename, content, doc_metadata JSON);
+        # It has no chat_id, so documents cannot be assigned to a chat canvas.
         logger.warning(f"Skipping document {doc['id']} (filename: {doc['filename']}) - No chat_id link found in schema.")
-        count_doc += 1
 
     logger.info(f"Migration complete. Migrated {count_msg} messages.")
     
@@ -118,4 +370,5 @@ async def run_migration():
         if result.scalar():
             await conn.execute(text("ALTER TABLE document RENAME TO document_backup_v1;"))
             
+    await _clear_checkpoint("legacy:messages")
     logger.info("Old tables renamed to *_backup_v1.")
@@ -1,8 +1,9 @@
 from typing import Optional, List, Dict, Any
 import uuid
 from google.adk.tools import ToolContext
-from ai_core.tools.utils import run_async, log_tool_call, extract_chat_id
+from ai_core.tools.utils import log_tool_call, sync_tool, extract_chat_id
 from ai_core.services.canvas_service import canvas_service
+from ai_core.storage.db import unit_of_work
 from ai_core.common.models import CanvasFrame, CanvasElement, Canvas
 
 async def _ensure_chat_boundaries(chat_id: Optional[str] = None, element_id: Optional[str] = None, frame_id: Optional[str] = None, frame: Optional[CanvasFrame] = None, element: Optional[CanvasElement] = None, canvas: Optional[Canvas] = None):
@@ -21,93 +22,102 @@ async def _ensure_chat_boundaries(chat_id: Optional[str] = None, element_id: Opt
         if element.canvas_id != canvas.id:
             raise ValueError(f"Element {element.id} does not belong to canvas {canvas.id}")
 
+@sync_tool
 @log_tool_call
-def get_current_canvas_info(tool_context: ToolContext) -> str:
+async def get_current_canvas_info(tool_context: ToolContext) -> str:
     """
     Returns information about the current canvas for the chat.
     """
     chat_id = extract_chat_id(tool_context)
-    async def _do():
-        canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
-        return f"Canvas ID: {canvas.id}\nName: {canvas.name or 'Unnamed'}"
-    return run_async(_do())
+    canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
+    return f"Canvas ID: {canvas.id}\nName: {canvas.name or 'Unnamed'}"
 
+@sync_tool
 @log_tool_call
-def set_canvas_name(tool_context: ToolContext, name: str) -> str:
+async def set_canvas_name(tool_context: ToolContext, name: str) -> str:
     """
     Sets the name of the current canvas.
     """
     chat_id = extract_chat_id(tool_context)
-    async def _do():
+    async with unit_of_work():
         canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
         updated = await canvas_service.update_canvas(canvas.id, name)
         return f"Canvas renamed to: {updated.name}"
-    return run_async(_do())
 
+@sync_tool
 @log_tool_call
-def create_canvas_frame(tool_context: ToolContext, name: str, parent_frame_id: Optional[str] = None) -> str:
+async def create_canvas_frame(tool_context: ToolContext, name: str, parent_frame_id: Optional[str] = None) -> str:
     """
     Creates a new frame in the current canvas.
     """    
     chat_id = extract_chat_id(tool_context)
     
-    async def _do():
+    async with unit_of_work():
         canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
         parent_uuid = uuid.UUID(parent_frame_id) if parent_frame_id else None
         frame = await canvas_service.create_frame(canvas.id, name, parent_id=parent_uuid)
         return f"Frame created: {frame.name} (ID: {frame.id})"
-    return run_async(_do())
 
+@sync_tool
 @log_tool_call
-def set_frame_name(frame_id: str, name: str, tool_context: ToolContext) -> str:
+async def set_frame_name(frame_id: str, name: str, tool_context: ToolContext) -> str:
     """
     Renames a frame.
     """
     chat_id = extract_chat_id(tool_context)
     
-    async def _do():
+    async with unit_of_work():
         frame_uuid = uuid.UUID(frame_id)
+        canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
 
         frame = await canvas_service.get_frame(frame_uuid)
         if not frame:
             return "Frame not found."
-        await _ensure_chat_boundaries(chat_id, frame=frame)
+        await _ensure_chat_boundaries(canvas=canvas, frame=frame)
 
         updated = await canvas_service.update_frame(frame_uuid, name)
         if updated:
             return f"Frame renamed to: {updated.name}"
         return "Frame not found."
-    return run_async(_do())
 
+@sync_tool
 @log_tool_call
-def list_canvas_frames(tool_context: ToolContext) -> str:
+async def list_canvas_frames(tool_context: ToolContext) -> str:
     """
-    Lists all frames in the current canvas.
+    Lists all frames in the current canvas as a tree (nested frames are indented),
+    with each frame's element count by type and when an element was last added.
+    Use it for a canvas overview before fetching frame contents.
     """
 
     chat_id = extract_chat_id(tool_context)
     
-    async def _do():
-        canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
-        frames = await canvas_service.get_frames(canvas.id)
-        if not frames:
-            return "No frames found."
-        
-        lines = []
-        for f in frames:
-            parent_info = f" (Parent: {f.parent_id})" if f.parent_id else ""
-            lines.append(f"- {f.name} [ID: {f.id}]{parent_info}")
-        return "\n".join(lines)
-    return run_async(_do())
+    canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
+    tree = await canvas_service.get_frame_tree(canvas.id)
+    if not tree:
+        return "No frames found."
 
+    lines = []
+    def render(nodes):
+        for node in nodes:
+            stats = f"{node.element_count} elements"
+            if node.type_counts:
+                stats += ": " + ", ".join(f"{count} {type}" for type, count in sorted(node.type_counts.items()))
+            if node.last_added_at:
+                stats += f"; last added {node.last_added_at:%Y-%m-%d %H:%M}"
+            lines.append(f"{'  ' * node.depth}- {node.name} [ID: {node.id}] ({stats})")
+            render(node.children)
+    render(tree)
+    return "\n".join(lines)
+
+@sync_tool
 @log_tool_call
-def add_element_to_frame(element_id: str, frame_id: str, tool_context: ToolContext) -> str:
+async def add_element_to_frame(element_id: str, frame_id: str, tool_context: ToolContext) -> str:
     """
     Adds an element to a specific frame (an element can be in multiple frames).
     """
     chat_id = extract_chat_id(tool_context)
     
-    async def _do():
+    async with unit_of_work():
         el_uuid = uuid.UUID(element_id)
         fr_uuid = uuid.UUID(frame_id)
         canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
@@ -115,7 +125,7 @@ def add_element_to_frame(element_id: str, frame_id: str, tool_context: ToolConte
         element = await canvas_service.get_element(el_uuid)
         if not element:
             return "Element not found."
-        
+    
         frame = await canvas_service.get_frame(fr_uuid)
         if not frame:
             return "Frame not found."
@@ -126,15 +136,15 @@ def add_element_to_frame(element_id: str, frame_id: str, tool_context: ToolConte
         if success:
             return f"Element added to frame {frame_id}"
         return "Failed to add element to frame (maybe already there)."
-    return run_async(_do())
 
+@sync_tool
 @log_tool_call
-def remove_element_from_frame(element_id: str, frame_id: str, tool_context: ToolContext) -> str:
+async def remove_element_from_frame(element_id: str, frame_id: str, tool_context: ToolContext) -> str:
     """
     Removes an element from a specific frame.
     """
     chat_id = extract_chat_id(tool_context)
-    async def _do():
+    async with unit_of_work():
         await _ensure_chat_boundaries(chat_id, element_id=element_id, frame_id=frame_id)
         el_uuid = uuid.UUID(element_id)
         fr_uuid = uuid.UUID(frame_id)
@@ -142,26 +152,97 @@ def remove_element_from_frame(element_id: str, frame_id: str, tool_context: Tool
         if success:
             return f"Element removed from frame {frame_id}"
         return "Failed to remove element from frame (maybe not there)."
-    return run_async(_do())
 
+async def _parse_canvas_element_ids(canvas: Canvas, element_ids: List[str]) -> List[uuid.UUID]:
+    """Parses element ids and checks, in one query, that all of them are on the canvas."""
+    try:
+        el_uuids = list(dict.fromkeys(uuid.UUID(element_id) for element_id in element_ids))
+    except ValueError as e:
+        raise ValueError(f"Invalid element id: {e}")
+    found = await canvas_service.get_canvas_element_ids(canvas.id, el_uuids)
+    missing = [str(el_uuid) for el_uuid in el_uuids if el_uuid not in found]
+    if missing:
+        raise ValueError(f"Elements not found in this canvas: {', '.join(missing)}")
+    return el_uuids
+
+@sync_tool
+@log_tool_call
+async def add_elements_to_frame(element_ids: List[str], frame_id: str, tool_context: ToolContext) -> str:
+    """
+    Adds many elements to a frame at once. Use it instead of repeated
+    add_element_to_frame calls when regrouping several elements.
+    Nothing is changed if any element or the frame is not in this canvas.
+    
+    Args:
+        element_ids: IDs of the elements to add.
+        frame_id: ID of the frame.
+    """
+    chat_id = extract_chat_id(tool_context)
+
+    async with unit_of_work():
+        try:
+            fr_uuid = uuid.UUID(frame_id)
+        except ValueError:
+            return f"Invalid frame id: {frame_id}"
+        canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
+
+        frame = await canvas_service.get_frame(fr_uuid)
+        if not frame:
+            return "Frame not found."
+        await _ensure_chat_boundaries(canvas=canvas, frame=frame)
+
+        el_uuids = await _parse_canvas_element_ids(canvas, element_ids)
+        added = await canvas_service.add_elements_to_frame_bulk(fr_uuid, el_uuids)
+        return f"Added {added} elements to frame {frame_id} ({len(el_uuids) - added} were already there)."
+
+@sync_tool
 @log_tool_call
-def set_element_name(element_id: str, name: str, tool_context: ToolContext) -> str:
+async def remove_elements_from_frame(element_ids: List[str], frame_id: str, tool_context: ToolContext) -> str:
+    """
+    Removes many elements from a frame at once. The elements themselves are kept.
+    Nothing is changed if any element or the frame is not in this canvas.
+    
+    Args:
+        element_ids: IDs of the elements to remove from the frame.
+        frame_id: ID of the frame.
+    """
+    chat_id = extract_chat_id(tool_context)
+
+    async with unit_of_work():
+        try:
+            fr_uuid = uuid.UUID(frame_id)
+        except ValueError:
+            return f"Invalid frame id: {frame_id}"
+        canvas = await canvas_service.get_or_create_canvas_for_chat(chat_id)
+
+        frame = await canvas_service.get_frame(fr_uuid)
+        if not frame:
+            return "Frame not found."
+        await _ensure_chat_boundaries(canvas=canvas, frame=frame)
+
+        el_uuids = await _parse_canvas_element_ids(canvas, element_ids)
+        removed = await canvas_service.remove_elements_from_frame_bulk(fr_uuid, el_uuids)
+        return f"Removed {removed} elements from frame {frame_id} ({len(el_uuids) - removed} were not in it)."
+
+@sync_tool
+@log_tool_call
+async def set_element_name(element_id: str, name: str, tool_context: ToolContext) -> str:
     """
     Sets a short human-readable name for an element.
     """
     chat_id = extract_chat_id(tool_context)
-    async def _do():
+    async with unit_of_work():
         await _ensure_chat_boundaries(chat_id, element_id=element_id)
         el_uuid = uuid.UUID(element_id)
         updated = await canvas_service.update_element(el_uuid, name=name)
         if updated:
             return f"Element named: {updated.name}"
         return "Element not found."
-    return run_async(_do())
 
 
+@sync_tool
 @log_tool_call
-def create_element(
+async def create_element(
     content: str,
     created_by: str,
     tool_context: ToolContext,
@@ -183,14 +264,14 @@ def create_element(
     if not content or not content.strip():
         return "Error: content cannot be empty."
 
-    async def _do():
+    async with unit_of_work():
         canvas = await canvas_service.get_or_create_canvas_for_chat(str(chat_id))
-        
+    
         if frame_id:
             await _ensure_chat_boundaries(canvas=canvas, frame_id=frame_id)
 
         frame_uuid = uuid.UUID(frame_id) if frame_id else None
-        
+    
         element = await canvas_service.add_element(
             canvas_id=canvas.id,
             type=type,
@@ -199,12 +280,12 @@ def create_element(
             attributes=attributes,
             frame_id=frame_uuid
         )
-        
+    
         return f"Element created: {element.id} (Type: {element.type})"
-    return run_async(_do())
 
+@sync_tool
 @log_tool_call
-def edit_element(
+async def edit_element(
     element_id: str,
     tool_context: ToolContext,
     name: Optional[str] = None,
@@ -226,12 +307,12 @@ def edit_element(
     """
     chat_id = extract_chat_id(tool_context)
     
-    async def _do():
+    async with unit_of_work():
         # Validate ownership
         await _ensure_chat_boundaries(chat_id, element_id=element_id)
-        
+    
         el_uuid = uuid.UUID(element_id)
-        
+    
         updated = await canvas_service.update_element(
             element_id=el_uuid,
             name=name,
@@ -240,8 +321,7 @@ def edit_element(
             attributes=attributes_to_set,
             attributes_to_remove=attributes_to_remove
         )
-        
+    
         if updated:
             return f"Element updated: {updated.id}"
         return "Element not found."
-    return run_async(_do())
@@ -3,7 +3,7 @@ import re
 from google.adk.tools import ToolContext
 from typing import Optional, List, Tuple
 from datetime import datetime, timedelta, timezone
-from ai_core.tools.utils import run_async, log_tool_call, extract_chat_id
+from ai_core.tools.utils import log_tool_call, sync_tool, extract_chat_id
 
 # Helper for fuzzy time parsing
 def _parse_time_range(time_str: str) -> Tuple[Optional[datetime], Optional[datetime]]:
@@ -76,8 +76,9 @@ def _parse_time_range(time_str: str) -> Tuple[Optional[datetime], Optional[datet
         
     return None, None
 
+@sync_tool
 @log_tool_call
-def fetch_elements(
+async def fetch_elements(
     tool_context: ToolContext,
     limit: int = 10,
     time_range: Optional[str] = None,
@@ -85,12 +86,15 @@ def fetch_elements(
     author: Optional[str] = None,
     contains: Optional[str] = None,
     include_details: bool = False,
-    frame_id: Optional[str] = None
+    frame_id: Optional[str] = None,
+    cursor: Optional[str] = None
 ) -> str:
     """
     Fetches elements (messages, notes, etc.) from the canvas history based on criteria.
     
-    Returns a JSON string containing a list of element objects.
+    Returns a JSON string: {"elements": [...], "next_cursor": "..." or null}.
+    Without `contains`, results are the most recent matching elements; pass
+    `next_cursor` back as `cursor` to get the next (older) page.
     
     Args:
         limit: Max number of elements to return.
@@ -100,15 +104,18 @@ def fetch_elements(
                - Range: "2023-01-01T10:00 to 2023-01-01T12:00".
         created_by: Case-insensitive substring match on the element's creator's ID (e.g. "telegram:user:123").
         author: Case-insensitive substring match on content author name or nickname (in attributes).
-        contains: Case-insensitive substring search in content.
+        contains: Keyword search in element name and content (full-text index). Words also match
+                  as prefixes ("проект" finds "проекта"); wrap in double quotes for an exact phrase.
+                  Returns the best matches.
         include_details: If True, returns all available fields (canvas_id, frame_ids, attributes). 
                          If False (default), returns only id, type, created_at, author, and content.
         frame_id: Optional ID of the frame to filter by. Must belong to the chat's canvas.
+        cursor: `next_cursor` from a previous call with the same filters. Not supported with `contains`.
         
     Returns:
-        A JSON string representing a list of elements.
+        A JSON string with the list of elements (oldest to newest) and the cursor for the next page.
     """
-    return run_async(_fetch_elements_impl(
+    return await _fetch_elements_impl(
         tool_context=tool_context,
         limit=limit,
         time_range=time_range,
@@ -116,8 +123,9 @@ def fetch_elements(
         author=author,
         contains=contains,
         include_details=include_details,
-        frame_id=frame_id
-    ))
+        frame_id=frame_id,
+        cursor=cursor
+    )
 
 async def _fetch_elements_impl(
     tool_context: ToolContext,
@@ -127,10 +135,14 @@ async def _fetch_elements_impl(
     author: Optional[str] = None,
     contains: Optional[str] = None,
     include_details: bool = False,
-    frame_id: Optional[str] = None
+    frame_id: Optional[str] = None,
+    cursor: Optional[str] = None
 ) -> str:
     chat_id = extract_chat_id(tool_context)
 
+    if cursor and contains:
+        return "Error: 'cursor' cannot be combined with 'contains' (search results are ranked, not paged)."
+
     start_dt = None
     end_dt = None
     
@@ -148,7 +160,7 @@ async def _fetch_elements_impl(
 
     try:
         # Resolve canvas for chat
-        from ai_core.services.canvas_service import canvas_service
+        from ai_core.services.canvas_service import canvas_service, ELEMENT_SUMMARY_COLUMNS, ELEMENT_DETAIL_COLUMNS
         
         canvas = await canvas_service.get_or_create_canvas_for_chat(str(chat_id))
         
@@ -158,64 +170,35 @@ async def _fetch_elements_impl(
             if frame_uuid not in [f.id for f in frames]:
                 return "Error: Frame not found in this chat."
         
-        # Fetch a larger batch to allow for filtering in Python
-        fetch_limit = max(limit * 5, 100)
-        
-        # Pass start_dt as 'since' to the service for DB-level filtering
-        elements = await canvas_service.get_elements(
+        # All filters run in the database, exactly `limit` rows
+        filters = dict(
             canvas_id=canvas.id,
-            limit=fetch_limit,
+            limit=limit,
             since=start_dt,
-            frame_id=frame_uuid
+            until=end_dt,
+            frame_id=frame_uuid,
+            created_by_contains=created_by,
+            author_contains=author,
+            # Plain rows with just the fields returned below
+            columns=ELEMENT_DETAIL_COLUMNS if include_details else ELEMENT_SUMMARY_COLUMNS
         )
+        next_cursor = None
+        if contains:
+            # Full-text index, best matches first
+            elements = await canvas_service.search_elements(query=contains, **filters)
+        else:
+            # Newest first, keyset-paginated
+            elements, next_cursor = await canvas_service.get_elements_page(cursor=cursor, **filters)
+
+        frame_ids = {}
+        if include_details:
+            frame_ids = await canvas_service.get_frame_ids([el.id for el in elements])
         
     except Exception as e:
         return f"Error fetching elements: {str(e)}"
 
-    if not elements:
-        return "[]" # Return empty JSON list
-
-    # Filter in Python
-    filtered_elements = []
-    
-    for el in elements:
-        # Filter: end_time (if specified)
-        if end_dt:
-            # Ensure timezone awareness for comparison
-            el_created = el.created_at
-            if el_created.tzinfo is None:
-                el_created = el_created.replace(tzinfo=timezone.utc)
-            
-            if el_created >= end_dt:
-                continue
-                
-        # Filter: created_by (substring, case-insensitive)
-        if created_by:
-            if created_by.lower() not in el.created_by.lower():
-                continue
-                
-        # Filter: author (substring in attributes.author_name or author_nick)
-        if author:
-            attrs = el.attributes or {}
-            a_name = attrs.get('author_name') or ''
-            a_nick = attrs.get('author_nick') or ''
-            
-            if author.lower() not in a_name.lower() and author.lower() not in a_nick.lower():
-                continue
-
-        # Filter: contains (substring in content, case-insensitive)
-        if contains:
-            if contains.lower() not in el.content.lower():
-                continue
-                
-        filtered_elements.append(el)
-
     # Sort ascending by created_at for observer/summarizer readability
-    elements_sorted = sorted(filtered_elements, key=lambda m: m.created_at)
-    
-    # Apply limit after filtering (take last N for most recent)
-    if len(elements_sorted) > limit:
-        elements_sorted = elements_sorted[-limit:]
+    elements_sorted = sorted(elements, key=lambda m: m.created_at)
 
     import json
 
@@ -230,13 +213,12 @@ async def _fetch_elements_impl(
         }
         
         if include_details:
-            frame_ids = [str(f.id) for f in el.frames]
             msg_data.update({
                 "canvas_id": str(el.canvas_id),
-                "frame_ids": frame_ids,
+                "frame_ids": [str(f) for f in frame_ids.get(el.id, [])],
                 "attributes": el.attributes
             })
             
         messages_data.append(msg_data)
 
-    return json.dumps(messages_data, ensure_ascii=False, indent=2)
+    return json.dumps({"elements": messages_data, "next_cursor": next_cursor}, ensure_ascii=False, indent=2)
@@ -1,9 +1,11 @@
 import asyncio
 import functools
+import inspect
 import logging
 import os
+import threading
 from google.adk.tools import ToolContext
-from typing import TypeVar, Coroutine, Any, Callable
+from typing import TypeVar, Coroutine, Any, Callable, Optional
 
 from concurrent.futures import ThreadPoolExecutor
 
@@ -11,56 +13,96 @@ logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+def _truncate(value):
+    if isinstance(value, str) and len(value) > 100:
+        return value[:100] + "..."
+    return value
+
 def log_tool_call(func: Callable[..., Any]) -> Callable[..., Any]:
     """
     Decorator to log tool calls with smart truncation of long string arguments.
+    Works for sync and async tools.
     """
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # Helper to process values
-        def process_val(v):
-            if isinstance(v, str) and len(v) > 100:
-                return v[:100] + "..."
-            return v
-
+    def log_call(args, kwargs):
         # Process args and kwargs for logging
-        log_args = [process_val(a) for a in args]
-        log_kwargs = {k: process_val(v) for k, v in kwargs.items()}
-        
+        log_args = [_truncate(a) for a in args]
+        log_kwargs = {k: _truncate(v) for k, v in kwargs.items()}
         logger.info(f"Tool Call: {func.__name__} | Args: {log_args} | Kwargs: {log_kwargs}")
-        
+
+    def log_result(result):
+        logger.info(f"Tool Result: {func.__name__} | Result: {_truncate(result)}")
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            log_call(args, kwargs)
+            result = await func(*args, **kwargs)
+            log_result(result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        log_call(args, kwargs)
         result = func(*args, **kwargs)
-        
-        # Log result
-        log_result = process_val(result)
-        logger.info(f"Tool Result: {func.__name__} | Result: {log_result}")
-        
+        log_result(result)
         return result
     return wrapper
 
+def sync_tool(async_tool: Callable[..., Coroutine[Any, Any, T]]) -> Callable[..., T]:
+    """
+    Decorator for async tools: returns a blocking version with the same name,
+    signature and docstring, which runs the tool through run_async.
+    
+    The async tool stays available as `.aio`. Give agents that one: the
+    runner awaits it on its own loop, and parallel function calls run
+    concurrently instead of each blocking a thread.
+    """
+    @functools.wraps(async_tool)
+    def wrapper(*args, **kwargs):
+        return run_async(async_tool(*args, **kwargs))
+    wrapper.aio = async_tool
+    return wrapper
+
+
+# Long-lived loop that runs the async side of sync tools, see run_async
+_bridge_loop: Optional[asyncio.AbstractEventLoop] = None
+_bridge_lock = threading.Lock()
+
+
+def _get_bridge_loop() -> asyncio.AbstractEventLoop:
+    global _bridge_loop
+    loop = _bridge_loop
+    if loop is not None and loop.is_running():
+        return loop
+    with _bridge_lock:
+        if _bridge_loop is None or _bridge_loop.is_closed():
+            _bridge_loop = asyncio.new_event_loop()
+            threading.Thread(target=_bridge_loop.run_forever, name="tool-bridge-loop", daemon=True).start()
+        return _bridge_loop
+
+
 def run_async(coro: Coroutine[Any, Any, T]) -> T:
     """
-    Runs an async coroutine from a synchronous context.
-    Handles cases where an event loop is already running.
+    Runs an async coroutine from a synchronous context and returns its result.
+    
+    All calls share one long-lived event loop in a daemon thread: no thread
+    or loop setup per tool call, and per-loop state (aiosqlite connections,
+    the element write queue) lives as long as the process. Works whether or
+    not the calling thread has a running loop; the calling thread blocks
+    until the coroutine finishes.
     """
+    loop = _get_bridge_loop()
     try:
-        loop = asyncio.get_running_loop()
+        running = asyncio.get_running_loop()
     except RuntimeError:
-        loop = None
-
-    if loop and loop.is_running():
-        # If we are in a running loop (e.g. inside a tool called by an async agent runner),
-        # we can't just use asyncio.run().
-        # However, ADK tools are often called synchronously.
-        # If the caller is async but calls this sync tool, we might block the loop if we are not careful.
-        # But here we assume we need to bridge sync -> async.
-        # Ideally, we should use a thread to run the async code if we are already in a loop
-        # to avoid "This event loop is already running" error.
-        with ThreadPoolExecutor() as executor:
-            future = executor.submit(asyncio.run, coro)
-            return future.result()
-    else:
-        return asyncio.run(coro)
+        running = None
+    if running is loop:
+        # Sync tool called from a coroutine on the bridge loop itself: waiting
+        # for the loop from its own thread would deadlock.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
 
 
 def extract_chat_id(tool_context: ToolContext) -> int:
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-turn setup cost of run_agent_async before the model is called.
+
+Compares building a Runner and checking the session (a full get_session,
+which also loads the session history) on every turn with the shared
+AgentRunnerRegistry, for an active chat whose session already holds
+--events events. The model is never called.
+
+Runs against a throwaway session database in a temp directory, never
+against data/db.
+
+    python scripts/benchmarks/bench_agent_runner.py --turns 500 --events 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ["PROJECT_ROOT"] = tempfile.mkdtemp(prefix="mesh_mind_bench_runner_")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+async def main(turns: int, events: int):
+    from google.adk.events import Event
+    from google.adk.runners import Runner
+    from google.genai import types
+    from ai_core.common.adk import get_session_service, get_runner_registry
+    from ai_core.agents.orchestrator.agent import root_agent
+
+    service = get_session_service()
+    session = await service.create_session(
+        app_name="agents", user_id="bench", session_id="bench-chat", state={"chat_id": "bench-chat"}
+    )
+    for i in range(events):
+        await service.append_event(session, Event(
+            author="user" if i % 2 == 0 else root_agent.name, invocation_id=f"inv-{i // 2}",
+            content=types.Content(role="user" if i % 2 == 0 else "model", parts=[types.Part(text=f"message {i} " * 20)]),
+        ))
+
+    async def per_turn():
+        Runner(agent=root_agent, app_name="agents", session_service=service)
+        await service.get_session(app_name="agents", user_id="bench", session_id="bench-chat")
+
+    registry = get_runner_registry()
+
+    async def cached():
+        registry.get_runner(root_agent, "agents")
+        await registry.ensure_session("agents", "bench", "bench-chat", "bench-chat")
+
+    print(f"{turns} turns, session with {events} events")
+    results = {}
+    for name, fn in (("per-turn setup", per_turn), ("registry", cached)):
+        await fn()  # warm up
+        started = time.perf_counter()
+        for _ in range(turns):
+            await fn()
+        results[name] = (time.perf_counter() - started) / turns
+        print(f"{name:>15}: {results[name] * 1e6:9.1f} us per turn")
+    print(f"  x{results['per-turn setup'] / results['registry']:.0f} less setup per turn; {registry.cache_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500, help="turns per measurement")
+    parser.add_argument("--events", type=int, default=200, help="events already in the chat session")
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.events))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: add_element one by one vs add_elements_bulk.
+
+Runs against a throwaway database in a temp directory (PROJECT_ROOT override),
+never against data/db.
+
+    python scripts/benchmarks/bench_bulk_insert.py --count 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Isolated DB: must be set before ai_core is imported
+os.environ["PROJECT_ROOT"] = tempfile.mkdtemp(prefix="mesh_mind_bench_")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from ai_core.storage import init_db
+from ai_core.services.canvas_service import CanvasService
+
+
+def make_items(canvas_id, count, frame_id=None):
+    return [
+        {
+            "canvas_id": canvas_id,
+            "type": "message",
+            "content": f"Benchmark message #{i} with some ordinary chat text in it",
+            "created_by": "telegram:1 | bench",
+            "attributes": {"source": "telegram", "source_msg_id": str(i), "author_nick": "bench"},
+            "frame_id": frame_id if i % 10 == 0 else None,
+        }
+        for i in range(count)
+    ]
+
+
+async def main(count: int, single_count: int, batch_size: int):
+    await init_db()
+    service = CanvasService()
+
+    canvas = await service.get_or_create_canvas_for_chat("bench-single")
+    items = make_items(canvas.id, single_count)
+    start = time.perf_counter()
+    for item in items:
+        await service.add_element(**item)
+    single = time.perf_counter() - start
+    print(f"add_element:        {single_count:>7} rows in {single:6.2f}s  ({single_count / single:,.0f} rows/s)")
+
+    canvas = await service.get_or_create_canvas_for_chat("bench-bulk")
+    frame = await service.create_frame(canvas.id, "bench")
+    items = make_items(canvas.id, count, frame_id=frame.id)
+    start = time.perf_counter()
+    for i in range(0, count, batch_size):
+        await service.add_elements_bulk(items[i:i + batch_size])
+    bulk = time.perf_counter() - start
+    print(f"add_elements_bulk:  {count:>7} rows in {bulk:6.2f}s  ({count / bulk:,.0f} rows/s, batch={batch_size})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000, help="rows for the bulk run")
+    parser.add_argument("--single-count", type=int, default=1_000, help="rows for the one-by-one run")
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.single_count, args.batch_size))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: database size and read speed with and without content compression.
+
+Each profile runs in its own subprocess (Settings are read at import) against
+a throwaway database in a temp directory, never against data/db. Both build
+the same canvas: mostly short chat messages plus some large bodies (document
+text, transcriptions, image descriptions) of natural-language-like text.
+Reports the file size and the time to
+- page through all messages (the common read, large bodies are not returned),
+- run a substring filter over every element (has to read and, when
+  compressed, inflate every large body),
+- scan the table without reading content (count by type and creator).
+
+    python scripts/benchmarks/bench_content_compression.py --messages 20000 --documents 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PROFILES = {
+    "raw": {"ELEMENT_COMPRESS_MIN_BYTES": "0"},
+    "compressed": {},  # Settings defaults
+}
+
+
+def run_profile(name: str, args) -> dict:
+    env = dict(os.environ, **PROFILES[name])
+    env["PROJECT_ROOT"] = tempfile.mkdtemp(prefix=f"mesh_mind_bench_{name}_")
+    env.setdefault("GOOGLE_API_KEY", "benchmark")
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--messages", str(args.messages), "--documents", str(args.documents), "--repeat", str(args.repeat),
+    ]
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def make_text(rng, words, cum_weights, n_words: int) -> str:
+    # Zipf-like word frequencies, sentences of 5-20 words
+    out = []
+    while len(out) < n_words:
+        sentence = rng.choices(words, cum_weights=cum_weights, k=rng.randint(5, 20))
+        sentence[0] = sentence[0].capitalize()
+        sentence[-1] += "."
+        out.extend(sentence)
+    return " ".join(out[:n_words])
+
+
+async def worker(messages: int, documents: int, repeat: int) -> dict:
+    import itertools
+    import random
+    import time
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from sqlalchemy import text
+    from ai_core.storage import init_db
+    from ai_core.storage.db import engine
+    from ai_core.services.canvas_service import CanvasService, ELEMENT_SUMMARY_COLUMNS
+
+    rng = random.Random(42)
+    alphabet = "абвгдеёжзийклмнопрстуфхцчшщыьэюяabcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choices(alphabet, k=rng.randint(2, 10))) for _ in range(3000)]
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(words))))
+
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat("bench-compression")
+    items = [
+        {"canvas_id": canvas.id, "type": "message", "content": make_text(rng, words, cum_weights, rng.randint(3, 60)),
+         "created_by": f"telegram:user:{i % 20}"}
+        for i in range(messages)
+    ]
+    for i in range(documents):
+        # 1k-10k words, somewhere in the history
+        items.insert(rng.randrange(len(items) + 1), {
+            "canvas_id": canvas.id, "type": rng.choice(["document", "voice", "image"]),
+            "content": make_text(rng, words, cum_weights, rng.randint(1000, 10000)), "created_by": "bot",
+        })
+    for start in range(0, len(items), 1000):
+        await service.add_elements_bulk(items[start:start + 1000])
+
+    async with engine.begin() as conn:
+        page_count = (await conn.execute(text("PRAGMA page_count"))).scalar()
+        page_size = (await conn.execute(text("PRAGMA page_size"))).scalar()
+        table_bytes = (await conn.execute(text(
+            "SELECT sum(length(CAST(content AS BLOB))) FROM canvas_elements"
+        ))).scalar()
+
+    async def page_messages():
+        cursor, n = None, 0
+        while True:
+            page, cursor = await service.get_elements_page(
+                canvas.id, limit=200, type="message", cursor=cursor, columns=ELEMENT_SUMMARY_COLUMNS
+            )
+            n += len(page)
+            if not cursor:
+                return n
+
+    async def substring_filter():
+        return len(await service.get_elements(canvas.id, limit=100, content_contains="zzzz-no-match"))
+
+    async def table_scan():
+        async with engine.connect() as conn:
+            return (await conn.execute(text(
+                "SELECT count(DISTINCT type || created_by) FROM canvas_elements NOT INDEXED"
+            ))).scalar()
+
+    timings = {}
+    for name, fn in (("page_messages", page_messages), ("substring_filter", substring_filter), ("table_scan", table_scan)):
+        await fn()  # warm up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await fn()
+        timings[name] = (time.perf_counter() - started) / repeat
+
+    return {
+        "db_bytes": page_count * page_size,
+        "content_bytes": table_bytes,
+        **timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="short chat messages on the canvas")
+    parser.add_argument("--documents", type=int, default=500, help="large bodies on the canvas")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each read")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        import asyncio
+        print(json.dumps(asyncio.run(worker(args.messages, args.documents, args.repeat))))
+        return
+
+    print(f"{args.messages} messages + {args.documents} large bodies, {args.repeat} runs per read")
+    results = {name: run_profile(name, args) for name in PROFILES}
+    for name, r in results.items():
+        print(
+            f"{name:>10}: db {r['db_bytes'] / 2**20:7.1f} MiB  content {r['content_bytes'] / 2**20:7.1f} MiB  "
+            f"page messages {r['page_messages'] * 1000:7.1f} ms  substring filter {r['substring_filter'] * 1000:7.1f} ms  "
+            f"table scan {r['table_scan'] * 1000:7.1f} ms"
+        )
+    raw, compressed = results["raw"], results["compressed"]
+    print(f"  size: x{raw['db_bytes'] / compressed['db_bytes']:.2f} smaller")
+
+
+if __name__ == "__main__":
+    main()
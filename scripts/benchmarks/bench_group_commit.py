@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a burst of concurrent messages through add_element vs add_element_batched.
+
+Runs against a throwaway database in a temp directory (PROJECT_ROOT override),
+never against data/db.
+
+    python scripts/benchmarks/bench_group_commit.py --count 2000 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Isolated DB: must be set before ai_core is imported
+os.environ["PROJECT_ROOT"] = tempfile.mkdtemp(prefix="mesh_mind_bench_")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from ai_core.storage import init_db
+from ai_core.services.canvas_service import CanvasService
+
+
+async def burst(add, canvas_id, count: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await add(
+                canvas_id, "message", f"Benchmark message #{i} with some ordinary chat text in it",
+                "telegram:1 | bench", attributes={"source": "telegram", "source_msg_id": str(i)}
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(count)])
+    return time.perf_counter() - start
+
+
+async def main(count: int, concurrency: int):
+    await init_db()
+    service = CanvasService()
+
+    canvas = await service.get_or_create_canvas_for_chat("bench-single")
+    single = await burst(service.add_element, canvas.id, count, concurrency)
+    print(f"add_element:          {count:>7} rows in {single:6.2f}s  ({count / single:,.0f} rows/s)")
+
+    canvas = await service.get_or_create_canvas_for_chat("bench-batched")
+    batched = await burst(service.add_element_batched, canvas.id, count, concurrency)
+    stats = service.write_stats()
+    print(
+        f"add_element_batched:  {count:>7} rows in {batched:6.2f}s  ({count / batched:,.0f} rows/s, "
+        f"{stats['batches']} commits)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2_000, help="messages in the burst")
+    parser.add_argument("--concurrency", type=int, default=100, help="messages in flight at once")
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.concurrency))
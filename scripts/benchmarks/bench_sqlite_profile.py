@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent chat load with the engine as it was before the storage
+profile vs the tuned profile.
+
+The baseline is the old setup itself: one create_async_engine() with its
+defaults for reads and writes (rollback journal, FULL sync, pysqlite's 5s
+timeout, deferred BEGIN, no pragmas). Each profile runs in its own subprocess (Settings are read at import) against
+a throwaway database in a temp directory, never against data/db. Writers add
+elements one by one (one commit each, like incoming messages) while readers
+page through canvases, all at the same time. Reports the time to finish the
+whole mixed workload.
+
+    python scripts/benchmarks/bench_sqlite_profile.py --chats 8 --writes 200 --readers 8 --reads 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Environment of each profile's worker
+PROFILES = {
+    "baseline": {"BENCH_LEGACY_ENGINE": "1"},
+    "tuned": {},  # Settings defaults
+}
+
+
+def use_legacy_engine():
+    """Swaps the storage engines for the pre-profile one: create_async_engine(DATABASE_URL) for everything."""
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from ai_core.storage import db
+    from ai_core.services import canvas_service
+
+    legacy = create_async_engine(db.DATABASE_URL, echo=False)
+    # App SQL functions (casefold, element_text), not part of the profile
+    event.listen(legacy.sync_engine, "connect", db._register_sqlite_functions)
+    sessions = sessionmaker(legacy, class_=AsyncSession, expire_on_commit=False)
+    db.engine = legacy  # init_db
+    canvas_service.async_session = sessions
+    canvas_service.read_session = sessions
+
+
+def run_profile(name: str, args) -> dict:
+    env = dict(os.environ, **PROFILES[name])
+    env["PROJECT_ROOT"] = tempfile.mkdtemp(prefix=f"mesh_mind_bench_{name}_")
+    env.setdefault("GOOGLE_API_KEY", "benchmark")
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--chats", str(args.chats), "--writes", str(args.writes),
+        "--readers", str(args.readers), "--reads", str(args.reads),
+    ]
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+async def worker(chats: int, writes: int, readers: int, reads: int) -> dict:
+    import asyncio
+    import time
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from ai_core.storage import init_db
+    from ai_core.services.canvas_service import CanvasService
+
+    if os.environ.get("BENCH_LEGACY_ENGINE"):
+        use_legacy_engine()
+    await init_db()
+    service = CanvasService()
+    canvases = [await service.get_or_create_canvas_for_chat(f"bench-{i}") for i in range(chats)]
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+
+    async def write_loop(canvas):
+        for i in range(writes):
+            try:
+                await service.add_element(
+                    canvas.id, "message", f"Benchmark message #{i} with some ordinary chat text",
+                    "telegram:1 | bench", attributes={"source": "telegram", "source_msg_id": str(i)}
+                )
+                counts["writes"] += 1
+            except Exception:
+                counts["errors"] += 1
+
+    async def read_loop(n):
+        for _ in range(reads):
+            try:
+                await service.get_elements_page(canvases[n % chats].id, limit=50)
+                counts["reads"] += 1
+            except Exception:
+                counts["errors"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[write_loop(c) for c in canvases], *[read_loop(n) for n in range(readers)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed": elapsed,
+        "writes_per_s": counts["writes"] / elapsed,
+        "reads_per_s": counts["reads"] / elapsed,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=8, help="concurrent writer chats")
+    parser.add_argument("--writes", type=int, default=200, help="elements written per chat")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent reader tasks")
+    parser.add_argument("--reads", type=int, default=200, help="pages read per reader")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        import asyncio
+        print(json.dumps(asyncio.run(worker(args.chats, args.writes, args.readers, args.reads))))
+        return
+
+    print(f"{args.chats} chats x {args.writes} writes, {args.readers} readers x {args.reads} pages")
+    results = {name: run_profile(name, args) for name in PROFILES}
+    for name, r in results.items():
+        print(
+            f"{name:>9}: {r['writes_per_s']:8.0f} writes/s  {r['reads_per_s']:8.0f} reads/s  "
+            f"{r['errors']} errors  ({r['elapsed']:.2f}s)"
+        )
+    base, tuned = results["baseline"], results["tuned"]
+    print(f"  speedup: x{base['elapsed'] / tuned['elapsed']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
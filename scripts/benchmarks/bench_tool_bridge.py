@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-call overhead of the sync-to-async tool bridge (tools.utils.run_async).
+
+Sync tools are called from the agent runner's event loop, so the bridge runs
+while a loop is already running. Compares the previous bridge (a new
+ThreadPoolExecutor and asyncio.run loop per call) with the shared bridge
+loop, for an empty coroutine and for a cached canvas lookup through
+CanvasService (the first step of every canvas tool).
+
+Runs against a throwaway database in a temp directory, never against data/db.
+
+    python scripts/benchmarks/bench_tool_bridge.py --calls 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["PROJECT_ROOT"] = tempfile.mkdtemp(prefix="mesh_mind_bench_bridge_")
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def run_async_per_call(coro):
+    """The previous run_async, for a running loop: fresh thread and loop per call."""
+    with ThreadPoolExecutor() as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def main(calls: int):
+    from ai_core.storage import init_db
+    from ai_core.services.canvas_service import canvas_service
+    from ai_core.tools.utils import run_async
+
+    await init_db()
+    await canvas_service.get_or_create_canvas_for_chat("bench-bridge")
+
+    async def noop():
+        return None
+
+    def lookup():
+        return canvas_service.get_or_create_canvas_for_chat("bench-bridge")
+
+    print(f"{calls} calls from inside a running event loop")
+    for name, make_coro in (("empty coroutine", noop), ("cached canvas lookup", lookup)):
+        results = {}
+        for bridge_name, bridge in (("per-call loop", run_async_per_call), ("shared loop", run_async)):
+            bridge(make_coro())  # warm up
+            started = time.perf_counter()
+            for _ in range(calls):
+                bridge(make_coro())
+            results[bridge_name] = (time.perf_counter() - started) / calls
+        per_call, shared = results["per-call loop"], results["shared loop"]
+        print(
+            f"{name:>21}: per-call loop {per_call * 1e6:8.1f} us  shared loop {shared * 1e6:8.1f} us  "
+            f"(x{per_call / shared:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000, help="bridge calls per measurement")
+    asyncio.run(main(parser.parse_args().calls))
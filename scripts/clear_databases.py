@@ -12,15 +12,23 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from ai_core.common.config import settings
 
+def remove_sqlite_db(db_path: str) -> bool:
+    """Удаляет файл SQLite БД вместе с -wal/-shm (WAL-режим). Возвращает False, если удалять было нечего."""
+    # Сначала -wal/-shm: старый -wal рядом с новой БД вернул бы удалённые данные или испортил её
+    removed = False
+    for path in (db_path + "-wal", db_path + "-shm", db_path):
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
 def clear_databases():
     """Очищает SQLite."""
     
     # 1. Очистка SQLite БД
     db_path = settings.DB_PATH
-    if os.path.exists(db_path):
-        print(f"Удаляю SQLite БД: {db_path}")
-        os.remove(db_path)
-        print("✅ SQLite БД удалена")
+    if remove_sqlite_db(db_path):
+        print(f"✅ SQLite БД удалена: {db_path}")
     else:
         print(f"⚠️  SQLite БД не найдена: {db_path}")
     
@@ -20,7 +20,7 @@ patcher.start()
 
 from ai_core.storage.db import init_db, save_message, get_messages, Message
 from ai_core.agents.orchestrator.agent import root_agent as orchestrator
-from ai_core.common.adk import run_agent_sync
+from ai_core.common.adk import run_agent_async
 from ai_core.common.formatters import format_message_to_string
 
 # ANSI Colors
@@ -113,12 +113,11 @@ async def run_demo_case(title: str, user_input: str, chat_id: str, expected_agen
     contexted_text = f"Context: chat_id={chat_id}\nUser message in the group Telegram chat:\n\n{user_input}"
     
     try:
-        response = await asyncio.to_thread(
-            run_agent_sync,
+        response = await run_agent_async(
             agent=orchestrator,
             user_message=contexted_text,
             user_id="demo_user",
-            session_id=chat_id
+            chat_id=chat_id
         )
         
         duration = time.time() - start_time
@@ -1,5 +1,4 @@
 import logging
-import asyncio
 from pathlib import Path
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -17,7 +16,7 @@ from telegram_bot.utils import (
 from ai_core.common.config import settings
 from ai_core.common.transcription import TranscriptionService
 from ai_core.agents.orchestrator.agent import root_agent as orchestrator
-from ai_core.common.adk import run_agent_sync
+from ai_core.common.adk import run_agent_async
 
 logger = logging.getLogger(__name__)
 
@@ -157,8 +156,7 @@ async def process_message_content(
         ctx_str = '\n'.join([f'{k}: {v}' for k, v in ctx.items()])
         contexted_text = f"{ctx_str}\n\nMessage/Description:\n\n{element.content}"
         
-        agent_response = await asyncio.to_thread(
-            run_agent_sync,
+        agent_response = await run_agent_async(
             agent=orchestrator,
             user_message=contexted_text,
             user_id=str(user.id),
@@ -183,7 +181,8 @@ async def handle_voice_or_text_message(update: Update, context: ContextTypes.DEF
     from ai_core.services.canvas_service import canvas_service
     
     async def create_text_element(canvas_id, created_by, attributes):
-        return await canvas_service.add_element(
+        # Group commit: bursts from busy chats share one transaction
+        return await canvas_service.add_element_batched(
             canvas_id=canvas_id,
             type=media_type,
             content=text,
@@ -74,6 +74,9 @@ async def send_startup_notification(application: Application):
 
 async def post_init(application: Application) -> None:
     """Notify admins that the bot has started and start background tasks."""
+    # Fail loudly now rather than on the first long chat after an ADK upgrade
+    from ai_core.common.adk import get_session_compactor
+    await get_session_compactor().check_compatibility()
     # Start the monitor loop
     asyncio.create_task(monitor_loop(application))
     # Start notification task
@@ -0,0 +1,191 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from google.genai.errors import ClientError
+
+from ai_core.common import adk
+
+
+def make_event(text=None, final=True):
+    event = MagicMock()
+    event.is_final_response.return_value = final
+    event.content.parts = [MagicMock(text=text)] if text is not None else []
+    return event
+
+
+@pytest.fixture
+def mock_session_service():
+    service = MagicMock()
+    service.get_session = AsyncMock(return_value=None)
+    service.create_session = AsyncMock(return_value=MagicMock(state={}))
+    compactor = adk.SessionCompactor(service, engine=MagicMock(), max_events=0, max_prompt_tokens=0)
+    with patch.object(adk, "_runner_registry", adk.AgentRunnerRegistry(service)), \
+         patch.object(adk, "_session_compactor", compactor):
+        yield service
+
+
+@pytest.fixture
+def mock_runner():
+    with patch.object(adk, "Runner") as MockRunner:
+        yield MockRunner.return_value
+
+
+def stream(*events):
+    async def run_async(**kwargs):
+        for event in events:
+            yield event
+    return run_async
+
+
+@pytest.mark.asyncio
+async def test_run_agent_async_creates_session(mock_session_service, mock_runner):
+    mock_runner.run_async = stream(make_event(final=False), make_event("Hi there"), make_event("late"))
+
+    reply = await adk.run_agent_async(MagicMock(), "hello", chat_id="42", user_id="u1")
+
+    assert reply == "Hi there"
+    mock_session_service.create_session.assert_awaited_once()
+    kwargs = mock_session_service.create_session.call_args.kwargs
+    assert kwargs["session_id"] == "42"
+    assert kwargs["state"] == {"chat_id": "42"}
+
+
+@pytest.mark.asyncio
+async def test_run_agent_async_reuses_session(mock_session_service, mock_runner):
+    mock_session_service.get_session.return_value = MagicMock(state={"chat_id": "42"})
+    mock_runner.run_async = stream(make_event("ok"))
+
+    assert await adk.run_agent_async(MagicMock(), "hello", chat_id="42", session_id="run_1") == "ok"
+    assert mock_session_service.get_session.call_args.kwargs["session_id"] == "run_1"
+    mock_session_service.create_session.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_run_agent_async_quota_error(mock_session_service, mock_runner):
+    error = ClientError(429, {"error": {"message": "Quota exceeded", "details": [
+        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "30s"},
+    ]}})
+
+    async def run_async(**kwargs):
+        raise RuntimeError("model call failed") from error
+        yield
+
+    mock_runner.run_async = run_async
+
+    with pytest.raises(Exception, match="Quota exceeded") as exc_info:
+        await adk.run_agent_async(MagicMock(), "hello", chat_id="42")
+    assert "Retry after: 30s" in str(exc_info.value)
+
+
+@pytest.mark.asyncio
+async def test_run_agent_async_reuses_runner_and_session(mock_session_service, mock_runner):
+    mock_runner.run_async = stream(make_event("ok"))
+    agent = MagicMock()
+
+    for _ in range(3):
+        assert await adk.run_agent_async(agent, "hello", chat_id="42") == "ok"
+
+    # One Runner, one existence check and creation for three turns
+    assert adk.Runner.call_count == 1
+    mock_session_service.get_session.assert_awaited_once()
+    mock_session_service.create_session.assert_awaited_once()
+    stats = adk.get_runner_registry().cache_stats()
+    assert stats["runners"] == 1
+    assert (stats["runner_hits"], stats["runner_misses"]) == (2, 1)
+    assert (stats["session_hits"], stats["session_misses"]) == (2, 1)
+
+    # Another agent gets its own Runner
+    await adk.run_agent_async(MagicMock(), "hello", chat_id="43")
+    assert adk.get_runner_registry().cache_stats()["runners"] == 2
+
+
+@pytest.mark.asyncio
+async def test_session_cache_expires_and_forgets(mock_session_service):
+    registry = adk.AgentRunnerRegistry(mock_session_service, session_ttl=60, session_cache_size=2)
+    mock_session_service.get_session.return_value = MagicMock(state={})
+
+    with patch.object(adk.time, "monotonic", return_value=1000.0):
+        await registry.ensure_session("agents", "u1", "42", "42")
+        await registry.ensure_session("agents", "u1", "42", "42")
+    assert mock_session_service.get_session.await_count == 1
+
+    # Past the TTL the session is looked up again
+    with patch.object(adk.time, "monotonic", return_value=1061.0):
+        await registry.ensure_session("agents", "u1", "42", "42")
+    assert mock_session_service.get_session.await_count == 2
+
+    registry.forget_session("agents", "u1", "42")
+    await registry.ensure_session("agents", "u1", "42", "42")
+    assert mock_session_service.get_session.await_count == 3
+
+    # LRU bound
+    await registry.ensure_session("agents", "u1", "43", "43")
+    await registry.ensure_session("agents", "u1", "44", "44")
+    assert registry.cache_stats()["sessions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_turn_forgets_session(mock_session_service, mock_runner):
+    async def run_async(**kwargs):
+        raise ValueError("Session not found: 42")
+        yield
+
+    mock_runner.run_async = run_async
+    with pytest.raises(ValueError):
+        await adk.run_agent_async(MagicMock(), "hello", chat_id="42")
+
+    mock_runner.run_async = stream(make_event("ok"))
+    assert await adk.run_agent_async(MagicMock(), "hello", chat_id="42") == "ok"
+    assert mock_session_service.create_session.await_count == 2
+
+
+def test_run_agent_sync_without_loop(mock_session_service, mock_runner):
+    mock_runner.run_async = stream(make_event("sync reply"))
+
+    assert adk.run_agent_sync(MagicMock(), "hello", chat_id="42") == "sync reply"
+
+
+@pytest.mark.asyncio
+async def test_blocking_sync_tool_does_not_block_the_loop():
+    import asyncio
+    import time
+    from google.adk.agents import LlmAgent
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    def slow_tool() -> str:
+        """Blocks like a subprocess call."""
+        time.sleep(0.5)
+        return "done"
+
+    class ToolCallingLlm(BaseLlm):
+        async def generate_content_async(self, llm_request, stream=False):
+            if any(p.function_response for c in llm_request.contents for p in c.parts or []):
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="finished")]))
+            else:
+                yield LlmResponse(content=types.Content(role="model", parts=[
+                    types.Part(function_call=types.FunctionCall(name="slow_tool", args={}))]))
+
+    agent = LlmAgent(name="blocking_tools", model=ToolCallingLlm(model="fake"), tools=[slow_tool])
+    service = InMemorySessionService()
+    compactor = adk.SessionCompactor(service, engine=MagicMock(), max_events=0, max_prompt_tokens=0)
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    with patch.object(adk, "_runner_registry", adk.AgentRunnerRegistry(service)), \
+         patch.object(adk, "_session_compactor", compactor):
+        ticking = asyncio.create_task(ticker())
+        try:
+            assert await adk.run_agent_async(agent, "hello", chat_id="42") == "finished"
+        finally:
+            ticking.cancel()
+
+    # The loop kept running while the tool slept in a worker thread
+    assert ticks >= 20
@@ -0,0 +1,859 @@
+import asyncio
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from ai_core.storage import init_db
+from ai_core.storage.db import async_session, engine, read_engine, unit_of_work
+from ai_core.storage import migration
+from ai_core.storage.migration import backfill_canvas_access, migrate_legacy_messages
+from ai_core.common.models import Canvas, CanvasAccess, CanvasElement
+from ai_core.common.config import settings
+from ai_core.services.canvas_service import CanvasService, ELEMENT_SUMMARY_COLUMNS
+
+
+@contextmanager
+def capture_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    for target in (engine, read_engine):
+        event.listen(target.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in (engine, read_engine):
+            event.remove(target.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _chat_id() -> str:
+    # Unique per test run, the DB file is shared between tests
+    return f"test-{uuid.uuid4()}"
+
+
+@pytest.mark.asyncio
+async def test_canvas_for_chat_is_resolved_via_access_table():
+    await init_db()
+    service = CanvasService()
+    chat_id = _chat_id()
+
+    canvas = await service.get_or_create_canvas_for_chat(chat_id)
+    again = await service.get_or_create_canvas_for_chat(chat_id)
+    assert again.id == canvas.id
+
+    async with async_session() as session:
+        result = await session.execute(select(CanvasAccess).where(CanvasAccess.canvas_id == canvas.id))
+        rows = result.scalars().all()
+    assert [r.principal for r in rows] == [f"telegram:chat:{chat_id}"]
+
+
+@pytest.mark.asyncio
+async def test_canvas_not_found_without_create():
+    await init_db()
+    service = CanvasService()
+    with pytest.raises(ValueError, match="Canvas not found"):
+        await service.get_or_create_canvas_for_chat(_chat_id(), create_if_not_found=False)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_messages_create_single_canvas():
+    await init_db()
+    service = CanvasService()
+    chat_id = _chat_id()
+
+    canvases = await asyncio.gather(*[service.get_or_create_canvas_for_chat(chat_id) for _ in range(5)])
+    assert len({c.id for c in canvases}) == 1
+
+
+@pytest.mark.asyncio
+async def test_update_canvas_access_keeps_table_in_sync():
+    await init_db()
+    service = CanvasService()
+    chat_id = _chat_id()
+    other_chat_id = _chat_id()
+
+    canvas = await service.get_or_create_canvas_for_chat(chat_id)
+    updated = await service.update_canvas_access(
+        canvas.id, [f"telegram:chat:{chat_id}", f"telegram:chat:{other_chat_id}"]
+    )
+    assert len(updated.access_rules) == 2
+
+    shared = await service.get_or_create_canvas_for_chat(other_chat_id, create_if_not_found=False)
+    assert shared.id == canvas.id
+
+    await service.update_canvas_access(canvas.id, [f"telegram:chat:{chat_id}"])
+    with pytest.raises(ValueError):
+        await service.get_or_create_canvas_for_chat(other_chat_id, create_if_not_found=False)
+
+
+@pytest.mark.asyncio
+async def test_backfill_canvas_access_for_legacy_canvas():
+    await init_db()
+    service = CanvasService()
+    chat_id = _chat_id()
+
+    # Canvas written before canvas_access existed: no access rows
+    legacy = Canvas(name="legacy", access_rules=[f"telegram:chat:{chat_id}"])
+    async with async_session() as session:
+        session.add(legacy)
+        await session.commit()
+
+    with pytest.raises(ValueError):
+        await service.get_or_create_canvas_for_chat(chat_id, create_if_not_found=False)
+
+    await backfill_canvas_access()
+    await backfill_canvas_access()  # idempotent
+
+    canvas = await service.get_or_create_canvas_for_chat(chat_id, create_if_not_found=False)
+    assert canvas.id == legacy.id
+
+
+@pytest.mark.asyncio
+async def test_canvas_cache_hits_and_invalidation():
+    await init_db()
+    service = CanvasService()
+    chat_id = _chat_id()
+
+    canvas = await service.get_or_create_canvas_for_chat(chat_id)
+    await service.get_or_create_canvas_for_chat(chat_id)
+    await service.get_or_create_canvas_for_chat(chat_id)
+    stats = service.cache_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+
+    await service.update_canvas(canvas.id, "Renamed")
+    renamed = await service.get_or_create_canvas_for_chat(chat_id)
+    assert renamed.name == "Renamed"
+    assert service.cache_stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_canvas_cache_is_bounded():
+    await init_db()
+    service = CanvasService(cache_size=2)
+    first, second, third = _chat_id(), _chat_id(), _chat_id()
+
+    for chat_id in (first, second, third):
+        await service.get_or_create_canvas_for_chat(chat_id)
+    assert service.cache_stats()["size"] == 2
+
+    # Least recently used entry was evicted
+    await service.get_or_create_canvas_for_chat(first)
+    assert service.cache_stats()["misses"] == 4
+
+
+@pytest.mark.asyncio
+async def test_get_elements_filters_run_in_database():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    now = datetime.now(timezone.utc)
+
+    # Many non-matching newer elements: a Python-side window would miss the match
+    for i in range(30):
+        await service.add_element(canvas.id, "message", f"noise {i}", "telegram:user:1")
+    target = await service.add_element(
+        canvas.id, "message", "Обсудили ПРОЕКТ X", "telegram:user:42 | irina",
+        attributes={"author_name": "Ирина", "author_nick": "irina_k"},
+    )
+    async with async_session() as session:
+        target.created_at = now - timedelta(hours=3)
+        session.add(target)
+        await session.commit()
+
+    def ids(elements):
+        return [e.id for e in elements]
+
+    assert ids(await service.get_elements(canvas.id, limit=1, content_contains="проект")) == [target.id]
+    assert ids(await service.get_elements(canvas.id, limit=1, author_contains="ИРИНА")) == [target.id]
+    assert ids(await service.get_elements(canvas.id, limit=1, author_contains="Irina_K")) == [target.id]
+    assert ids(await service.get_elements(canvas.id, limit=1, created_by_contains="USER:42")) == [target.id]
+    assert ids(await service.get_elements(canvas.id, limit=5, until=now - timedelta(hours=1))) == [target.id]
+    assert await service.get_elements(canvas.id, limit=5, content_contains="проект", since=now - timedelta(hours=1)) == []
+
+    limited = await service.get_elements(canvas.id, limit=7, content_contains="noise")
+    assert len(limited) == 7
+    assert limited[0].content == "noise 29"
+
+
+@pytest.mark.asyncio
+async def test_search_elements_full_text():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    other = await service.get_or_create_canvas_for_chat(_chat_id())
+
+    plan = await service.add_element(canvas.id, "note", "Бюджет проекта на следующий квартал", "tester")
+    phrase = await service.add_element(canvas.id, "note", "следующий квартал начинается в марте", "tester")
+    await service.add_element(canvas.id, "note", "Про погоду", "tester")
+    await service.add_element(other.id, "note", "Бюджет проекта другого чата", "tester")
+
+    # Prefix match, scoped to the canvas
+    found = await service.search_elements(canvas.id, "проект бюдж")
+    assert [e.id for e in found] == [plan.id]
+
+    # Exact phrase vs all words
+    assert {e.id for e in await service.search_elements(canvas.id, "квартал следующий")} == {plan.id, phrase.id}
+    assert [e.id for e in await service.search_elements(canvas.id, '"квартал начинается"')] == [phrase.id]
+
+    # Index follows updates
+    await service.update_element(plan.id, content="Смета", name="Бюджет")
+    assert [e.id for e in await service.search_elements(canvas.id, "бюджет")] == [plan.id]
+    assert await service.search_elements(canvas.id, "квартал проекта") == []
+
+    # FTS operators in user input are treated as text
+    assert await service.search_elements(canvas.id, "NOT OR (") == []
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_walks_history_without_gaps():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+
+    same_time = datetime.now(timezone.utc) - timedelta(days=1)
+    created = []
+    for i in range(7):
+        el = await service.add_element(canvas.id, "message", f"m{i}", "tester")
+        created.append(el)
+    # Ties on created_at are broken by id
+    async with async_session() as session:
+        for el in created[2:5]:
+            el.created_at = same_time
+            session.add(el)
+        await session.commit()
+
+    first, cursor = await service.get_elements_page(canvas.id, limit=3)
+    # A new element arriving mid-walk must not shift later pages
+    await service.add_element(canvas.id, "message", "late", "tester")
+
+    seen = list(first)
+    while cursor:
+        page, cursor = await service.get_elements_page(canvas.id, limit=3, cursor=cursor)
+        seen.extend(page)
+
+    assert sorted(e.id for e in seen) == sorted(e.id for e in created)
+    assert len(seen) == len(created)
+
+    walked = [e.id async for e in service.iter_elements(canvas.id, batch_size=2)]
+    assert len(walked) == len(created) + 1
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        await service.get_elements(canvas.id, cursor="garbage")
+
+
+@pytest.mark.asyncio
+async def test_get_elements_by_indexed_attributes():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+
+    tg = await service.add_element(
+        canvas.id, "message", "hi", "tester",
+        attributes={"source": "telegram", "source_msg_id": "12345", "author_nick": "irina"},
+    )
+    # Legacy migration stored numeric message ids
+    legacy = await service.add_element(canvas.id, "message", "old", "tester", attributes={"source_msg_id": 777})
+    await service.add_element(canvas.id, "message", "other", "tester", attributes={"author_nick": "bob"})
+
+    found = await service.get_elements(canvas.id, attributes={"source": "telegram", "source_msg_id": "12345"})
+    assert [e.id for e in found] == [tg.id]
+    assert [e.id for e in await service.get_elements(canvas.id, attributes={"source_msg_id": 777})] == [legacy.id]
+    assert [e.id for e in await service.get_elements(canvas.id, attributes={"author_nick": "irina"})] == [tg.id]
+
+    with pytest.raises(ValueError, match="not indexed"):
+        await service.get_elements(canvas.id, attributes={"color": "red"})
+
+
+@pytest.mark.asyncio
+async def test_add_elements_bulk_with_frame_links():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    frame = await service.create_frame(canvas.id, "Imported")
+
+    items = [
+        {"canvas_id": canvas.id, "type": "message", "content": f"bulk {i}", "created_by": "importer",
+         "attributes": {"source_msg_id": str(i)}, "frame_id": frame.id if i % 2 else None}
+        for i in range(500)
+    ]
+    created = await service.add_elements_bulk(items)
+    assert len(created) == 500
+    first = await service.get_element(created[0])
+    assert first.content == "bulk 0"
+    assert first.attributes["created_by"] == "importer"
+
+    in_frame = await service.get_elements(canvas.id, frame_id=frame.id, limit=1000)
+    assert len(in_frame) == 250
+    assert len(await service.get_elements(canvas.id, limit=1000)) == 500
+
+    # Idempotent re-import with stable ids
+    again = [dict(item, element_id=element_id) for item, element_id in zip(items[:10], created)]
+    await service.add_elements_bulk(again, skip_existing=True)
+    assert len(await service.get_elements(canvas.id, limit=1000)) == 500
+
+    # Only duplicate ids are skipped: an invalid row still fails the whole batch
+    broken = again[:2] + [{"canvas_id": canvas.id, "type": None, "content": "no type", "created_by": "importer"}]
+    with pytest.raises(IntegrityError, match="NOT NULL"):
+        await service.add_elements_bulk(broken, skip_existing=True)
+    assert len(await service.get_elements(canvas.id, limit=1000)) == 500
+
+    # Bulk frame membership, existing links are kept
+    linked = await service.add_elements_to_frame_bulk(frame.id, created[:10])
+    assert linked == 5
+    assert len(await service.get_elements(canvas.id, frame_id=frame.id, limit=1000)) == 255
+
+
+@pytest.mark.asyncio
+async def test_legacy_migration_resumes_after_failure(monkeypatch):
+    await init_db()
+    service = CanvasService()
+    monkeypatch.setattr(migration, "canvas_service", service)
+    table = f"legacy_messages_{uuid.uuid4().hex}"
+    chats = [_chat_id(), _chat_id()]
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"""
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY, chat_id TEXT, content TEXT, source TEXT, media_type TEXT,
+                media_path TEXT, author_id TEXT, author_nick TEXT, author_name TEXT
+            )
+        """))
+        await conn.execute(
+            text(f"INSERT INTO {table} (id, chat_id, content, source, media_type, author_id) "
+                 "VALUES (:id, :chat_id, :content, 'telegram', :media_type, 'u1')"),
+            [{"id": i, "chat_id": chats[i % 2], "content": f"legacy {i}",
+              "media_type": "voice" if i == 0 else None} for i in range(25)]
+        )
+
+    # Crash on the third batch
+    real_bulk = service.add_elements_bulk
+    calls = 0
+
+    async def flaky_bulk(items, skip_existing=False):
+        nonlocal calls
+        calls += 1
+        if calls == 3:
+            raise RuntimeError("disk full")
+        return await real_bulk(items, skip_existing=skip_existing)
+
+    monkeypatch.setattr(service, "add_elements_bulk", flaky_bulk)
+    with pytest.raises(RuntimeError):
+        await migrate_legacy_messages(table, batch_size=5)
+    assert service.cache_stats()["misses"] == 2
+
+    monkeypatch.setattr(service, "add_elements_bulk", real_bulk)
+    assert await migrate_legacy_messages(table, batch_size=5) == 25
+
+    elements = []
+    for chat_id in chats:
+        canvas = await service.get_or_create_canvas_for_chat(chat_id, create_if_not_found=False)
+        elements.extend(await service.get_elements(canvas.id, limit=100))
+    assert len(elements) == 25
+    assert sorted(e.attributes["source_msg_id"] for e in elements) == list(range(25))
+    assert [e.type for e in elements if e.attributes["source_msg_id"] == 0] == ["voice"]
+
+    # Replaying a finished migration does not duplicate rows
+    assert await migrate_legacy_messages(table, batch_size=5) == 25
+    await migration._clear_checkpoint(f"legacy:{table}")
+    await migrate_legacy_messages(table, batch_size=5)
+    canvas = await service.get_or_create_canvas_for_chat(chats[0], create_if_not_found=False)
+    assert len(await service.get_elements(canvas.id, limit=100)) == 13
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_commits_once_and_rolls_back_together():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine.sync_engine, "commit", listener)
+    try:
+        async with unit_of_work():
+            frame = await service.create_frame(canvas.id, "Frame")
+            element = await service.add_element(canvas.id, "note", "in frame", "tester", frame_id=frame.id)
+            # Reads inside the block see its own writes
+            assert [e.id for e in await service.get_elements(canvas.id, frame_id=frame.id)] == [element.id]
+            async with unit_of_work():
+                await service.update_element(element.id, name="Named")
+    finally:
+        event.remove(engine.sync_engine, "commit", listener)
+    assert len(commits) == 1
+    assert (await service.get_element(element.id)).name == "Named"
+
+    with pytest.raises(RuntimeError):
+        async with unit_of_work():
+            doomed = await service.create_frame(canvas.id, "Doomed")
+            await service.add_element(canvas.id, "note", "lost", "tester", frame_id=doomed.id)
+            raise RuntimeError("tool failed")
+    assert await service.get_frame(doomed.id) is None
+    assert [e.content for e in await service.get_elements(canvas.id)] == ["in frame"]
+
+
+@pytest.mark.asyncio
+async def test_batched_writes_group_commit():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    frame = await service.create_frame(canvas.id, "Burst")
+
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine.sync_engine, "commit", listener)
+    try:
+        elements = await asyncio.gather(*[
+            service.add_element_batched(canvas.id, "message", f"burst {i}", "tester", frame_id=frame.id if i % 2 else None)
+            for i in range(100)
+        ])
+    finally:
+        event.remove(engine.sync_engine, "commit", listener)
+    assert len(commits) < 10
+    assert [e.content for e in elements] == [f"burst {i}" for i in range(100)]
+    # Committed by the time the caller resumes
+    assert (await service.get_element(elements[0].id)).attributes["created_by"] == "tester"
+    assert len(await service.get_elements(canvas.id, frame_id=frame.id, limit=1000)) == 50
+
+    # A failing element only fails its own caller
+    duplicate = elements[0].id
+    results = await asyncio.gather(
+        service.add_element_batched(canvas.id, "message", "dup", "tester", element_id=duplicate),
+        service.add_element_batched(canvas.id, "message", "fine", "tester"),
+        return_exceptions=True,
+    )
+    assert isinstance(results[0], Exception)
+    assert results[1].content == "fine"
+    assert len(await service.get_elements(canvas.id, limit=1000)) == 101
+
+
+@pytest.mark.asyncio
+async def test_batched_writes_fail_callers_when_the_writer_stops(monkeypatch):
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    queue = service._write_queue
+    writing = asyncio.Event()
+
+    async def stuck_write(batch):
+        writing.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(queue, "_write", stuck_write)
+    in_flight = [asyncio.create_task(service.add_element_batched(canvas.id, "message", f"in flight {i}", "tester"))
+                 for i in range(3)]
+    await writing.wait()
+    queued = [asyncio.create_task(service.add_element_batched(canvas.id, "message", f"queued {i}", "tester"))
+              for i in range(2)]
+    await asyncio.sleep(0)
+
+    # Cancelled mid-batch: in-flight and queued callers get an error instead of hanging
+    queue._task.cancel()
+    results = await asyncio.wait_for(asyncio.gather(*in_flight, *queued, return_exceptions=True), timeout=1)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert queue.stats()["pending"] == 0
+
+    # The next submit starts a new writer
+    monkeypatch.undo()
+    element = await asyncio.wait_for(service.add_element_batched(canvas.id, "message", "after", "tester"), timeout=5)
+    assert (await service.get_element(element.id)).content == "after"
+
+
+@pytest.mark.asyncio
+async def test_projection_reads_return_rows_and_batched_frame_ids():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    frame = await service.create_frame(canvas.id, "Frame")
+    in_frame = await service.add_element(canvas.id, "note", "framed hello", "tester", frame_id=frame.id)
+    loose = await service.add_element(canvas.id, "note", "loose hello", "tester")
+
+    rows = await service.get_elements(canvas.id, columns=[CanvasElement.content])
+    assert [(r.id, r.content) for r in rows] == [(loose.id, "loose hello"), (in_frame.id, "framed hello")]
+    assert not hasattr(rows[0], "frames")
+
+    page, next_cursor = await service.get_elements_page(canvas.id, limit=1, columns=ELEMENT_SUMMARY_COLUMNS)
+    assert [r.id for r in page] == [loose.id]
+    page, _ = await service.get_elements_page(canvas.id, limit=1, cursor=next_cursor, columns=ELEMENT_SUMMARY_COLUMNS)
+    assert [r.id for r in page] == [in_frame.id]
+
+    found = await service.search_elements(canvas.id, "framed", columns=ELEMENT_SUMMARY_COLUMNS)
+    assert [r.id for r in found] == [in_frame.id]
+    assert [r.id for r in await service.get_elements(canvas.id, frame_id=frame.id, columns=ELEMENT_SUMMARY_COLUMNS)] == [in_frame.id]
+
+    assert await service.get_frame_ids([in_frame.id, loose.id]) == {in_frame.id: [frame.id], loose.id: []}
+
+
+@pytest.mark.asyncio
+async def test_element_seq_and_high_water_mark():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    assert await service.get_high_water_mark(canvas.id) == 0
+
+    first = await service.add_element(canvas.id, "note", "one", "tester")
+    assert first.seq == 1
+    await service.add_elements_bulk([
+        {"canvas_id": canvas.id, "type": "note", "content": f"bulk {i}", "created_by": "tester"} for i in range(3)
+    ])
+    batched = await asyncio.gather(*[service.add_element_batched(canvas.id, "note", f"burst {i}", "tester") for i in range(3)])
+    assert sorted(e.seq for e in batched) == [5, 6, 7]
+    # Rows inserted outside CanvasService are numbered by the trigger
+    async with async_session() as session:
+        await session.execute(text(
+            "INSERT INTO canvas_elements (id, canvas_id, type, content, created_by, attributes, created_at) "
+            "VALUES (:id, :canvas_id, 'note', 'raw', 'tester', '{}', CURRENT_TIMESTAMP)"
+        ), {"id": uuid.uuid4().hex, "canvas_id": canvas.id.hex})
+        await session.commit()
+
+    high_water = await service.get_high_water_mark(canvas.id)
+    assert high_water == 8
+    after = await service.get_elements_after_seq(canvas.id, after_seq=first.seq, columns=[CanvasElement.content])
+    assert [(r.seq, r.content) for r in after] == [
+        (2, "bulk 0"), (3, "bulk 1"), (4, "bulk 2"),
+        *sorted((e.seq, e.content) for e in batched), (8, "raw"),
+    ]
+    assert await service.get_elements_after_seq(canvas.id, after_seq=high_water) == []
+    assert [e.id for e in await service.get_elements_after_seq(canvas.id, after_seq=6, limit=1)] == [
+        next(e.id for e in batched if e.seq == 7)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_backfill_element_seq_numbers_old_rows_in_created_order():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    now = datetime.now(timezone.utc)
+    ids = await service.add_elements_bulk([
+        {"canvas_id": canvas.id, "type": "note", "content": f"old {i}", "created_by": "tester",
+         "created_at": now - timedelta(minutes=10 - i)} for i in range(3)
+    ])
+    async with async_session() as session:
+        await session.execute(text("UPDATE canvas_elements SET seq = NULL WHERE canvas_id = :c"), {"c": canvas.id.hex})
+        await session.commit()
+
+    await migration.backfill_element_seq()
+    assert [r.content for r in await service.get_elements_after_seq(canvas.id, columns=[CanvasElement.content])] == [
+        "old 0", "old 1", "old 2"
+    ]
+    assert await service.get_high_water_mark(canvas.id) == 3
+
+
+@pytest.mark.asyncio
+async def test_triggers_work_for_writers_outside_the_app():
+    # The sqlite3 CLI, DB browsers and ops scripts have none of the app's SQL functions
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    compressed = await service.add_element(canvas.id, "document", "Годовой отчёт по продажам. " * 200, "tester")
+    element_id = uuid.uuid4()
+    cursor = await service.get_change_cursor(canvas.id)
+
+    conn = sqlite3.connect(settings.DB_PATH)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO canvas_elements (id, canvas_id, type, name, content, created_by, attributes, created_at) "
+                "VALUES (?, ?, 'note', 'Ops note', 'written by an ops script', 'ops', '{}', ?)",
+                (element_id.hex, canvas.id.hex, datetime.now(timezone.utc).isoformat(sep=" ")),
+            )
+        with conn:
+            conn.execute("UPDATE canvas_elements SET content = 'fixed by an ops script' WHERE id = ?", (element_id.hex,))
+            conn.execute("UPDATE canvas_elements SET name = 'Sales' WHERE id = ?", (compressed.id.hex,))
+    finally:
+        conn.close()
+
+    assert [el.id for el in await service.search_elements(canvas.id, "fixed ops")] == [element_id]
+    assert await service.search_elements(canvas.id, "written") == []
+    # Renaming a compressed element outside the app keeps its indexed text
+    assert [el.id for el in await service.search_elements(canvas.id, "sales продажам")] == [compressed.id]
+    changes, _ = await service.get_changes(canvas.id, after_seq=cursor)
+    assert [(c.entity, c.op, c.entity_id) for c in changes] == [
+        ("element", "insert", element_id.hex),
+        ("element", "update", element_id.hex),
+        ("element", "update", compressed.id.hex),
+    ]
+
+    conn = sqlite3.connect(settings.DB_PATH)
+    try:
+        with conn:
+            conn.execute("DELETE FROM canvas_elements WHERE id IN (?, ?)", (element_id.hex, compressed.id.hex))
+    finally:
+        conn.close()
+    assert await service.search_elements(canvas.id, "ops продажам") == []
+    assert [c.op for c in (await service.get_changes(canvas.id, after_seq=cursor))[0]][-2:] == ["delete", "delete"]
+
+
+@pytest.mark.asyncio
+async def test_change_feed_records_every_write_path():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    cursor = await service.get_change_cursor(canvas.id)
+    assert cursor > 0  # canvas creation
+
+    frame = await service.create_frame(canvas.id, "Frame")
+    element = await service.add_element(canvas.id, "note", "hello", "tester", frame_id=frame.id)
+    [bulk_id] = await service.add_elements_bulk([{"canvas_id": canvas.id, "type": "note", "content": "bulk", "created_by": "tester"}])
+    await service.update_element(element.id, content="edited")
+    await service.remove_element_from_frame(element.id, frame.id)
+    await service.update_canvas(canvas.id, "Renamed")
+    await service.delete_frame(frame.id)
+
+    changes, next_cursor = await service.get_changes(canvas.id, after_seq=cursor)
+    link = f"{frame.id.hex}:{element.id.hex}"
+    assert [(c.entity, c.op, c.entity_id) for c in changes] == [
+        ("frame", "insert", frame.id.hex),
+        ("element", "insert", element.id.hex),
+        ("frame_link", "insert", link),
+        ("element", "insert", bulk_id.hex),
+        ("element", "update", element.id.hex),
+        ("frame_link", "delete", link),
+        ("canvas", "update", canvas.id.hex),
+        ("frame", "delete", frame.id.hex),
+    ]
+    assert next_cursor == changes[-1].seq == await service.get_change_cursor(canvas.id)
+    assert await service.get_changes(canvas.id, after_seq=next_cursor) == ([], next_cursor)
+
+    # Rolled back writes leave no trace
+    with pytest.raises(RuntimeError):
+        async with unit_of_work():
+            await service.add_element(canvas.id, "note", "lost", "tester")
+            raise RuntimeError("tool failed")
+    assert (await service.get_changes(canvas.id, after_seq=next_cursor))[0] == []
+
+    page, page_cursor = await service.get_changes(canvas.id, after_seq=cursor, limit=3)
+    assert [c.seq for c in page] == [c.seq for c in changes[:3]] and page_cursor == changes[2].seq
+
+
+@pytest.mark.asyncio
+async def test_frame_tree_with_counts_is_cached_until_frames_change():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    assert await service.get_frame_tree(canvas.id) == []
+
+    projects = await service.create_frame(canvas.id, "Projects")
+    beta = await service.create_frame(canvas.id, "Beta", parent_id=projects.id)
+    alpha = await service.create_frame(canvas.id, "Alpha", parent_id=projects.id)
+    notes = await service.create_frame(canvas.id, "Notes")
+    await service.add_element(canvas.id, "note", "a", "tester", frame_id=alpha.id)
+    await service.add_element(canvas.id, "note", "b", "tester", frame_id=alpha.id)
+    await service.add_element(canvas.id, "note", "c", "tester", frame_id=projects.id)
+
+    def shape(nodes):
+        return [(n.name, n.depth, n.element_count, shape(n.children)) for n in nodes]
+
+    tree = await service.get_frame_tree(canvas.id)
+    assert shape(tree) == [
+        ("Notes", 0, 0, []),
+        ("Projects", 0, 1, [("Alpha", 1, 2, []), ("Beta", 1, 0, [])]),
+    ]
+    assert tree[1].children[0].parent_id == projects.id
+
+    # Served from the cache while no frame changes: one small query, no recursive CTE
+    with capture_statements() as statements:
+        assert await service.get_frame_tree(canvas.id) is tree
+        await service.add_element(canvas.id, "note", "unframed", "tester")
+        assert await service.get_frame_tree(canvas.id) is tree
+    assert not any("RECURSIVE" in statement for statement, _ in statements)
+
+    await service.update_frame(beta.id, "Gamma")
+    assert shape((await service.get_frame_tree(canvas.id))[1].children) == [("Alpha", 1, 2, []), ("Gamma", 1, 0, [])]
+    element = await service.add_element(canvas.id, "note", "d", "tester")
+    await service.add_element_to_frame(element.id, notes.id)
+    assert (await service.get_frame_tree(canvas.id))[0].element_count == 1
+    await service.delete_frame(projects.id)
+    # Children of a deleted frame become roots
+    assert shape(await service.get_frame_tree(canvas.id)) == [
+        ("Alpha", 0, 2, []), ("Gamma", 0, 0, []), ("Notes", 0, 1, []),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_frame_stats_follow_link_changes():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    frame = await service.create_frame(canvas.id, "Frame")
+    other = await service.create_frame(canvas.id, "Other")
+    assert (await service.get_frame_stats(canvas.id))[frame.id].element_count == 0
+
+    note = await service.add_element(canvas.id, "note", "n", "tester", frame_id=frame.id)
+    message = await service.add_element(canvas.id, "message", "m", "tester")
+    await service.add_element_to_frame(message.id, frame.id)
+    await service.add_elements_bulk([
+        {"canvas_id": canvas.id, "type": "message", "content": "b", "created_by": "tester", "frame_id": frame.id}
+    ])
+    await service.add_element_to_frame(message.id, other.id)
+
+    stats = (await service.get_frame_stats(canvas.id))[frame.id]
+    assert (stats.element_count, stats.type_counts) == (3, {"note": 1, "message": 2})
+    assert stats.last_added_at is not None
+
+    await service.update_element(note.id, type="task")
+    await service.remove_element_from_frame(message.id, frame.id)
+    stats = (await service.get_frame_stats(canvas.id))[frame.id]
+    assert (stats.element_count, stats.type_counts) == (2, {"task": 1, "message": 1})
+
+    [node] = [n for n in await service.get_frame_tree(canvas.id) if n.id == frame.id]
+    assert (node.element_count, node.type_counts) == (2, {"task": 1, "message": 1})
+
+    await service.delete_frame(frame.id)
+    assert set(await service.get_frame_stats(canvas.id)) == {other.id}
+
+    # Frames that predate the stats table are counted by the backfill
+    async with async_session() as session:
+        await session.execute(text("DELETE FROM canvas_frame_stats WHERE frame_id = :f"), {"f": other.id.hex})
+        await session.commit()
+    await migration.backfill_frame_stats()
+    stats = (await service.get_frame_stats(canvas.id))[other.id]
+    assert (stats.element_count, stats.type_counts) == (1, {"message": 1})
+
+
+@pytest.mark.asyncio
+async def test_bulk_frame_membership_and_canvas_ownership():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    other_canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    frame = await service.create_frame(canvas.id, "Regrouped")
+    created = await service.add_elements_bulk([
+        {"canvas_id": canvas.id, "type": "note", "content": f"n {i}", "created_by": "tester"}
+        for i in range(200)
+    ])
+    [foreign] = await service.add_elements_bulk([
+        {"canvas_id": other_canvas.id, "type": "note", "content": "foreign", "created_by": "tester"}
+    ])
+
+    assert await service.get_canvas_element_ids(canvas.id, created + [foreign, uuid.uuid4()]) == set(created)
+    assert await service.get_canvas_element_ids(canvas.id, []) == set()
+
+    assert await service.add_elements_to_frame_bulk(frame.id, created) == 200
+    assert (await service.get_frame_stats(canvas.id))[frame.id].element_count == 200
+
+    with capture_statements() as statements:
+        removed = await service.remove_elements_from_frame_bulk(frame.id, created[:150] + [uuid.uuid4()])
+    assert removed == 150
+    assert len([s for s, _ in statements if s.lstrip().upper().startswith("DELETE")]) == 1
+    assert await service.remove_elements_from_frame_bulk(frame.id, []) == 0
+
+    remaining = await service.get_elements(canvas.id, frame_id=frame.id, limit=1000)
+    assert {el.id for el in remaining} == set(created[150:])
+    assert (await service.get_frame_stats(canvas.id))[frame.id].element_count == 50
+
+
+@pytest.mark.asyncio
+async def test_large_content_is_stored_compressed():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    document = "Квартальный отчёт: выручка выросла. " * 200
+    big = await service.add_element(canvas.id, "document", document, "tester")
+    small = await service.add_element(canvas.id, "message", "short message", "tester")
+
+    async with async_session() as session:
+        # Large bodies live in canvas_contents
+        stored = dict((await session.execute(text("""
+            SELECT e.id, typeof(coalesce(c.content, e.content)) FROM canvas_elements e
+            LEFT JOIN canvas_contents c ON c.hash = e.content_hash WHERE e.canvas_id = :c
+        """), {"c": canvas.id.hex})).all())
+    assert stored == {big.id.hex: "blob", small.id.hex: "text"}
+
+    # Every read path returns the text
+    assert (await service.get_element(big.id)).content == document
+    [row] = await service.get_elements(canvas.id, type="document", columns=ELEMENT_SUMMARY_COLUMNS)
+    assert row.content == document
+    assert [el.id for el in await service.search_elements(canvas.id, "выручка")] == [big.id]
+    assert [el.id for el in await service.get_elements(canvas.id, content_contains="ВЫРУЧКА")] == [big.id]
+
+    edited = document.replace("выросла", "упала")
+    await service.update_element(big.id, content=edited)
+    assert (await service.get_element(big.id)).content == edited
+    assert [el.id for el in await service.search_elements(canvas.id, "упала")] == [big.id]
+    assert await service.search_elements(canvas.id, "выросла") == []
+
+
+@pytest.mark.asyncio
+async def test_content_backfills_dedupe_and_compress_old_rows(monkeypatch):
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    document = f"Transcription {uuid.uuid4()} of a long voice message. " * 100
+    monkeypatch.setattr(settings, "ELEMENT_COMPRESS_MIN_BYTES", 0)
+    monkeypatch.setattr(settings, "ELEMENT_DEDUP_MIN_BYTES", 0)
+    old = [await service.add_element(canvas.id, "voice", document, "tester") for _ in range(2)]
+    monkeypatch.setattr(settings, "ELEMENT_COMPRESS_MIN_BYTES", 2048)
+    monkeypatch.setattr(settings, "ELEMENT_DEDUP_MIN_BYTES", 512)
+    assert not await service.has_content(document)
+
+    cursor = await service.get_change_cursor(canvas.id)
+    assert await migration.dedupe_element_content(batch_size=1) >= 2
+    await migration.compress_element_content(batch_size=2)
+    assert await migration.dedupe_element_content() == 0
+    assert await migration.compress_element_content() == 0
+
+    async with async_session() as session:
+        stored = (await session.execute(text("""
+            SELECT e.content, typeof(c.content), c.ref_count FROM canvas_elements e
+            JOIN canvas_contents c ON c.hash = e.content_hash WHERE e.id = :id
+        """), {"id": old[0].id.hex})).one()
+    assert tuple(stored) == ("", "blob", 2)
+    assert await service.has_content(document)
+    assert [el.content for el in await service.get_elements(canvas.id)] == [document, document]
+    # A storage-only rewrite is not a change
+    assert (await service.get_changes(canvas.id, after_seq=cursor))[0] == []
+
+    await migration.rebuild_fts_index(force=True)
+    assert {el.id for el in await service.search_elements(canvas.id, "transcription")} == {e.id for e in old}
+
+
+@pytest.mark.asyncio
+async def test_identical_large_contents_are_stored_once():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(_chat_id())
+    forwarded = f"Forwarded announcement {uuid.uuid4()}: the office moves next week. " * 20
+    assert not await service.has_content(forwarded)
+
+    first = await service.add_element(canvas.id, "message", forwarded, "tester")
+    second = await service.add_element_batched(canvas.id, "message", forwarded, "tester")
+    [third] = await service.add_elements_bulk([
+        {"canvas_id": canvas.id, "type": "message", "content": forwarded, "created_by": "tester"}
+    ])
+    assert first.content_hash == second.content_hash
+    assert await service.has_content(forwarded)
+    assert not await service.has_content(forwarded + "!")
+
+    async def body():
+        async with async_session() as session:
+            return (await session.execute(
+                text("SELECT ref_count FROM canvas_contents WHERE hash = :h"), {"h": first.content_hash}
+            )).scalar()
+
+    assert await body() == 3
+    assert [el.content for el in await service.get_elements(canvas.id)] == [forwarded] * 3
+    assert [el.id for el in await service.search_elements(canvas.id, "announcement")] != []
+
+    # Editing one copy leaves the others on the shared body
+    await service.update_element(second.id, content="short now")
+    assert await body() == 2
+    assert (await service.get_element(first.id)).content == forwarded
+    assert (await service.get_element(second.id)).content == "short now"
+
+    async with async_session() as session:
+        await session.execute(text("DELETE FROM canvas_elements WHERE id IN (:a, :b)"), {"a": first.id.hex, "b": third.hex})
+        await session.commit()
+    assert await body() == 0
+    assert not await service.has_content(forwarded)
+    assert await service.purge_unused_contents() >= 1
+    assert await body() is None
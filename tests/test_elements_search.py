@@ -80,6 +80,48 @@ class TestFetchElementsSearch(unittest.IsolatedAsyncioTestCase):
             ),
         ]
 
+    def fake_get_elements(self):
+        """Mimics CanvasService.get_elements filtering (done in SQL there), newest first."""
+        def get_elements_side_effect(canvas_id, limit, since=None, until=None, frame_id=None,
+                                     created_by_contains=None, author_contains=None, content_contains=None,
+                                     columns=None):
+            filtered = self.elements
+            if since:
+                filtered = [e for e in filtered if e.created_at >= since]
+            if until:
+                filtered = [e for e in filtered if e.created_at < until]
+            if created_by_contains:
+                filtered = [e for e in filtered if created_by_contains.casefold() in e.created_by.casefold()]
+            if author_contains:
+                needle = author_contains.casefold()
+                filtered = [
+                    e for e in filtered
+                    if needle in (e.attributes.get('author_name') or '').casefold()
+                    or needle in (e.attributes.get('author_nick') or '').casefold()
+                ]
+            if content_contains:
+                filtered = [e for e in filtered if content_contains.casefold() in e.content.casefold()]
+            return sorted(filtered, key=lambda e: e.created_at, reverse=True)[:limit]
+        return AsyncMock(side_effect=get_elements_side_effect)
+
+    def fake_get_elements_page(self):
+        get_elements = self.fake_get_elements().side_effect
+        def get_elements_page_side_effect(cursor=None, **filters):
+            return get_elements(**filters), None
+        return AsyncMock(side_effect=get_elements_page_side_effect)
+
+    def fake_search_elements(self):
+        """Mimics CanvasService.search_elements: every query word is a prefix of a content word."""
+        get_elements = self.fake_get_elements().side_effect
+        def search_elements_side_effect(query, limit, **filters):
+            candidates = get_elements(limit=len(self.elements), **filters)
+            words = query.casefold().split()
+            return [
+                e for e in candidates
+                if all(any(w.startswith(q) for w in e.content.casefold().split()) for q in words)
+            ][:limit]
+        return AsyncMock(side_effect=search_elements_side_effect)
+
     def test_parse_time_range(self):
         # Test "yesterday"
         start, end = _parse_time_range("yesterday")
@@ -107,55 +149,55 @@ class TestFetchElementsSearch(unittest.IsolatedAsyncioTestCase):
     async def test_search_created_by(self):
         with patch('ai_core.services.canvas_service.canvas_service') as mock_service:
             mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=MagicMock(id="canvas1"))
-            mock_service.get_elements = AsyncMock(return_value=self.elements)
+            mock_service.get_elements_page = self.fake_get_elements_page()
             
             # Search for "user:123" (Alice and file)
             tool_context = create_mock_tool_context(1)
             res_json = await _fetch_elements_impl(tool_context=tool_context, created_by="user:123")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 2)
             ids = sorted([r['id'] for r in res])
             self.assertEqual(ids, ["1", "5"])
             
             # Case insensitive "ADMIN"
             res_json = await _fetch_elements_impl(tool_context=tool_context, created_by="ADMIN")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "3")
 
     async def test_search_author(self):
         with patch('ai_core.services.canvas_service.canvas_service') as mock_service:
             mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=MagicMock(id="canvas1"))
-            mock_service.get_elements = AsyncMock(return_value=self.elements)
+            mock_service.get_elements_page = self.fake_get_elements_page()
             
             # Search for "Alice" (author_name)
             tool_context = create_mock_tool_context(1)
             res_json = await _fetch_elements_impl(tool_context=tool_context, author="Alice")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "1")
             
             # Search for "Bob" (author_nick)
             res_json = await _fetch_elements_impl(tool_context=tool_context, author="bob")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "2")
 
     async def test_search_contains(self):
         with patch('ai_core.services.canvas_service.canvas_service') as mock_service:
             mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=MagicMock(id="canvas1"))
-            mock_service.get_elements = AsyncMock(return_value=self.elements)
+            mock_service.search_elements = self.fake_search_elements()
             
             # Search for "project" (in note)
             tool_context = create_mock_tool_context(1)
             res_json = await _fetch_elements_impl(tool_context=tool_context, contains="project")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "3")
             
             # Search for "Reply"
             res_json = await _fetch_elements_impl(tool_context=tool_context, contains="reply")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "4")
 
@@ -163,25 +205,16 @@ class TestFetchElementsSearch(unittest.IsolatedAsyncioTestCase):
         with patch('ai_core.services.canvas_service.canvas_service') as mock_service:
             mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=MagicMock(id="canvas1"))
             
-            # Mock get_elements to filter by 'since'
-            def get_elements_side_effect(canvas_id, limit, since, frame_id):
-                filtered = self.elements
-                if since:
-                    # Ensure timezone awareness
-                    if since.tzinfo is None: since = since.replace(tzinfo=timezone.utc)
-                    filtered = [e for e in filtered if e.created_at >= since]
-                return filtered
-                
-            mock_service.get_elements = AsyncMock(side_effect=get_elements_side_effect)
+            mock_service.get_elements_page = self.fake_get_elements_page()
             
             # Search "yesterday" (should find element 3 only)
             # Element 5 is day before yesterday. Elements 1,2,4 are today.
             tool_context = create_mock_tool_context(1)
             res_json = await _fetch_elements_impl(tool_context=tool_context, time_range="yesterday")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             
             # Verify service was called with correct start time
-            call_args = mock_service.get_elements.call_args
+            call_args = mock_service.get_elements_page.call_args
             _, kwargs = call_args
             self.assertEqual(kwargs['since'], self.yesterday_start)
             
@@ -189,15 +222,14 @@ class TestFetchElementsSearch(unittest.IsolatedAsyncioTestCase):
             # Element 3 is yesterday noon. Element 5 is day before.
             # Elements 1,2,4 are today.
             # "yesterday" range is [yesterday_start, today_start).
-            # Python loop filters < end_dt (today_start).
-            # Service filters >= start_dt (yesterday_start).
+            # Service filters >= start_dt (yesterday_start) and < end_dt (today_start).
             # So we expect only Element 3.
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "3")
             
             # Search "today" (should find 1, 2, 4)
             res_json = await _fetch_elements_impl(tool_context=tool_context, time_range="today")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 3)
             ids = sorted([r['id'] for r in res])
             self.assertEqual(ids, ["1", "2", "4"])
@@ -206,35 +238,27 @@ class TestFetchElementsSearch(unittest.IsolatedAsyncioTestCase):
         with patch('ai_core.services.canvas_service.canvas_service') as mock_service:
             mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=MagicMock(id="canvas1"))
             
-            # Mock get_elements to filter by 'since'
-            def get_elements_side_effect(canvas_id, limit, since, frame_id):
-                filtered = self.elements
-                if since:
-                    if since.tzinfo is None: since = since.replace(tzinfo=timezone.utc)
-                    filtered = [e for e in filtered if e.created_at >= since]
-                return filtered
-                
-            mock_service.get_elements = AsyncMock(side_effect=get_elements_side_effect)
+            mock_service.get_elements_page = self.fake_get_elements_page()
             
             # Search "today" AND created_by "user:123" -> Should be element 1 only
             # Element 5 is user:123 but not today.
             tool_context = create_mock_tool_context(1)
             res_json = await _fetch_elements_impl(tool_context=tool_context, time_range="today", created_by="user:123")
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 1)
             self.assertEqual(res[0]['id'], "1")
 
     async def test_limit(self):
         with patch('ai_core.services.canvas_service.canvas_service') as mock_service:
             mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=MagicMock(id="canvas1"))
-            mock_service.get_elements = AsyncMock(return_value=self.elements)
+            mock_service.get_elements_page = self.fake_get_elements_page()
             
             # Limit 2. Should return last 2 sorted by time.
             # Sorted order: 5 (oldest), 3, 4, 2, 1 (newest)
             # Last 2: 2, 1
             tool_context = create_mock_tool_context(1)
             res_json = await _fetch_elements_impl(tool_context=tool_context, limit=2)
-            res = json.loads(res_json)
+            res = json.loads(res_json)["elements"]
             self.assertEqual(len(res), 2)
             ids = [r['id'] for r in res]
             # Expect sorted by created_at ascending in output
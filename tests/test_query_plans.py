@@ -0,0 +1,104 @@
+"""
+Query-plan regression test for CanvasService read paths.
+
+Captures every SELECT issued by CanvasService and runs EXPLAIN QUERY PLAN on it:
+no query may fall back to a full table scan or a temp B-tree sort (except
+bm25 ranking and the recursive frame-tree CTE, which sort their own result).
+"""
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from ai_core.storage import init_db
+from ai_core.storage.db import engine, read_engine
+from ai_core.services.canvas_service import CanvasService, ELEMENT_SUMMARY_COLUMNS, element_cursor
+
+
+@contextmanager
+def capture_selects():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    for target in (engine, read_engine):
+        event.listen(target.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in (engine, read_engine):
+            event.remove(target.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def explain(statement, parameters):
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[3] for row in result]
+
+
+def plan_problems(plan, statement=""):
+    is_fts_query = any("VIRTUAL TABLE" in step for step in plan)
+    # Recursive CTEs (frame tree) walk and sort their own, canvas-sized result
+    ctes = set(re.findall(r"WITH RECURSIVE (\w+)", statement))
+    problems = []
+    for step in plan:
+        if step.startswith("SCAN") and "VIRTUAL TABLE" not in step and "CONSTANT ROW" not in step:
+            if step.split()[1] not in ctes:
+                problems.append(step)
+        # bm25 ranking has to sort the matches; everything else must come off an index in order
+        if "USE TEMP B-TREE" in step and not (is_fts_query or ctes):
+            problems.append(step)
+    return problems
+
+
+@pytest.mark.asyncio
+async def test_canvas_service_queries_use_indexes():
+    await init_db()
+    service = CanvasService()
+    canvas = await service.get_or_create_canvas_for_chat(f"plan-{uuid.uuid4()}")
+    frame = await service.create_frame(canvas.id, "Frame")
+    element = await service.add_element(
+        canvas.id, "note", "hello world", "tester",
+        attributes={"author_name": "Alice"}, frame_id=frame.id
+    )
+    now = datetime.now(timezone.utc)
+    service.invalidate_canvas_cache()
+
+    with capture_selects() as statements:
+        await service.get_or_create_canvas_for_chat(f"plan-{uuid.uuid4()}", create_if_not_found=True)
+        await service.get_element(element.id)
+        await service.get_elements(canvas.id)
+        await service.get_elements(canvas.id, type="note")
+        await service.get_elements(canvas.id, since=now - timedelta(days=1), until=now)
+        await service.get_elements(canvas.id, type="note", since=now - timedelta(days=1))
+        await service.get_elements(canvas.id, frame_id=frame.id)
+        await service.get_elements(canvas.id, created_by_contains="x", author_contains="y", content_contains="z")
+        await service.get_elements(canvas.id, cursor=element_cursor(element))
+        await service.get_elements(canvas.id, attributes={"source_msg_id": "1"})
+        await service.get_elements(canvas.id, attributes={"author_nick": "alice"})
+        await service.search_elements(canvas.id, "hello")
+        await service.get_elements(canvas.id, frame_id=frame.id, columns=ELEMENT_SUMMARY_COLUMNS)
+        await service.get_frame_ids([element.id])
+        await service.get_high_water_mark(canvas.id)
+        await service.get_elements_after_seq(canvas.id, after_seq=0)
+        await service.get_changes(canvas.id, after_seq=0)
+        await service.get_change_cursor(canvas.id)
+        await service.get_frame_tree(canvas.id)
+        await service.get_frame_stats(canvas.id)
+        await service.get_frames(canvas.id)
+        await service.get_frame(frame.id)
+        await service.get_canvas_element_ids(canvas.id, [element.id, uuid.uuid4()])
+        await service.has_content("x" * 4096)
+
+    assert statements
+    failures = {}
+    for statement, parameters in statements:
+        problems = plan_problems(await explain(statement, parameters), statement)
+        if problems:
+            failures[" ".join(statement.split())] = problems
+    assert not failures, failures
@@ -0,0 +1,173 @@
+import json
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.sessions import DatabaseSessionService
+from google.genai import types
+from sqlalchemy import text
+
+from ai_core.common import session_compaction
+from ai_core.common.session_compaction import SessionCompactor
+from ai_core.storage.db import create_sqlite_engine
+
+
+class FakeLlm(BaseLlm):
+    """Returns a numbered summary and records the summarizer prompts."""
+    prompts: list = []
+
+    async def generate_content_async(self, llm_request, stream=False):
+        self.prompts.append(llm_request.contents[0].parts[0].text)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=f"summary {len(self.prompts)}")]))
+
+
+class FakeAgent:
+    def __init__(self):
+        self.canonical_model = FakeLlm(model="fake", prompts=[])
+
+
+@pytest_asyncio.fixture
+async def sessions(tmp_path):
+    engine = create_sqlite_engine(f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}", extra_pragmas={"foreign_keys": "ON"})
+    service = DatabaseSessionService(db_engine=engine)
+    yield service, engine
+    await engine.dispose()
+
+
+async def add_turn(service, session, n: int, payload_chars: int = 0, prompt_tokens: int = None):
+    """Appends one invocation: user message, optional tool call and response, model reply."""
+    invocation_id = f"inv-{n}"
+    events = [Event(author="user", invocation_id=invocation_id,
+                    content=types.Content(role="user", parts=[types.Part(text=f"question {n}")]))]
+    if payload_chars:
+        events.append(Event(author="agent", invocation_id=invocation_id, content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(id=f"call-{n}", name="fetch_elements", args={}))])))
+        events.append(Event(author="agent", invocation_id=invocation_id, content=types.Content(role="user", parts=[
+            types.Part(function_response=types.FunctionResponse(
+                id=f"call-{n}", name="fetch_elements", response={"result": json.dumps(["x" * payload_chars])}))])))
+    usage = types.GenerateContentResponseUsageMetadata(prompt_token_count=prompt_tokens) if prompt_tokens else None
+    events.append(Event(author="agent", invocation_id=invocation_id, usage_metadata=usage,
+                        content=types.Content(role="model", parts=[types.Part(text=f"answer {n}")])))
+    for event in events:
+        await service.append_event(session, event)
+    return events
+
+
+async def stored_events(engine):
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT count(*) FROM events"))).scalar()
+
+
+async def load(service):
+    return await service.get_session(app_name="agents", user_id="u1", session_id="chat")
+
+
+@pytest.mark.asyncio
+async def test_compaction_bounds_stored_events(sessions):
+    service, engine = sessions
+    compactor = SessionCompactor(service, engine, max_events=10, max_prompt_tokens=0, retain_events=4)
+    agent = FakeAgent()
+    session = await service.create_session(app_name="agents", user_id="u1", session_id="chat", state={"chat_id": "chat"})
+
+    # Under budget: checked once when first seen, then skipped until observed events say otherwise
+    for n in range(3):
+        await add_turn(service, session, n)
+    assert not await compactor.maybe_compact(agent, "agents", "u1", "chat")
+    assert not await compactor.maybe_compact(agent, "agents", "u1", "chat")
+    assert compactor.stats()["checks"] == 1
+
+    for n in range(3, 6):
+        for event in await add_turn(service, session, n):
+            compactor.observe("agents", "u1", "chat", event)
+    assert await compactor.maybe_compact(agent, "agents", "u1", "chat")
+
+    # The two newest invocations (4 events) are kept verbatim, the rest is one summary
+    session = await load(service)
+    assert await stored_events(engine) == 5
+    summary = session.events[-1].actions.compaction
+    assert summary.compacted_content.parts[0].text == "summary 1"
+    assert [e.content.parts[0].text for e in session.events[:-1]] == ["question 4", "answer 4", "question 5", "answer 5"]
+
+    # The next summary rolls the previous one forward and replaces it
+    for n in range(6, 10):
+        for event in await add_turn(service, session, n):
+            compactor.observe("agents", "u1", "chat", event)
+    assert await compactor.maybe_compact(agent, "agents", "u1", "chat")
+    assert "summary 1" in agent.canonical_model.prompts[-1]
+    session = await load(service)
+    compactions = [e for e in session.events if e.actions.compaction]
+    assert len(compactions) == 1
+    assert compactions[0].actions.compaction.start_timestamp == summary.start_timestamp
+    assert await stored_events(engine) == 5
+    assert compactor.stats()["compactions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_prompt_budget_trims_tool_payloads(sessions):
+    service, engine = sessions
+    compactor = SessionCompactor(service, engine, max_events=0, max_prompt_tokens=20000, retain_events=50)
+    agent = FakeAgent()
+    session = await service.create_session(app_name="agents", user_id="u1", session_id="chat", state={"chat_id": "chat"})
+    await add_turn(service, session, 0, payload_chars=100_000, prompt_tokens=1000)
+    await add_turn(service, session, 1, prompt_tokens=26000)
+
+    # Only the prompt is over budget: everything but the last invocation is summarized
+    assert await compactor.maybe_compact(agent, "agents", "u1", "chat")
+    prompt = agent.canonical_model.prompts[0]
+    assert "fetch_elements" in prompt
+    assert len(prompt) < 5000
+    session = await load(service)
+    assert [e.content.parts[0].text for e in session.events if not e.actions.compaction] == ["question 1", "answer 1"]
+
+
+@pytest.mark.asyncio
+async def test_summarizer_failure_does_not_raise(sessions):
+    service, engine = sessions
+    compactor = SessionCompactor(service, engine, max_events=2, max_prompt_tokens=0, retain_events=0)
+    session = await service.create_session(app_name="agents", user_id="u1", session_id="chat", state={"chat_id": "chat"})
+    await add_turn(service, session, 0)
+    await add_turn(service, session, 1)
+
+    class BrokenAgent:
+        canonical_model = None
+
+    assert not await compactor.maybe_compact(BrokenAgent(), "agents", "u1", "chat")
+    assert compactor.stats()["failures"] == 1
+    assert await stored_events(engine) == 4
+
+
+@pytest.mark.asyncio
+async def test_compatibility_check(sessions):
+    service, engine = sessions
+    compactor = SessionCompactor(service, engine, max_events=2, max_prompt_tokens=0)
+    with patch.object(session_compaction, "logger") as mock_logger:
+        assert await compactor.check_compatibility()
+    mock_logger.error.assert_not_called()
+    assert compactor.stats()["compatible"] is True
+
+
+@pytest.mark.asyncio
+async def test_incompatible_adk_disables_compaction(sessions):
+    service, engine = sessions
+    session = await service.create_session(app_name="agents", user_id="u1", session_id="chat", state={"chat_id": "chat"})
+    for n in range(3):
+        await add_turn(service, session, n)
+
+    # A renamed events column: pruning would fail, so compaction is switched off loudly
+    compactor = SessionCompactor(service, engine, max_events=2, max_prompt_tokens=0, retain_events=0)
+    with patch.object(session_compaction, "_EVENTS_KEY_COLUMNS", {"id", "session_id", "session_key"}), \
+         patch.object(session_compaction, "logger") as mock_logger:
+        assert not await compactor.maybe_compact(FakeAgent(), "agents", "u1", "chat")
+    assert "DISABLED" in mock_logger.error.call_args.args[0]
+    assert not compactor.enabled
+    assert await stored_events(engine) == 6
+
+    # A removed summarizer cap only loses payload trimming
+    compactor = SessionCompactor(service, engine, max_events=2, max_prompt_tokens=0, retain_events=0)
+    with patch.object(session_compaction, "_SUMMARIZER_TOOL_CAP_ATTR", "_RENAMED_CAP"), \
+         patch.object(session_compaction, "logger") as mock_logger:
+        assert await compactor.maybe_compact(FakeAgent(), "agents", "u1", "chat")
+    assert "NOT trimmed" in mock_logger.error.call_args.args[0]
@@ -4,8 +4,11 @@ from datetime import datetime, timedelta, timezone
 import uuid
 
 from ai_core.storage import init_db, save_file
-from ai_core.storage.db import async_session
+from ai_core.common.config import settings
+from ai_core.storage.db import async_session, read_session
 from ai_core.common.models import CanvasElement
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 from sqlmodel import select
 
 import pytest
@@ -117,3 +120,20 @@ async def test_get_messages_with_since():
     assert recent_msg.id in msg_ids
     assert old_msg.id not in msg_ids
 
+
+@pytest.mark.asyncio
+async def test_sqlite_profile_pragmas():
+    """Storage profile is applied on connect; the read engine cannot write"""
+    await init_db()
+
+    async with async_session() as session:
+        journal_mode = (await session.execute(text("PRAGMA journal_mode"))).scalar()
+        busy_timeout = (await session.execute(text("PRAGMA busy_timeout"))).scalar()
+    assert journal_mode.upper() == settings.SQLITE_JOURNAL_MODE
+    assert busy_timeout == settings.SQLITE_BUSY_TIMEOUT_MS
+
+    async with read_session() as session:
+        assert (await session.execute(text("PRAGMA query_only"))).scalar() == 1
+        with pytest.raises(OperationalError):
+            session.add(CanvasElement(canvas_id=uuid.uuid4(), type="message", content="x", created_by="test"))
+            await session.commit()
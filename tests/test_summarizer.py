@@ -3,38 +3,43 @@ Unit-тесты для Summarizer Agent
 """
 
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 from ai_core.services.agent_service import run_summarizer as summarize_chat
 
 @pytest.fixture
-def mock_run_agent_sync():
-    with patch('ai_core.services.agent_service.run_agent_sync') as mock:
+def mock_run_agent():
+    with patch('ai_core.services.agent_service.run_agent_async', new_callable=AsyncMock) as mock:
         yield mock
 
-def test_summarize_chat_success(mock_run_agent_sync):
-    mock_run_agent_sync.return_value = "Summary text"
+@pytest.mark.asyncio
+async def test_summarize_chat_success(mock_run_agent):
+    mock_run_agent.return_value = "Summary text"
     
-    result = summarize_chat(chat_id="123", instruction="Make it short")
+    result = await summarize_chat(chat_id="123", instruction="Make it short")
     
     assert result == "Summary text"
     
-    mock_run_agent_sync.assert_called_once()
-    call_args = mock_run_agent_sync.call_args
+    mock_run_agent.assert_awaited_once()
+    call_args = mock_run_agent.call_args
     assert "chat_id='123'" in call_args.kwargs['user_message']
     assert "Make it short" in call_args.kwargs['user_message']
+    # The session is per run, but tools still see the chat
+    assert call_args.kwargs['chat_id'] == "123"
+    assert call_args.kwargs['session_id'].startswith("summarizer_123_")
     # We no longer pass messages in the prompt, so we don't check for "User: Hello"
 
-@patch("ai_core.services.agent_service.run_agent_sync")
-def test_run_summarizer_instruction(mock_run_agent_sync):
+@pytest.mark.asyncio
+@patch("ai_core.services.agent_service.run_agent_async", new_callable=AsyncMock)
+async def test_run_summarizer_instruction(mock_run_agent):
     """Test run_summarizer with instruction."""
     from ai_core.services.agent_service import run_summarizer
     chat_id = "test_chat_limit"
     
-    run_summarizer(chat_id=chat_id, instruction="since yesterday")
+    await run_summarizer(chat_id=chat_id, instruction="since yesterday")
     
     # Verify agent was called
-    mock_run_agent_sync.assert_called_once()
-    call_kwargs = mock_run_agent_sync.call_args.kwargs
+    mock_run_agent.assert_awaited_once()
+    call_kwargs = mock_run_agent.call_args.kwargs
     user_message = call_kwargs["user_message"]
     
     assert "since yesterday" in user_message
@@ -66,7 +66,7 @@ async def test_handle_text_message_success(mock_update, mock_context):
     
     with patch("telegram_bot.handlers.is_chat_allowed", return_value=True), \
          patch("ai_core.services.canvas_service.canvas_service") as mock_canvas_service, \
-         patch("telegram_bot.handlers.run_agent_sync") as mock_run_agent_sync, \
+         patch("telegram_bot.handlers.run_agent_async", new_callable=AsyncMock) as mock_run_agent, \
          patch("telegram_bot.handlers.is_forwarded", return_value=False):
         
         # Setup mock returns
@@ -75,15 +75,15 @@ async def test_handle_text_message_success(mock_update, mock_context):
         mock_element = MagicMock()
         mock_element.content = "Hello world"
         mock_element.attributes = {}
-        mock_canvas_service.add_element = AsyncMock(return_value=mock_element)
+        mock_canvas_service.add_element_batched = AsyncMock(return_value=mock_element)
         
-        # Mock run_agent_sync to return a response
-        mock_run_agent_sync.return_value = "Orchestrator reply"
+        # Mock run_agent_async to return a response
+        mock_run_agent.return_value = "Orchestrator reply"
         
         await handle_voice_or_text_message(mock_update, mock_context)
     
-        mock_canvas_service.add_element.assert_called_once()
-        mock_run_agent_sync.assert_called_once()
+        mock_canvas_service.add_element_batched.assert_called_once()
+        mock_run_agent.assert_awaited_once()
         pass
 
 @pytest.mark.asyncio
@@ -112,7 +112,7 @@ async def test_handle_voice_message_success(mock_update, mock_context):
          patch("telegram_bot.handlers.Path") as mock_path, \
          patch("telegram_bot.handlers.TranscriptionService") as MockTranscriptionService, \
          patch("ai_core.services.canvas_service.canvas_service") as mock_canvas_service, \
-         patch("telegram_bot.handlers.run_agent_sync") as mock_run_agent_sync, \
+         patch("telegram_bot.handlers.run_agent_async", new_callable=AsyncMock) as mock_run_agent, \
          patch("telegram_bot.handlers.is_forwarded", return_value=False):
         
         mock_path_obj = MagicMock()
@@ -130,15 +130,15 @@ async def test_handle_voice_message_success(mock_update, mock_context):
         mock_element = MagicMock()
         mock_element.content = "transcribed text"
         mock_element.attributes = {}
-        mock_canvas_service.add_element = AsyncMock(return_value=mock_element)
+        mock_canvas_service.add_element_batched = AsyncMock(return_value=mock_element)
         
-        mock_run_agent_sync.return_value = "Orchestrator reply"
+        mock_run_agent.return_value = "Orchestrator reply"
 
         await handle_voice_or_text_message(mock_update, mock_context)
         
         mock_context.bot.get_file.assert_called_once_with("voice_123")
         mock_file.download_to_drive.assert_called_once()
         mock_transcription_service.transcribe.assert_called_once()
-        mock_canvas_service.add_element.assert_called_once()
-        mock_run_agent_sync.assert_called_once()
+        mock_canvas_service.add_element_batched.assert_called_once()
+        mock_run_agent.assert_awaited_once()
 
@@ -1,9 +1,12 @@
+import asyncio
+import json
 import pytest
 from unittest.mock import MagicMock, patch, AsyncMock
 from datetime import datetime, timezone
 import uuid
 import os
 from ai_core.common.models import CanvasElement
+from ai_core.services.canvas_service import ELEMENT_SUMMARY_COLUMNS
 from ai_core.tools.elements import fetch_elements, _fetch_elements_impl
 from google.adk.tools import ToolContext
 
@@ -14,8 +17,8 @@ def create_mock_tool_context(chat_id: int) -> ToolContext:
 
 @pytest.fixture
 def mock_run_async():
-    # Patch run_async where it is imported in elements.py
-    with patch('ai_core.tools.elements.run_async') as mock:
+    # Patch the bridge used by the sync tool wrappers (tools.utils.sync_tool)
+    with patch('ai_core.tools.utils.run_async') as mock:
         mock.side_effect = lambda coro: coro # Just return the coroutine object or result
         yield mock
 
@@ -43,7 +46,7 @@ async def test_fetch_elements_filters():
         mock_canvas = MagicMock()
         mock_canvas.id = uuid.uuid4()
         mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=mock_canvas)
-        mock_service.get_elements = AsyncMock(return_value=mock_elements)
+        mock_service.get_elements_page = AsyncMock(return_value=(mock_elements, None))
         
         # Setup frames for validation
         frame_uuid = uuid.uuid4()
@@ -55,21 +58,31 @@ async def test_fetch_elements_filters():
         tool_context = create_mock_tool_context(123)
         result = await _fetch_elements_impl(tool_context=tool_context, limit=10)
         assert "Hello" in result
-        mock_service.get_elements.assert_called_with(
+        mock_service.get_elements_page.assert_called_with(
+            cursor=None,
             canvas_id=mock_canvas.id,
-            limit=100, # fetch_limit is max(limit * 5, 100)
+            limit=10, # filters run in SQL, no over-fetching
             since=None,
-            frame_id=None
+            until=None,
+            frame_id=None,
+            created_by_contains=None,
+            author_contains=None,
+            columns=ELEMENT_SUMMARY_COLUMNS
         )
 
         # Test 2: With frame_id (Valid)
         result = await _fetch_elements_impl(tool_context=tool_context, frame_id=str(frame_uuid))
         assert "Hello" in result
-        mock_service.get_elements.assert_called_with(
+        mock_service.get_elements_page.assert_called_with(
+            cursor=None,
             canvas_id=mock_canvas.id,
-            limit=100,
+            limit=10,
             since=None,
-            frame_id=frame_uuid
+            until=None,
+            frame_id=frame_uuid,
+            created_by_contains=None,
+            author_contains=None,
+            columns=ELEMENT_SUMMARY_COLUMNS
         )
         
         # Test 3: With frame_id (Invalid - Not in chat)
@@ -86,7 +99,7 @@ def test_fetch_elements_missing_chat_id():
     # If chat_id is missing from context, extract_chat_id should raise ValueError
     # But fetch_elements wraps it in run_async which might propagate the error or handle it.
     # Looking at extract_chat_id, it raises ValueError.
-    # fetch_elements calls run_async(_fetch_elements_impl).
+    # fetch_elements runs its async version through run_async.
     # _fetch_elements_impl calls extract_chat_id first thing.
     # If extract_chat_id raises, the tool call raises.
     # So we should expect an exception.
@@ -98,3 +111,52 @@ def test_fetch_elements_missing_chat_id():
     with patch.dict(os.environ, {}, clear=True):
         with pytest.raises(ValueError, match="Access denied: Chat ID not found"):
              fetch_elements(tool_context=context)
+
+@pytest.mark.asyncio
+async def test_fetch_elements_cursor():
+    with patch("ai_core.services.canvas_service.canvas_service") as mock_service:
+        mock_canvas = MagicMock()
+        mock_canvas.id = uuid.uuid4()
+        mock_service.get_or_create_canvas_for_chat = AsyncMock(return_value=mock_canvas)
+        mock_service.get_elements_page = AsyncMock(return_value=([], "next-page"))
+
+        tool_context = create_mock_tool_context(123)
+        result = json.loads(await _fetch_elements_impl(tool_context=tool_context, cursor="page-2"))
+        assert result == {"elements": [], "next_cursor": "next-page"}
+        assert mock_service.get_elements_page.call_args.kwargs["cursor"] == "page-2"
+
+        result = await _fetch_elements_impl(tool_context=tool_context, cursor="page-2", contains="x")
+        assert "cannot be combined" in result
+
+
+async def _current_loop():
+    return asyncio.get_running_loop()
+
+
+def test_run_async_reuses_one_bridge_loop():
+    from ai_core.tools.utils import run_async
+
+    first = run_async(_current_loop())
+    assert run_async(_current_loop()) is first
+    assert first.is_running()
+
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        run_async(fail())
+
+
+@pytest.mark.asyncio
+async def test_run_async_from_running_loop_and_from_bridge_loop():
+    from ai_core.tools.utils import run_async
+
+    bridge = run_async(_current_loop())
+    assert bridge is not asyncio.get_running_loop()
+
+    # A sync tool called from a coroutine on the bridge loop must not deadlock
+    async def nested():
+        return run_async(_current_loop())
+
+    inner = run_async(nested())
+    assert inner is not bridge and inner.is_closed()
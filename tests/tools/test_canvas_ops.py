@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import MagicMock, patch, AsyncMock
 import uuid
+from datetime import datetime
 from ai_core.common.models import CanvasElement
 from google.adk.tools import ToolContext
 
@@ -101,3 +102,109 @@ async def test_create_element_validation():
         created_by="tester"
     )
     assert "Error: content cannot be empty" in result
+
+@pytest.mark.asyncio
+async def test_list_canvas_frames_renders_tree():
+    with patch('ai_core.tools.canvas_ops.canvas_service', new_callable=AsyncMock) as mock_service:
+        from ai_core.tools.canvas_ops import list_canvas_frames
+        from ai_core.common.models import FrameTreeNode
+
+        child = FrameTreeNode(
+            id=uuid.uuid4(), name="Sprint 1", depth=1, element_count=3,
+            type_counts={"note": 1, "message": 2}, last_added_at=datetime(2026, 5, 4, 10, 30)
+        )
+        root = FrameTreeNode(id=uuid.uuid4(), name="Projects", children=[child])
+        child.parent_id = root.id
+        mock_service.get_or_create_canvas_for_chat.return_value = MagicMock(id=uuid.uuid4())
+        mock_service.get_frame_tree.return_value = [root]
+
+        result = list_canvas_frames(tool_context=create_mock_tool_context(123))
+        assert result == (
+            f"- Projects [ID: {root.id}] (0 elements)\n"
+            f"  - Sprint 1 [ID: {child.id}] (3 elements: 2 message, 1 note; last added 2026-05-04 10:30)"
+        )
+
+        mock_service.get_frame_tree.return_value = []
+        assert list_canvas_frames(tool_context=create_mock_tool_context(123)) == "No frames found."
+
+@pytest.mark.asyncio
+async def test_add_and_remove_elements_to_frame_in_bulk():
+    with patch('ai_core.tools.canvas_ops.canvas_service', new_callable=AsyncMock) as mock_service:
+        from ai_core.tools.canvas_ops import add_elements_to_frame, remove_elements_from_frame
+
+        canvas = MagicMock(id=uuid.uuid4())
+        frame_id = uuid.uuid4()
+        element_ids = [uuid.uuid4() for _ in range(3)]
+        mock_service.get_or_create_canvas_for_chat.return_value = canvas
+        mock_service.get_frame.return_value = MagicMock(id=frame_id, canvas_id=canvas.id)
+        mock_service.get_canvas_element_ids.return_value = set(element_ids)
+        mock_service.add_elements_to_frame_bulk.return_value = 2
+        mock_service.remove_elements_from_frame_bulk.return_value = 3
+
+        # Duplicates are collapsed before the single ownership query
+        ids = [str(e) for e in element_ids] + [str(element_ids[0])]
+        result = add_elements_to_frame(ids, str(frame_id), tool_context=create_mock_tool_context(123))
+        assert result == f"Added 2 elements to frame {frame_id} (1 were already there)."
+        mock_service.get_canvas_element_ids.assert_awaited_once_with(canvas.id, element_ids)
+        mock_service.add_elements_to_frame_bulk.assert_awaited_once_with(frame_id, element_ids)
+
+        result = remove_elements_from_frame(ids, str(frame_id), tool_context=create_mock_tool_context(123))
+        assert result == f"Removed 3 elements from frame {frame_id} (0 were not in it)."
+
+        # One foreign element rejects the whole request
+        mock_service.get_canvas_element_ids.return_value = set(element_ids[1:])
+        with pytest.raises(ValueError, match=str(element_ids[0])):
+            add_elements_to_frame(ids, str(frame_id), tool_context=create_mock_tool_context(123))
+        mock_service.add_elements_to_frame_bulk.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_bulk_frame_tools_reject_missing_or_malformed_frame():
+    with patch('ai_core.tools.canvas_ops.canvas_service', new_callable=AsyncMock) as mock_service:
+        from ai_core.tools.canvas_ops import add_elements_to_frame, remove_elements_from_frame
+
+        canvas = MagicMock(id=uuid.uuid4())
+        element_id = uuid.uuid4()
+        mock_service.get_or_create_canvas_for_chat.return_value = canvas
+        mock_service.get_canvas_element_ids.return_value = {element_id}
+        mock_service.get_frame.return_value = None
+
+        for tool in (add_elements_to_frame, remove_elements_from_frame):
+            missing = await tool.aio([str(element_id)], str(uuid.uuid4()), tool_context=create_mock_tool_context(123))
+            assert missing == "Frame not found."
+            malformed = await tool.aio([str(element_id)], "not-a-uuid", tool_context=create_mock_tool_context(123))
+            assert malformed == "Invalid frame id: not-a-uuid"
+
+        mock_service.add_elements_to_frame_bulk.assert_not_awaited()
+        mock_service.remove_elements_from_frame_bulk.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_async_tools_run_concurrently_on_the_callers_loop():
+    import asyncio
+    import inspect
+    from google.adk.tools import FunctionTool
+    from ai_core.tools.canvas_ops import get_current_canvas_info
+
+    tool = FunctionTool(get_current_canvas_info.aio)
+    assert tool.name == "get_current_canvas_info"
+    assert inspect.iscoroutinefunction(tool.func)
+    assert not inspect.iscoroutinefunction(get_current_canvas_info)
+
+    loops = []
+    async def slow_canvas(chat_id):
+        loops.append(asyncio.get_running_loop())
+        await asyncio.sleep(0.2)
+        return MagicMock(id=uuid.uuid4(), name="Canvas")
+
+    with patch('ai_core.tools.canvas_ops.canvas_service', new_callable=AsyncMock) as mock_service:
+        mock_service.get_or_create_canvas_for_chat.side_effect = slow_canvas
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*[
+            get_current_canvas_info.aio(tool_context=create_mock_tool_context(123)) for _ in range(5)
+        ])
+        assert asyncio.get_running_loop().time() - started < 0.5
+        assert all(r.startswith("Canvas ID:") for r in results)
+        assert loops == [asyncio.get_running_loop()] * 5
+
+        # The sync wrapper still works, on the bridge loop
+        assert get_current_canvas_info(tool_context=create_mock_tool_context(123)).startswith("Canvas ID:")
+        assert loops[-1] is not asyncio.get_running_loop()
@@ -68,7 +68,7 @@ async def test_process_image_flow(image_service):
     
     # Mock shutil.move
     with patch("shutil.move") as mock_move, \
-         patch("ai_core.services.image_service.canvas_service.add_element", new_callable=AsyncMock) as mock_add_element:
+         patch("ai_core.services.image_service.canvas_service.add_element_batched", new_callable=AsyncMock) as mock_add_element:
         
         mock_add_element.return_value = MagicMock(id=uuid.uuid4())
         